@@ -0,0 +1,4 @@
+import os
+
+# Настройки требуют токен; замеры работают с заглушкой Bot API и реальный токен не нужен
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
@@ -0,0 +1,134 @@
+"""Симулятор баланса: совпадение с обработчиками, кривые прогресса и скорость.
+
+1. --check-players новых игроков решают по одному инциденту через
+   services.incident_service во временной базе и в симуляторе
+   (services/balance.py) с той же стратегией; средние деньги, опыт и доля
+   успехов должны совпасть в пределах пяти стандартных ошибок.
+2. --players игроков проживают --days дней: уровни, деньги, денежная масса,
+   выпуск и сжигание денег и инфляция выводятся каждые --every дней,
+   скорость - в игроко-днях в секунду. --tick-interval - интервал такта мира
+   в секундах (по умолчанию WORLD_TICK_INTERVAL, 0 - без такта).
+
+Нужен NumPy (pip install -r requirements-dev.txt).
+
+    python -m benchmarks.balance --players 100000 --days 10 --actions 10
+"""
+import argparse
+import asyncio
+import logging
+import math
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("Для симулятора баланса нужен NumPy: pip install -r requirements-dev.txt")
+
+from benchmarks.common import Timer, use_temp_database
+from config import WORLD_TICK_INTERVAL
+from models import Player, SessionMaker
+from services import get_or_create_player, init_default_crises, init_default_incidents
+from services.balance import STRATEGIES, _Careers, _Tables, default_catalog, simulate
+from services.formulas import success_rate
+from services.incident_service import _generate_incident, _solve_incident
+
+SOLVE_TIME = (5, 40)
+
+def _live(players: int) -> dict:
+    # Тот же ход, что у симулятора со стратегией best: решение с наибольшим шансом
+    for user_id in range(1, players + 1):
+        with SessionMaker() as session:
+            incident = _generate_incident(session, user_id)
+            key = max(incident.possible_solutions, key=lambda key: success_rate(
+                incident.possible_solutions[key].success_rate, 1
+            ))
+            _solve_incident(session, user_id, incident.id, key, random.uniform(*SOLVE_TIME))
+    with SessionMaker() as session:
+        rows = session.query(Player.money, Player.experience, Player.successful_fixes).all()
+    return {
+        'money': np.array([row.money for row in rows], dtype=np.float64),
+        'experience': np.array([row.experience for row in rows], dtype=np.float64),
+        'success': np.array([row.successful_fixes for row in rows], dtype=np.float64)
+    }
+
+def _simulated(players: int) -> dict:
+    careers = _Careers(_Tables(default_catalog()), players, np.random.default_rng(42))
+    reputation = careers.reputation.copy()
+    careers.incident("best", SOLVE_TIME)
+    return {
+        'money': careers.money.astype(np.float64),
+        'experience': careers.experience.astype(np.float64),
+        # Успех - единственный исход, повышающий репутацию
+        'success': (careers.reputation > reputation).astype(np.float64)
+    }
+
+def _matches(live: np.ndarray, simulated: np.ndarray) -> bool:
+    error = math.sqrt(live.var() / len(live) + simulated.var() / len(simulated))
+    return abs(live.mean() - simulated.mean()) <= 5 * error + 1e-9
+
+async def check(players: int) -> bool:
+    random.seed(42)
+    use_temp_database()
+    await init_default_incidents()
+    await init_default_crises()
+    for user_id in range(1, players + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+    live = _live(players)
+    simulated = _simulated(players * 10)
+    ok = True
+    print(f"Одно решение инцидента, обработчики ({players} игроков) и симулятор ({players * 10}):")
+    for name, title in (('money', "деньги"), ('experience', "опыт"), ('success', "доля успехов")):
+        matches = _matches(live[name], simulated[name])
+        ok = ok and matches
+        print(f"  {title:<13} {live[name].mean():>9.2f} / {simulated[name].mean():>9.2f} - {'ok' if matches else 'ОШИБКА'}")
+    return ok
+
+def report(players: int, days: int, actions: int, strategy: str, every: int, tick_interval: int) -> None:
+    ticks_per_day = 86400 // tick_interval if tick_interval > 0 else 0
+    with Timer() as timer:
+        result = simulate(
+            players, days, actions=actions, strategy=strategy, solve_time=SOLVE_TIME,
+            ticks_per_day=ticks_per_day, seed=42
+        )
+    curves = result.curves
+    print(
+        f"\n{players} игроков, {days} дней по {actions} инцидентов, стратегия {strategy}, "
+        f"тактов мира в день {ticks_per_day}: {timer.elapsed:.2f}с "
+        f"({players * days / timer.elapsed:,.0f} игроко-дней/с)"
+    )
+    print(
+        f"{'день':>4} {'уровень p10/p50/p90':>20} {'деньги p50':>11} {'среднее':>9} {'масса':>14} "
+        f"{'выпуск':>13} {'сжигание':>13} {'инфляция':>9} {'успех':>6} {'кризисов':>9} {'без инц.':>8}"
+    )
+    supply = players * Player.__table__.c.money.default.arg
+    for day in range(days):
+        inflation = (curves['money_supply'][day] / supply - 1) * 100 if supply else 0.0
+        supply = curves['money_supply'][day]
+        if (day + 1) % every and day + 1 != days:
+            continue
+        levels = f"{curves['level_p10'][day]:.0f}/{curves['level_p50'][day]:.0f}/{curves['level_p90'][day]:.0f}"
+        print(
+            f"{day + 1:>4} {levels:>20} {curves['money_p50'][day]:>11.0f} {curves['money_mean'][day]:>9.0f} "
+            f"{curves['money_supply'][day]:>14,.0f} {curves['minted'][day]:>13,.0f} {curves['burned'][day]:>13,.0f} "
+            f"{inflation:>+8.1f}% {curves['success_rate'][day]:>6.0%} {curves['crises_per_player'][day]:>9.2f} "
+            f"{curves['idle_share'][day]:>8.0%}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--actions", type=int, default=10)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="best")
+    parser.add_argument("--every", type=int, default=1)
+    parser.add_argument("--check-players", type=int, default=2000)
+    parser.add_argument("--tick-interval", type=int, default=WORLD_TICK_INTERVAL)
+    args = parser.parse_args()
+    logging.getLogger("models.migrations").setLevel(logging.WARNING)
+    ok = asyncio.run(check(args.check_players)) if args.check_players else True
+    report(args.players, args.days, args.actions, args.strategy, args.every, args.tick_interval)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
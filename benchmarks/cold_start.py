@@ -0,0 +1,168 @@
+"""Холодный запуск бота: время до приема обновлений и до первого ответа.
+
+Во временную базу записываются --players игроков и каталоги, затем main.py
+запускается отдельным процессом с локальной заглушкой Bot API
+(benchmarks.fake_telegram) --runs раз в каждом режиме:
+
+1. полный запуск (FAST_START=false): рейтинг строится до начала polling;
+2. быстрый запуск (FAST_START=true): рейтинг строится в фоне, фоновые
+   задачи стартуют после готовности.
+
+Замеряется время от запуска процесса до первого getUpdates и до ответа на
+«📈 Рейтинг», отправленный сразу после него. Ответ должен содержать всех
+игроков - рейтинг, построенный в фоне, не отдается недостроенным. Медиана
+быстрого запуска сравнивается с целью STARTUP_TARGET. С --profile в
+конце выводится отчет python -m utils.startup.
+
+    python -m benchmarks.cold_start --players 200000 --runs 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import signal
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from benchmarks.common import use_temp_database
+from benchmarks.fake_telegram import FakeTelegram, message_update
+from config import STARTUP_TARGET
+from models import Player, SessionMaker
+from services import init_default_crises, init_default_incidents
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StartupTelegram(FakeTelegram):
+    """Заглушка, запоминающая момент первого getUpdates и тексты ответов"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_poll = asyncio.Event()
+        self.first_poll_at = 0.0
+        self.answers = []
+
+    async def _method_getUpdates(self, params: dict):
+        if not self.first_poll.is_set():
+            self.first_poll_at = time.perf_counter()
+            self.first_poll.set()
+        return await super()._method_getUpdates(params)
+
+    async def _method_sendMessage(self, params: dict):
+        self.answers.append((time.perf_counter(), params.get("text", "")))
+        return await super()._method_sendMessage(params)
+
+def _fill(players: int) -> None:
+    now = datetime.now().isoformat()
+    with SessionMaker() as session:
+        for start in range(1, players + 1, 50000):
+            session.execute(insert(Player), [
+                dict(
+                    user_id=user_id, username=f"user{user_id}", level=random.randint(1, 30),
+                    experience=random.randint(0, 5000), last_activity=now
+                )
+                for user_id in range(start, min(players, start + 49999) + 1)
+            ])
+        session.commit()
+
+async def _start(fake: StartupTelegram, url: str, fast: bool, args: list) -> tuple:
+    env = dict(
+        os.environ, BOT_TOKEN="123456:bench", TELEGRAM_API_URL=fake.base_url, DATABASE_URL=url,
+        DATABASE_SHARDS="1", RUN_MODE="polling", FAST_START="true" if fast else "false"
+    )
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, *args, cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    return process, started
+
+async def _run_once(url: str, fast: bool, players: int, args: list = ("main.py",)) -> tuple:
+    fake = StartupTelegram()
+    await fake.start()
+    process, started = await _start(fake, url, fast, list(args))
+    log = asyncio.create_task(process.stderr.read())
+    try:
+        await asyncio.wait_for(fake.first_poll.wait(), 120)
+        ready = fake.first_poll_at - started
+
+        # Первое обновление сразу после начала polling
+        fake.updates.append(message_update(1, 1, '📈 Рейтинг'))
+        deadline = time.perf_counter() + 120
+        while not fake.answers and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        answered_at, text = fake.answers[0]
+        complete = f"из {players}" in text
+        return ready, answered_at - started, complete
+    finally:
+        process.send_signal(signal.SIGINT)
+        await process.wait()
+        stderr = (await log).decode(errors="replace")
+        await fake.stop()
+        if process.returncode not in (0, -signal.SIGINT):
+            print(stderr[-2000:])
+
+async def _profile(url: str) -> str:
+    fake = StartupTelegram()
+    await fake.start()
+    process, _ = await _start(fake, url, True, ["-m", "utils.startup", "--top", "10"])
+    log = asyncio.create_task(process.stderr.read())
+    await asyncio.wait_for(fake.first_poll.wait(), 120)
+    # Отчет пишется сразу после готовности
+    await asyncio.sleep(0.5)
+    process.send_signal(signal.SIGINT)
+    await process.wait()
+    await fake.stop()
+    stderr = (await log).decode(errors="replace")
+    start = stderr.find("Профиль запуска:")
+    end = stderr.find("Готов принимать обновления", start)
+    return stderr[start:stderr.find("\n", end)] if start >= 0 else stderr[-2000:]
+
+async def run(players: int, runs: int, profile: bool) -> bool:
+    random.seed(42)
+    engine = use_temp_database()
+    await init_default_incidents()
+    await init_default_crises()
+    _fill(players)
+    engine.dispose()
+    url = engine.url.render_as_string(hide_password=False)
+
+    print(f"Холодный запуск main.py, {players} игроков, {runs} запуска(ов) в каждом режиме")
+    medians = {}
+    ok = True
+    for fast, name in ((False, "полный"), (True, "быстрый")):
+        results = [await _run_once(url, fast, players) for _ in range(runs)]
+        ready = statistics.median(result[0] for result in results)
+        answered = statistics.median(result[1] for result in results)
+        complete = all(result[2] for result in results)
+        ok = ok and complete
+        medians[fast] = ready
+        print(
+            f"  {name:<8} до приема обновлений {ready:.2f}с, до первого ответа {answered:.2f}с, "
+            f"рейтинг в ответе полный: {'ok' if complete else 'ОШИБКА'}"
+        )
+
+    within = medians[True] <= STARTUP_TARGET
+    print(
+        f"Быстрый запуск: {medians[False] - medians[True]:+.2f}с к полному, "
+        f"цель {STARTUP_TARGET:.1f}с - {'ok' if within else 'ПРЕВЫШЕНА'}"
+    )
+    if profile:
+        print(await _profile(url))
+    return ok and within
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    sys.exit(0 if asyncio.run(run(args.players, args.runs, args.profile)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import time
+from typing import List
+
+from models.migrations import migrate
+from models.sharding import create_shard_engines, router
+
+def use_temp_database(name: str = "bench.db", tuned: bool = True, shards: int = 1):
+    """Переключение фабрики сессий на временную базу данных (или shards файлов) без логирования SQL"""
+    path = os.path.join(tempfile.mkdtemp(prefix="devops_bench_"), name)
+    engines = create_shard_engines(f"sqlite:///{path}", shards, echo=False, tuned=tuned)
+    router.configure(engines)
+    for engine in engines:
+        migrate(engine)
+    return engines[0]
+
+def percentile(values: List[float], percent: float) -> float:
+    """Перцентиль по отсортированной выборке (без интерполяции)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+def format_latency(values: List[float]) -> str:
+    """Строка с p50/p99/max в миллисекундах"""
+    return (
+        f"p50={percentile(values, 50) * 1000:.2f}ms "
+        f"p99={percentile(values, 99) * 1000:.2f}ms "
+        f"max={max(values, default=0) * 1000:.2f}ms"
+    )
+
+class Timer:
+    """Контекстный менеджер для замера времени"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
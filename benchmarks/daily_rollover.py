@@ -0,0 +1,112 @@
+"""Пакетный перенос ежедневных заданий против создания при первом просмотре.
+
+Заполняет временную базу --players игроками, замеряет полный перенос на
+следующий день, затем прерывает перенос еще одного дня на середине и
+продолжает его с контрольной точки, проверяя, что у каждого игрока ровно
+один набор заданий. Для сравнения замеряется прежний путь (удаление и
+вставка отдельной сессией на каждого игрока) на --legacy-players игроках
+и число SQL-запросов при просмотре заданий после переноса.
+
+    python -m benchmarks.daily_rollover --players 1000000 --batch 2000
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from benchmarks.common import Timer, use_temp_database
+from models import DailyTask, Player, SessionMaker, count_queries
+from services.daily_rollover import _rollover_batch, run_daily_rollover
+from services.daily_service import _generate_daily_tasks, get_daily_tasks
+
+def _fill_players(players: int):
+    now = datetime.now().isoformat()
+    with SessionMaker() as session:
+        for start in range(1, players + 1, 50000):
+            session.execute(insert(Player), [
+                dict(user_id=user_id, username=f"user{user_id}", level=random.randint(1, 20), last_activity=now)
+                for user_id in range(start, min(players, start + 49999) + 1)
+            ])
+        session.commit()
+
+def _check_day(day: str, players: int) -> bool:
+    # У каждого игрока 2-3 задания на день и ни одного повторного набора
+    with SessionMaker() as session:
+        counts = session.query(func.count()).filter(
+            DailyTask.date_created == day
+        ).group_by(DailyTask.user_id).subquery()
+        users, smallest, largest = session.query(
+            func.count(), func.min(counts.c[0]), func.max(counts.c[0])
+        ).select_from(counts).one()
+    return users == players and smallest >= 2 and largest <= 3
+
+def _legacy(players: int) -> float:
+    # Прежний путь: отдельная сессия и коммит на каждого игрока при первом просмотре
+    with Timer() as timer:
+        for user_id in range(1, players + 1):
+            with SessionMaker() as session:
+                _generate_daily_tasks(session, user_id)
+    return timer.elapsed
+
+async def run(players: int, batch: int, legacy_players: int) -> bool:
+    random.seed(42)
+    use_temp_database()
+    with Timer() as timer:
+        _fill_players(players)
+    print(f"Игроков: {players}, заполнение базы {timer.elapsed:.1f}с")
+
+    today = date.today()
+    first_day = (today + timedelta(days=1)).isoformat()
+    result = await run_daily_rollover(first_day, batch_size=batch)
+    print(
+        f"Перенос на {first_day}: {result.tasks} заданий, {result.batches} пакетов, "
+        f"{result.elapsed:.1f}с ({result.players / result.elapsed:.0f} игроков/с)"
+    )
+    ok = _check_day(first_day, players)
+
+    # Прерываем перенос следующего дня на середине и продолжаем с контрольной точки
+    second_day = (today + timedelta(days=2)).isoformat()
+    with SessionMaker() as session:
+        for _ in range(max(1, players // batch // 2)):
+            _rollover_batch(session, second_day, batch, None, random)
+    resumed = await run_daily_rollover(second_day, batch_size=batch)
+    repeated = await run_daily_rollover(second_day, batch_size=batch)
+    resumed_ok = _check_day(second_day, players) and repeated.batches == 0
+    print(
+        f"Продолжение после прерывания: {resumed.players} игроков дообработано, "
+        f"повторный запуск пакетов: {repeated.batches} - {'ok' if resumed_ok else 'ОШИБКА'}"
+    )
+    ok = ok and resumed_ok
+
+    # Просмотр заданий после переноса - один индексированный запрос
+    with count_queries() as queries:
+        await get_daily_tasks(1)
+    print(f"SQL-запросов при просмотре заданий сегодня (запасной путь): {queries.statements}")
+    with count_queries() as queries:
+        await get_daily_tasks(1)
+    print(f"SQL-запросов при повторном просмотре: {queries.statements}")
+
+    if legacy_players:
+        elapsed = _legacy(min(legacy_players, players))
+        rate = min(legacy_players, players) / elapsed
+        print(
+            f"Прежний путь: {rate:.0f} игроков/с, на {players} игроков ~{players / rate:.0f}с "
+            f"(пакетный перенос быстрее в {result.players / result.elapsed / rate:.1f} раз)"
+        )
+
+    print("Результат:", "ok" if ok else "ОШИБКА")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--legacy-players", type=int, default=5000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.players, args.batch, args.legacy_players)) else 1)
+
+if __name__ == "__main__":
+    main()
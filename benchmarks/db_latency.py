@@ -0,0 +1,64 @@
+"""Задержка обработчиков при 500 одновременных пользователях.
+
+Сравнивает прежнее поведение (синхронная сессия прямо в цикле событий)
+с выполнением через run_in_session. Для каждого режима выводятся p50/p99
+задержки обработчиков с запросами к БД и «легких» обработчиков без БД,
+которые страдают от блокировки цикла событий.
+
+    python -m benchmarks.db_latency --users 500 --rounds 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import use_temp_database, format_latency
+from models import SessionMaker, run_in_session
+from services.player_service import _get_or_create_player, _get_player_profile, _update_experience
+
+async def _inline(func, *args):
+    # Прежний вариант: блокирующий вызов внутри корутины
+    with SessionMaker() as session:
+        return func(session, *args)
+
+async def _virtual_user(user_id: int, rounds: int, runner, db_latency: list, light_latency: list):
+    for _ in range(rounds):
+        await asyncio.sleep(random.random() * 0.01)
+        
+        started = time.perf_counter()
+        await runner(_get_player_profile, user_id)
+        await runner(_update_experience, user_id, 10)
+        db_latency.append(time.perf_counter() - started)
+        
+        # Обработчик без обращения к БД (например, ответ на нажатие кнопки)
+        started = time.perf_counter()
+        await asyncio.sleep(0)
+        light_latency.append(time.perf_counter() - started)
+
+async def run(users: int, rounds: int):
+    use_temp_database()
+    for user_id in range(1, users + 1):
+        await run_in_session(_get_or_create_player, user_id, f"user{user_id}")
+    
+    for name, runner in (("inline", _inline), ("executor", run_in_session)):
+        db_latency, light_latency = [], []
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _virtual_user(user_id, rounds, runner, db_latency, light_latency)
+            for user_id in range(1, users + 1)
+        ])
+        elapsed = time.perf_counter() - started
+        
+        print(f"[{name}] {users} пользователей x {rounds} раундов за {elapsed:.2f}s")
+        print(f"  обработчики с БД:  {format_latency(db_latency)}")
+        print(f"  обработчики без БД: {format_latency(light_latency)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Стресс-проверка экономики: 100 параллельных callback'ов на пользователя.
+
+Для каждого пользователя одновременно запускаются покупки серверов,
+улучшения навыков, ремонты и повторные получения одной награды. После
+этого проверяется, что баланс сходится с суммой успешных операций, деньги
+не ушли в минус, а награда выдана не больше одного раза.
+
+    python -m benchmarks.economy_stress --users 20 --callbacks 100
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from benchmarks.common import use_temp_database
+from models import DailyTask, Player, Skill, SessionMaker
+from services import buy_server, claim_task_reward, get_or_create_player, repair_server, upgrade_skill
+
+INITIAL_MONEY = 20000
+TASK_REWARD = 500
+SKILLS = ['Linux', 'Networking', 'Docker', 'CI/CD', 'Monitoring']
+
+async def _callback(user_id: int, task_id: int):
+    action = random.choice(("buy", "upgrade", "repair", "claim"))
+    if action == "buy":
+        success, cost = await buy_server(user_id)
+        return action, None, success, -cost
+    if action == "upgrade":
+        skill_name = random.choice(SKILLS)
+        success, _, cost = await upgrade_skill(user_id, skill_name)
+        return action, skill_name, success, -cost
+    if action == "repair":
+        success, _, cost = await repair_server(user_id, 25)
+        return action, None, success, -cost
+    success, money, _ = await claim_task_reward(user_id, task_id)
+    return action, None, success, money
+
+def _prepare(users: int) -> dict:
+    tasks = {}
+    with SessionMaker() as session:
+        for user_id in range(1, users + 1):
+            player = session.get(Player, user_id)
+            player.money = INITIAL_MONEY
+            player.server_health = 0.0
+            task = DailyTask(
+                user_id=user_id, task_type="solve_incidents", description="stress",
+                target_amount=1, current_amount=1, reward_money=TASK_REWARD, reward_exp=10,
+                completed=True, date_created=datetime.now().date().isoformat()
+            )
+            session.add(task)
+            session.flush()
+            tasks[user_id] = task.id
+        session.commit()
+    return tasks
+
+def _verify(user_id: int, results: list) -> list:
+    errors = []
+    successes = [result for result in results if result[2]]
+    expected_money = INITIAL_MONEY + sum(delta for *_, delta in successes)
+    bought = sum(1 for action, *_ in successes if action == "buy")
+    claimed = sum(1 for action, *_ in successes if action == "claim")
+    upgraded = Counter(skill for action, skill, *_ in successes if action == "upgrade")
+    
+    with SessionMaker() as session:
+        player = session.get(Player, user_id)
+        levels = dict(session.query(Skill.skill_name, Skill.skill_level).filter(Skill.user_id == user_id))
+    
+    if player.money != expected_money:
+        errors.append(f"user {user_id}: баланс {player.money}, ожидалось {expected_money}")
+    if player.money < 0:
+        errors.append(f"user {user_id}: отрицательный баланс {player.money}")
+    if player.servers != 1 + bought:
+        errors.append(f"user {user_id}: серверов {player.servers}, куплено {bought}")
+    if claimed > 1:
+        errors.append(f"user {user_id}: награда получена {claimed} раз")
+    for skill_name in SKILLS:
+        if levels[skill_name] != 1 + upgraded[skill_name]:
+            errors.append(f"user {user_id}: {skill_name} уровень {levels[skill_name]}, улучшений {upgraded[skill_name]}")
+    return errors
+
+async def run(users: int, callbacks: int) -> bool:
+    use_temp_database()
+    for user_id in range(1, users + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+    tasks = _prepare(users)
+    
+    started = time.perf_counter()
+    per_user = await asyncio.gather(*[
+        asyncio.gather(*[_callback(user_id, tasks[user_id]) for _ in range(callbacks)])
+        for user_id in range(1, users + 1)
+    ])
+    elapsed = time.perf_counter() - started
+    
+    errors = []
+    for user_id, results in enumerate(per_user, start=1):
+        errors.extend(_verify(user_id, results))
+    
+    total = users * callbacks
+    print(f"{total} callback'ов за {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+    for error in errors:
+        print(f"  ОШИБКА: {error}")
+    print("Баланс сходится" if not errors else f"Найдено расхождений: {len(errors)}")
+    return not errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--callbacks", type=int, default=100)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.users, args.callbacks)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Локальные заглушки Telegram Bot API для замеров.
+
+FakeTelegram - HTTP-сервер: отдает заранее подготовленные обновления через
+getUpdates, принимает setWebhook и умеет сама отправлять обновления на вебхук.
+FakeSession - сессия бота без сети для прогона обновлений прямо через
+диспетчер. Обе на методы отправки сообщений отвечают минимальными
+корректными объектами.
+"""
+import asyncio
+import itertools
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import Chat, InlineKeyboardMarkup, Message, User
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+def _chat(user_id: int) -> dict:
+    return {"id": user_id, "type": "private", "first_name": f"user{user_id}"}
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    """Обновление с текстовым сообщением от пользователя"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": _chat(user_id),
+            "from": _user(user_id),
+            "text": text,
+        },
+    }
+
+def callback_update(update_id: int, user_id: int, data: str, message_text: str = "...", message_id: int = 0) -> dict:
+    """Обновление с нажатием inline-кнопки под сообщением бота (по умолчанию message_id = update_id)"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id or update_id,
+                "date": int(time.time()),
+                "chat": _chat(user_id),
+                "from": BOT_USER,
+                "text": message_text,
+            },
+        },
+    }
+
+class FakeTelegram:
+    """Заглушка Bot API на aiohttp"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.host = host
+        self.port = port
+        self.updates: List[dict] = []
+        self.calls = Counter()
+        self.webhook_url: Optional[str] = None
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        handler = getattr(self, f"_method_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _method_getMe(self, params: dict):
+        return BOT_USER
+
+    async def _method_getUpdates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        # Отдаем обновления начиная с offset; подтвержденные удаляем
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates:
+            await asyncio.sleep(0.05)
+        return self.updates[:limit]
+
+    async def _method_setWebhook(self, params: dict):
+        self.webhook_url = params.get("url")
+        return True
+
+    async def _method_deleteWebhook(self, params: dict):
+        self.webhook_url = None
+        return True
+
+    async def _method_sendMessage(self, params: dict):
+        chat_id = int(params["chat_id"])
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": _chat(chat_id),
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def _method_editMessageText(self, params: dict):
+        return await self._method_sendMessage(params)
+
+    async def push_to_webhook(self, updates: List[dict], concurrency: int = 40):
+        """Доставка обновлений на вебхук, как это делает Telegram (до concurrency соединений)"""
+        queue = list(reversed(updates))
+        async with aiohttp.ClientSession() as session:
+            async def worker():
+                while queue:
+                    update = queue.pop()
+                    async with session.post(self.webhook_url, json=update) as response:
+                        await response.read()
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+class FakeSession(BaseSession):
+    """Сессия бота без сети: запоминает вызовы и последние inline-кнопки в каждом чате"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.buttons: Dict[int, List[str]] = defaultdict(list)
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, (SendMessage, EditMessageText)):
+            chat_id = int(method.chat_id)
+            if isinstance(method.reply_markup, InlineKeyboardMarkup):
+                self.buttons[chat_id] = [
+                    button.callback_data
+                    for row in method.reply_markup.inline_keyboard
+                    for button in row
+                    if button.callback_data
+                ]
+            return Message(
+                message_id=next(self._message_ids),
+                date=int(time.time()),
+                chat=Chat(id=chat_id, type="private"),
+                from_user=User(**BOT_USER),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+        yield b""
+
+    async def close(self):
+        pass
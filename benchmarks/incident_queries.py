@@ -0,0 +1,47 @@
+"""Количество SQL-запросов на одно решение инцидента.
+
+    python -m benchmarks.incident_queries --players 50 --rounds 20
+"""
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+
+from benchmarks.common import use_temp_database
+from models import Incident, SessionMaker, count_queries
+from services import get_or_create_player, get_daily_tasks, init_default_incidents, solve_incident
+
+async def run(players: int, rounds: int):
+    use_temp_database()
+    await init_default_incidents()
+    with SessionMaker() as session:
+        incidents = session.query(Incident).all()
+    
+    for user_id in range(1, players + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+        await get_daily_tasks(user_id)
+    
+    statements = defaultdict(list)
+    for _ in range(rounds):
+        for user_id in range(1, players + 1):
+            incident = random.choice(incidents)
+            solution_key = random.choice(list(incident.possible_solutions))
+            with count_queries() as queries:
+                success, *_ = await solve_incident(user_id, incident.id, solution_key, 5.0)
+            statements["успех" if success else "неудача"].append(queries.statements)
+    
+    for outcome, counts in statements.items():
+        print(
+            f"{outcome}: {len(counts)} решений, SQL-запросов на callback "
+            f"min={min(counts)} avg={sum(counts) / len(counts):.2f} max={max(counts)}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.players, args.rounds))
+
+if __name__ == "__main__":
+    main()
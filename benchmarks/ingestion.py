@@ -0,0 +1,91 @@
+"""Пропускная способность приема обновлений: long polling против вебхука.
+
+Оба режима работают на одной машине с локальной заглушкой Bot API
+(benchmarks.fake_telegram) и реальными роутерами. Обновление - нажатие
+«🖥 Профиль», то есть чтение из БД и один sendMessage.
+
+    python -m benchmarks.ingestion --updates 5000 --users 500
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from aiogram import Dispatcher
+from aiohttp import web
+
+from benchmarks.common import use_temp_database
+from benchmarks.fake_telegram import FakeTelegram, message_update
+from handlers import setup_routers
+from services import get_or_create_player
+from utils.runner import create_bot, create_webhook_app, setup_concurrency, setup_outbox
+
+WEBHOOK_PORT = 8082
+
+def _updates(count: int, users: int, first_id: int) -> list:
+    return [
+        message_update(first_id + index, random.randint(1, users), '🖥 Профиль')
+        for index in range(count)
+    ]
+
+async def _wait_for(fake: FakeTelegram, sent: int, timeout: float = 600):
+    deadline = time.perf_counter() + timeout
+    while fake.calls['sendMessage'] < sent:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"обработано {fake.calls['sendMessage']} из {sent}")
+        await asyncio.sleep(0.01)
+
+async def run(count: int, users: int, concurrency: int):
+    use_temp_database()
+    for user_id in range(1, users + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+    
+    fake = FakeTelegram()
+    await fake.start()
+    bot = create_bot(api_url=fake.base_url)
+    dp = Dispatcher()
+    setup_concurrency(dp, concurrency)
+    # Без ограничения частоты отправки: замеряется прием обновлений
+    setup_outbox(dp, rate=0, chat_rate=0)
+    setup_routers(dp)
+    
+    # Long polling
+    fake.updates = _updates(count, users, 1)
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await _wait_for(fake, count)
+    polling_elapsed = time.perf_counter() - started
+    await dp.stop_polling()
+    await polling
+    
+    # Вебхук: заглушка сама доставляет обновления POST-запросами
+    runner = web.AppRunner(create_webhook_app(dp, bot))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", WEBHOOK_PORT).start()
+    fake.webhook_url = f"http://127.0.0.1:{WEBHOOK_PORT}/webhook"
+    
+    sent_before = fake.calls['sendMessage']
+    started = time.perf_counter()
+    await fake.push_to_webhook(_updates(count, users, count + 1))
+    await _wait_for(fake, sent_before + count)
+    webhook_elapsed = time.perf_counter() - started
+    
+    await runner.cleanup()
+    await fake.stop()
+    
+    print(f"{count} обновлений от {users} пользователей, параллельно до {concurrency}")
+    print(f"  polling: {polling_elapsed:.2f}s ({count / polling_elapsed:.0f} обновлений/с)")
+    print(f"  webhook: {webhook_elapsed:.2f}s ({count / webhook_elapsed:.0f} обновлений/с)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+    asyncio.run(run(args.updates, args.users, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Цена и проверка метрик: обработка с замерами и без, содержимое /metrics.
+
+Во временную базу записываются --players игроков, main.py запускается
+отдельным процессом с локальной заглушкой Bot API (benchmarks.fake_telegram)
+три раза:
+
+1. без метрик (METRICS_PORT=0);
+2. с метриками обработчиков и SQL (METRICS_PORT);
+3. с метриками и профилировщиком самых долгих обновлений (PROFILE_SLOW_UPDATES).
+
+В каждом режиме замеряется время ответа на --updates сообщений от
+случайных игроков. С метриками проверяется, что /metrics отдает время
+обработчиков по роутерам и их SQL-запросы, с профилировщиком - что /profile
+и файлы в PROFILE_DIR содержат стеки.
+
+    python -m benchmarks.instrumentation --players 500 --updates 3000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from benchmarks.common import use_temp_database
+from benchmarks.fake_telegram import FakeTelegram, message_update
+from services import get_or_create_player, init_default_crises, init_default_incidents
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTS = ('🖥 Профиль', '📊 Статистика', '📈 Рейтинг', '🚨 Инцидент', '🛒 Магазин')
+METRICS_PORT = 9191
+
+class BenchTelegram(FakeTelegram):
+    """Заглушка, отмечающая первый getUpdates"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_poll = asyncio.Event()
+
+    async def _method_getUpdates(self, params: dict):
+        self.first_poll.set()
+        return await super()._method_getUpdates(params)
+
+async def _get(path: str) -> str:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{METRICS_PORT}{path}") as response:
+            return await response.text()
+
+def _handler_counts(text: str) -> dict:
+    """Число вызовов по роутерам из bot_handler_seconds_count"""
+    counts = {}
+    for router, count in re.findall(r'^bot_handler_seconds_count\{router="(\w+)",handler="\w+"\} (\d+)', text, re.M):
+        counts[router] = counts.get(router, 0) + int(count)
+    return counts
+
+async def _run(url: str, players: int, count: int, metrics: bool, profile: bool) -> dict:
+    fake = BenchTelegram()
+    await fake.start()
+    profile_dir = tempfile.mkdtemp(prefix="devops_profile_")
+    env = dict(
+        os.environ, BOT_TOKEN="123456:bench", TELEGRAM_API_URL=fake.base_url, DATABASE_URL=url,
+        DATABASE_SHARDS="1", RUN_MODE="polling", WORKERS="1", FAST_START="false", LOG_LEVEL="WARNING",
+        CRISIS_FOLLOWUP_DELAY="600", METRICS_PORT=str(METRICS_PORT if metrics else 0),
+        PROFILE_SLOW_UPDATES="true" if profile else "false", PROFILE_DIR=profile_dir,
+        # Замеряется обработка, а не ограничения частоты отправки
+        OUTBOX_RATE="0", OUTBOX_CHAT_RATE="0"
+    )
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "main.py", cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    log = asyncio.create_task(process.stderr.read())
+    result = {'metrics': "", 'profile': ""}
+    try:
+        await asyncio.wait_for(fake.first_poll.wait(), 300)
+        sent_before = fake.calls['sendMessage']
+        started = time.perf_counter()
+        fake.updates.extend(
+            message_update(update_id, random.randint(1, players), random.choice(TEXTS))
+            for update_id in range(1, count + 1)
+        )
+        deadline = started + 300
+        while fake.calls['sendMessage'] - sent_before < count:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("бот не ответил на все обновления")
+            await asyncio.sleep(0.01)
+        result['elapsed'] = time.perf_counter() - started
+        if metrics:
+            result['metrics'] = await _get("/metrics")
+        if profile:
+            result['profile'] = await _get("/profile")
+    finally:
+        process.send_signal(signal.SIGINT)
+        await process.wait()
+        stderr = (await log).decode(errors="replace")
+        await fake.stop()
+        if "Traceback" in stderr:
+            print(stderr[-3000:])
+    result['files'] = [name for name in os.listdir(profile_dir) if name.endswith(".folded")]
+    return result
+
+async def run(players: int, count: int) -> bool:
+    random.seed(42)
+    engine = use_temp_database()
+    await init_default_incidents()
+    await init_default_crises()
+    for user_id in range(1, players + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+    engine.dispose()
+    url = engine.url.render_as_string(hide_password=False)
+
+    print(f"main.py, {players} игроков, {count} сообщений в каждом режиме")
+    ok = True
+    base = None
+    for name, metrics, profile in (
+        ("без метрик", False, False), ("метрики", True, False), ("метрики + профилировщик", True, True)
+    ):
+        result = await _run(url, players, count, metrics, profile)
+        base = base or result['elapsed']
+        checks = []
+        if metrics:
+            counts = _handler_counts(result['metrics'])
+            statements = re.search(r'^bot_handler_sql_statements_total\{router="profile_router"', result['metrics'], re.M)
+            select = re.search(r'^db_statement_seconds_count\{kind="SELECT"\} (\d+)', result['metrics'], re.M)
+            metrics_ok = (
+                sum(counts.values()) == count and {"profile_router", "incident_router", "shop_router"} <= set(counts)
+                and bool(statements) and bool(select) and int(select.group(1)) > 0
+            )
+            checks.append(f"/metrics: {'ok' if metrics_ok else 'ОШИБКА'} ({', '.join(f'{k} {v}' for k, v in sorted(counts.items()))})")
+            ok = ok and metrics_ok
+        if profile:
+            stacks = result['profile'].count("\n")
+            profile_ok = stacks > 0 and len(result['files']) > 0
+            checks.append(f"стеков в /profile: {stacks}, файлов: {len(result['files'])} - {'ok' if profile_ok else 'ОШИБКА'}")
+            ok = ok and profile_ok
+        print(
+            f"  {name:<24} {result['elapsed']:.2f}с ({count / result['elapsed']:>5.0f} обновлений/с, "
+            f"{(result['elapsed'] / base - 1) * 100:+.1f}%) " + "; ".join(checks)
+        )
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=3000)
+    args = parser.parse_args()
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    logging.getLogger("models.migrations").setLevel(logging.WARNING)
+    sys.exit(0 if asyncio.run(run(args.players, args.updates)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Стоимость построения клавиатур: прежние построители против кэшированных.
+
+Для каждой клавиатуры замеряется время одного вызова на повторяющихся
+входах, как в реальной игре: одни и те же инциденты, стоимости ремонта и
+уровни навыков. Результат новых построителей сверяется с прежним
+(одинаковый JSON для Bot API).
+
+    python -m benchmarks.keyboards --calls 20000
+"""
+import argparse
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+
+from services.catalog import Catalog, _incident_def
+from utils import keyboards
+
+# Копии прежних построителей из utils/keyboards.py
+
+def _legacy_main():
+    keyboard = [
+        [KeyboardButton(text='🖥 Профиль'), KeyboardButton(text='🚨 Инцидент')],
+        [KeyboardButton(text='📊 Навыки'), KeyboardButton(text='🛒 Магазин')],
+        [KeyboardButton(text='📋 Задания'), KeyboardButton(text='📊 Статистика')],
+        [KeyboardButton(text='🔧 Обслуживание'), KeyboardButton(text='📈 Рейтинг')]
+    ]
+    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+
+def _legacy_skills(skills):
+    keyboard = []
+    for skill in skills:
+        upgrade_cost = skill.skill_level * 200
+        keyboard.append([InlineKeyboardButton(
+            text=f"{skill.skill_name} (Уровень {skill.skill_level}) - Улучшить за ${upgrade_cost}",
+            callback_data=f"upgrade_{skill.skill_name}"
+        )])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def _legacy_shop(server_cost):
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=f"Купить сервер за ${server_cost}", callback_data="buy_server")
+    ]])
+
+def _legacy_solutions(incident):
+    keyboard = []
+    for key, solution in incident.possible_solutions.items():
+        keyboard.append([InlineKeyboardButton(text=solution.name, callback_data=f"solution_{key}")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def _legacy_maintenance(repair_cost):
+    keyboard = []
+    repair_options = [
+        ("🔧 Полный ремонт", "repair_100"),
+        ("🔧 Средний ремонт (50%)", "repair_50"),
+        ("🔧 Минимальный ремонт (25%)", "repair_25")
+    ]
+    for text, callback in repair_options:
+        cost = repair_cost
+        if callback == "repair_50":
+            cost = repair_cost // 2
+        elif callback == "repair_25":
+            cost = repair_cost // 4
+        keyboard.append([InlineKeyboardButton(text=f"{text} - ${cost}", callback_data=callback)])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def _legacy_tasks(tasks_data):
+    keyboard = []
+    for task in tasks_data:
+        if task['completed'] and not task.get('claimed', False):
+            keyboard.append([InlineKeyboardButton(
+                text=f"Получить награду за '{task['description']}'",
+                callback_data=f"claim_task_{task['id']}"
+            )])
+    keyboard.append([InlineKeyboardButton(text="🔄 Обновить задания", callback_data="refresh_tasks")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def _incidents():
+    # Инциденты в формате моделей, как их загружает каталог
+    incidents = []
+    for incident_id in range(1, 11):
+        solutions = {
+            f"s{index}": {"name": f"Решение {index}", "success_rate": 0.5, "skill": "Linux"}
+            for index in range(random.randint(2, 4))
+        }
+        incidents.append(SimpleNamespace(
+            id=incident_id, name=f"incident{incident_id}", description="", difficulty=1,
+            reward=100, possible_solutions=solutions, time_sensitive=0
+        ))
+    return Catalog([_incident_def(incident) for incident in incidents], []).incidents
+
+def _skill_sets(count: int):
+    names = ('Linux', 'Networking', 'Docker', 'CI/CD', 'Monitoring')
+    return [
+        [SimpleNamespace(skill_name=name, skill_level=random.randint(1, 5)) for name in names]
+        for _ in range(count)
+    ]
+
+def _per_call(func, inputs, calls: int) -> float:
+    started = time.perf_counter()
+    for index in range(calls):
+        func(inputs[index % len(inputs)])
+    return (time.perf_counter() - started) / calls
+
+def run(calls: int) -> bool:
+    random.seed(42)
+    incidents = list(_incidents().values())
+    skill_sets = _skill_sets(200)
+    # Стоимость ремонта кратна числу серверов и проценту здоровья: значения часто повторяются
+    repair_costs = [int(random.randint(0, 100) * random.randint(1, 5) * 5) for _ in range(1000)]
+    server_costs = [random.randint(1, 10) * 1000 for _ in range(1000)]
+    task_lists = [
+        [
+            {'id': task_id, 'description': f"Задание {task_id}", 'completed': random.random() < 0.5, 'claimed': False}
+            for task_id in range(start, start + 3)
+        ]
+        for start in range(0, 600, 3)
+    ]
+
+    cases = [
+        ("главная", lambda _: _legacy_main(), lambda _: keyboards.get_main_keyboard(), [None]),
+        ("навыки", _legacy_skills, keyboards.get_skills_keyboard, skill_sets),
+        ("магазин", _legacy_shop, keyboards.get_shop_keyboard, server_costs),
+        ("решения", _legacy_solutions, keyboards.get_incident_solutions_keyboard, incidents),
+        ("обслуживание", _legacy_maintenance, keyboards.get_maintenance_keyboard, repair_costs),
+        ("задания", _legacy_tasks, keyboards.get_daily_tasks_keyboard, task_lists),
+    ]
+
+    ok = True
+    print(f"{'клавиатура':<14} {'прежняя, мкс':>13} {'новая, мкс':>11} {'ускорение':>10} {'совпадает':>10}")
+    for name, legacy, current, inputs in cases:
+        same = all(
+            legacy(value).model_dump_json(exclude_none=True) == current(value).model_dump_json(exclude_none=True)
+            for value in inputs[:50]
+        )
+        ok = ok and same
+        before = _per_call(legacy, inputs, calls)
+        after = _per_call(current, inputs, calls)
+        print(
+            f"{name:<14} {before * 1e6:>13.2f} {after * 1e6:>11.2f} {before / after:>9.1f}x "
+            f"{'да' if same else 'НЕТ':>10}"
+        )
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.calls) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Рейтинг в памяти против ORDER BY по таблице игроков.
+
+Строит Leaderboard на --players игроках и замеряет топ-10, место игрока,
+соседей и обновление после начисления опыта. Для сравнения на базе из
+--sql-players игроков замеряются прежний запрос топа с ORDER BY и подсчет
+места через COUNT(*). В конце случайные обновления сверяются с полной
+сортировкой.
+
+    python -m benchmarks.leaderboard --players 1000000 --sql-players 100000
+"""
+import argparse
+import random
+import sys
+import time
+
+from sqlalchemy import insert, or_, and_, func
+
+from benchmarks.common import Timer, use_temp_database
+from models import Player, SessionMaker
+from services.leaderboard import Leaderboard
+
+def _players(count: int):
+    return [(user_id, random.randint(1, 50), random.randint(0, 5000)) for user_id in range(1, count + 1)]
+
+def _per_call(func, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls
+
+def _memory(players: int, calls: int):
+    rows = _players(players)
+    board = Leaderboard()
+    with Timer() as build:
+        board.load(rows)
+    print(f"Рейтинг в памяти, {players} игроков: построение {build.elapsed:.2f}с")
+
+    user_ids = [random.randint(1, players) for _ in range(calls)]
+    ids = iter(user_ids * 4)
+    results = {
+        "топ-10": _per_call(lambda: board.top(10), calls),
+        "место игрока": _per_call(lambda: board.rank(next(ids)), calls),
+        "соседи (±2)": _per_call(lambda: board.around(next(ids), 2), calls),
+        "обновление": _per_call(
+            lambda: board.update(next(ids), random.randint(1, 50), random.randint(0, 5000)), calls
+        ),
+    }
+    for name, seconds in results.items():
+        print(f"  {name:<14} {seconds * 1e6:>9.2f} мкс")
+
+def _sql(players: int, calls: int):
+    use_temp_database()
+    rows = _players(players)
+    with SessionMaker() as session:
+        session.execute(insert(Player), [
+            dict(user_id=user_id, username=f"user{user_id}", level=level, experience=experience)
+            for user_id, level, experience in rows
+        ])
+        session.commit()
+
+        def top():
+            session.query(
+                Player.username, Player.level, Player.experience, Player.successful_fixes, Player.server_health
+            ).order_by(Player.level.desc(), Player.experience.desc()).limit(10).all()
+
+        def rank():
+            _, level, experience = random.choice(rows)
+            session.query(func.count()).select_from(Player).filter(or_(
+                Player.level > level,
+                and_(Player.level == level, Player.experience > experience)
+            )).scalar()
+
+        print(f"SQL, {players} игроков:")
+        print(f"  {'топ-10':<14} {_per_call(top, calls) * 1e6:>9.2f} мкс")
+        print(f"  {'место игрока':<14} {_per_call(rank, max(1, calls // 10)) * 1e6:>9.2f} мкс")
+
+def _verify(players: int, updates: int) -> bool:
+    board = Leaderboard()
+    board.LOAD = 16  # Маленькие блоки, чтобы чаще проверять разбиение и удаление блоков
+    state = {user_id: (level, experience) for user_id, level, experience in _players(players)}
+    board.load((user_id, *values) for user_id, values in state.items())
+
+    for _ in range(updates):
+        user_id = random.randint(1, players + players // 10)
+        if random.random() < 0.05:
+            board.remove(user_id)
+            state.pop(user_id, None)
+        else:
+            state[user_id] = (random.randint(1, 50), random.randint(0, 5000))
+            board.update(user_id, *state[user_id])
+
+    expected = sorted(state, key=lambda user_id: (-state[user_id][0], -state[user_id][1], user_id))
+    top = [entry[0] for entry in board.top(len(expected))]
+    ranks_ok = all(board.rank(user_id) == index + 1 for index, user_id in enumerate(expected))
+    probe = random.choice(expected)
+    first, around = board.around(probe, 3)
+    around_ok = [entry[0] for entry in around] == expected[first - 1:first - 1 + len(around)]
+    return top == expected and ranks_ok and around_ok and len(board) == len(expected)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000000)
+    parser.add_argument("--sql-players", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    _memory(args.players, args.calls)
+    if args.sql_players:
+        _sql(args.sql_players, max(1, args.calls // 10))
+
+    ok = _verify(5000, 20000)
+    print(f"Сверка с полной сортировкой: {'ok' if ok else 'РАСХОЖДЕНИЕ'}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
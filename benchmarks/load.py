@@ -0,0 +1,202 @@
+"""Нагрузочный прогон: виртуальные игроки против настоящих роутеров.
+
+Диспетчер собирается через handlers.setup_routers, сессия бота заменена
+на FakeSession, поэтому сеть не участвует. Каждый виртуальный игрок
+последовательно проходит сценарий: инцидент и решение, ремонт, покупка
+сервера, улучшение навыка, задания и просмотр экранов. Игроки работают
+параллельно. Отчет: пропускная способность, перцентили задержки и
+среднее число SQL-запросов для каждого шага сценария.
+
+С --double-tap доля нажатий повторяется еще один-два раза одновременно
+(двойной тап); повторы отчитываются отдельным шагом «(повтор)», а отчет
+показывает, сколько из них отброшено middleware последовательной обработки
+игрока. --no-serialize отключает его для сравнения.
+
+    python -m benchmarks.load --players 200 --iterations 5
+    python -m benchmarks.load --players 200 --iterations 5 --double-tap 0.3
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from benchmarks.common import percentile, use_temp_database
+from benchmarks.fake_telegram import FakeSession, callback_update, message_update
+from handlers import setup_routers
+from models import count_queries
+from services import init_default_crises, init_default_incidents
+from services.progress_queue import progress_queue
+from utils.outbox import outbox
+from utils.runner import setup_outbox, setup_user_serialization
+from utils.scheduler import scheduler
+
+def _chat_id(update: Update) -> int:
+    if update.callback_query is not None:
+        return update.callback_query.message.chat.id
+    return update.message.chat.id
+
+class LoadHarness:
+    """Диспетчер с фиктивным Bot API и сбором статистики по шагам сценария"""
+
+    def __init__(self, latency: float = 0.0, double_tap: float = 0.0, serialize: bool = True):
+        self.session = FakeSession(latency=latency)
+        self.bot = Bot(token="123456:load", session=self.session)
+        self.dp = Dispatcher()
+        self.serializer = setup_user_serialization(self.dp) if serialize else None
+        # Без ограничения частоты: замеряется обработка, а не лимиты Telegram
+        setup_outbox(self.dp, rate=0, chat_rate=0)
+        setup_routers(self.dp)
+        self.double_tap = double_tap
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.statements: Dict[str, List[int]] = defaultdict(list)
+        self._update_ids = itertools.count(1)
+
+    async def feed(self, step: str, raw_update: dict):
+        update = Update.model_validate(raw_update, context={"bot": self.bot})
+        with count_queries() as queries:
+            started = time.perf_counter()
+            await self.dp.feed_update(self.bot, update)
+            # Ответы обработчика уходят через исходящую очередь: ждем их отправки
+            await outbox.flush(_chat_id(update))
+            self.latency[step].append(time.perf_counter() - started)
+        self.statements[step].append(queries.statements)
+
+    async def message(self, user_id: int, text: str):
+        await self.feed(f"message {text}", message_update(next(self._update_ids), user_id, text))
+
+    async def press(self, user_id: int, prefix: str, message_text: str = "...") -> bool:
+        """Нажать случайную кнопку с указанным префиксом из последней клавиатуры игрока"""
+        candidates = [data for data in self.session.buttons[user_id] if data.startswith(prefix)]
+        if not candidates:
+            return False
+        data = random.choice(candidates)
+        step = f"callback {prefix.rstrip('_')}"
+        message_id = next(self._update_ids)
+        taps = [self.feed(step, callback_update(message_id, user_id, data, message_text))]
+        if random.random() < self.double_tap:
+            # Повторные нажатия той же кнопки под тем же сообщением приходят одновременно
+            taps.extend(
+                self.feed(f"{step} (повтор)", callback_update(next(self._update_ids), user_id, data, message_text, message_id))
+                for _ in range(random.randint(1, 2))
+            )
+        await asyncio.gather(*taps)
+        return True
+
+    async def follow_up(self, user_id: int) -> bool:
+        """Отправить отложенный после кризиса инцидент сразу, как будто задержка уже прошла"""
+        with count_queries() as queries:
+            started = time.perf_counter()
+            fired = await scheduler.fire(("incident", user_id))
+            await outbox.flush(user_id)
+            elapsed = time.perf_counter() - started
+        if fired:
+            self.latency["scheduled incident"].append(elapsed)
+            self.statements["scheduled incident"].append(queries.statements)
+        return fired
+
+    def total_updates(self) -> int:
+        return sum(len(values) for values in self.latency.values())
+
+    def report(self, elapsed: float):
+        total = self.total_updates()
+        print(f"{total} обновлений за {elapsed:.2f}s: {total / elapsed:.0f} обновлений/с")
+        print(f"{'шаг':<28} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'SQL':>6}")
+        for step in sorted(self.latency):
+            values = self.latency[step]
+            statements = self.statements[step]
+            print(
+                f"{step:<28} {len(values):>7} "
+                f"{percentile(values, 50) * 1000:>9.2f} "
+                f"{percentile(values, 95) * 1000:>9.2f} "
+                f"{percentile(values, 99) * 1000:>9.2f} "
+                f"{sum(statements) / len(statements):>6.1f}"
+            )
+        print("Вызовы Bot API:", dict(self.session.calls))
+        if self.serializer is not None:
+            stats = self.serializer.stats()
+            repeats = sum(len(values) for step, values in self.latency.items() if step.endswith("(повтор)"))
+            print(
+                f"Последовательная обработка: ждали предыдущее обновление игрока {stats['waited']}, "
+                f"отброшено повторных нажатий {stats['duplicates']} из {repeats}, "
+                f"блокировок сейчас {stats['locks']}, максимум {stats['max_locks']}"
+            )
+
+async def virtual_player(harness: LoadHarness, user_id: int, iterations: int, think: float):
+    async def pause():
+        await asyncio.sleep(random.random() * think if think else 0)
+    
+    await harness.message(user_id, "/start")
+    for _ in range(iterations):
+        await pause()
+        await harness.message(user_id, '🚨 Инцидент')
+        await harness.follow_up(user_id)
+        await pause()
+        await harness.press(user_id, "solution_", "🚨 ИНЦИДЕНТ")
+        
+        await harness.message(user_id, '🔧 Обслуживание')
+        await harness.press(user_id, "repair_")
+        
+        await harness.message(user_id, '🛒 Магазин')
+        await harness.press(user_id, "buy_server")
+        
+        await harness.message(user_id, '📊 Навыки')
+        await harness.press(user_id, "upgrade_")
+        
+        await harness.message(user_id, '📋 Задания')
+        await harness.press(user_id, "claim_task_")
+        
+        for screen in ('🖥 Профиль', '📊 Статистика', '📈 Рейтинг'):
+            await pause()
+            await harness.message(user_id, screen)
+
+async def run(
+    players: int, iterations: int, think: float, latency: float,
+    harness: Optional[LoadHarness] = None, shards: int = 1, double_tap: float = 0.0, serialize: bool = True
+) -> LoadHarness:
+    use_temp_database(shards=shards)
+    await init_default_incidents()
+    await init_default_crises()
+    
+    harness = harness or LoadHarness(latency=latency, double_tap=double_tap, serialize=serialize)
+    await progress_queue.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        virtual_player(harness, user_id, iterations, think)
+        for user_id in range(1, players + 1)
+    ])
+    await progress_queue.stop()
+    await outbox.stop()
+    harness.report(time.perf_counter() - started)
+    stats = progress_queue.stats()
+    print(
+        f"Очередь прогресса: {stats['events']} событий, {stats['flushes']} записей, "
+        f"{stats['events_per_flush']:.1f} событий на запись"
+    )
+    return harness
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--think", type=float, default=0.0, help="максимальная пауза между шагами, с")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--shards", type=int, default=1, help="число шардов базы")
+    parser.add_argument("--double-tap", type=float, default=0.0, help="доля нажатий, повторенных одновременно")
+    parser.add_argument("--no-serialize", action="store_true", help="без последовательной обработки обновлений игрока")
+    args = parser.parse_args()
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+    logging.getLogger("models").setLevel(logging.WARNING)
+    asyncio.run(run(
+        args.players, args.iterations, args.think, args.latency, shards=args.shards,
+        double_tap=args.double_tap, serialize=not args.no_serialize
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Наплыв /start: регистрация новых игроков по одному против пакетов.
+
+--users новых игроков присылают /start одновременно (не больше
+--concurrency обработчиков сразу, обновления одного игрока - по очереди),
+--repeat от числа запросов - повторные /start уже пришедших игроков.
+Каждый режим работает на своей временной базе:
+
+1. прежняя регистрация: SELECT, INSERT игрока с коммитом, INSERT навыков
+   с коммитом, перечитывание игрока;
+2. get_or_create_player: SELECT и одна транзакция на игрока;
+3. services.onboarding: INSERT ... ON CONFLICT DO NOTHING RETURNING на пакет
+   одновременных регистраций и один коммит.
+
+Отчет: новых игроков в секунду, SQL-запросы и коммиты. Проверяется, что у
+каждого игрока ровно одна строка и пять навыков.
+
+    python -m benchmarks.onboarding --users 5000 --repeat 0.2 --concurrency 100
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func
+
+from benchmarks.common import Timer, use_temp_database
+from config import MAX_CONCURRENT_UPDATES
+from models import Player, SessionMaker, Skill, count_queries, run_for_user
+from services import get_or_create_player
+from services.onboarding import PlayerOnboarding
+from services.player_service import BASIC_SKILLS
+
+def _legacy_get_or_create_player(session, user_id: int, username: str) -> Player:
+    # Прежняя реализация: три обращения к базе и два коммита на нового игрока
+    player = session.query(Player).filter(Player.user_id == user_id).first()
+    if not player:
+        player = Player(user_id=user_id, username=username, last_activity=datetime.now().isoformat())
+        session.add(player)
+        session.commit()
+        session.add_all([Skill(user_id=user_id, skill_name=name, skill_level=1) for name in BASIC_SKILLS])
+        session.commit()
+        session.refresh(player)
+    return player
+
+def _requests(users: int, repeat: float) -> list:
+    requests = []
+    for user_id in range(1, users + 1):
+        requests.append(user_id)
+        # Повторный /start от уже пришедшего игрока
+        while random.random() < repeat:
+            requests.append(random.randint(1, user_id))
+    return requests
+
+def _consistent(users: int) -> bool:
+    with SessionMaker() as session:
+        players = session.query(func.count(Player.user_id)).scalar()
+        skills = session.query(Skill.user_id, func.count()).group_by(Skill.user_id).all()
+    return players == users and len(skills) == users and all(count == len(BASIC_SKILLS) for _, count in skills)
+
+async def _storm(requests: list, concurrency: int, register) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    # Обновления одного игрока обрабатываются по очереди, как в UserSerializationMiddleware
+    locks = defaultdict(asyncio.Lock)
+
+    async def start(user_id: int):
+        async with locks[user_id], semaphore:
+            await register(user_id, f"user{user_id}")
+
+    with count_queries() as queries, Timer() as timer:
+        await asyncio.gather(*(start(user_id) for user_id in requests))
+    return timer.elapsed, queries.statements
+
+async def run(users: int, repeat: float, concurrency: int) -> bool:
+    random.seed(42)
+    requests = _requests(users, repeat)
+    print(f"{users} новых игроков, {len(requests)} /start, до {concurrency} обработчиков одновременно")
+
+    async def legacy(user_id: int, username: str):
+        await run_for_user(_legacy_get_or_create_player, user_id, username)
+
+    onboarding = PlayerOnboarding()
+    ok = True
+    base = None
+    for name, register, commits in (
+        ("по одному (прежняя)", legacy, None),
+        ("get_or_create_player", get_or_create_player, None),
+        ("пакетами", onboarding.register, lambda: onboarding.stats()['batches'])
+    ):
+        use_temp_database()
+        elapsed, statements = await _storm(requests, concurrency, register)
+        consistent = _consistent(users)
+        ok = ok and consistent
+        rate = users / elapsed
+        base = base or rate
+        extra = f", коммитов: {commits()}" if commits else ""
+        print(
+            f"  {name:<22} {elapsed:6.2f}с ({rate:>6.0f} игроков/с, x{rate / base:.1f}), "
+            f"SQL на игрока: {statements / users:.2f}{extra} - {'ok' if consistent else 'ОШИБКА'}"
+        )
+
+    stats = onboarding.stats()
+    counted = stats['created'] == users and stats['failed'] == 0
+    ok = ok and counted
+    print(
+        f"  пакетов: {stats['batches']}, игроков на пакет: {stats['players_per_batch']:.1f} "
+        f"(максимум {stats['largest_batch']}), создано {stats['created']}, уже были {stats['existing']} - "
+        f"{'ok' if counted else 'ОШИБКА'}"
+    )
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--repeat", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_UPDATES)
+    args = parser.parse_args()
+    logging.getLogger("models.migrations").setLevel(logging.WARNING)
+    sys.exit(0 if asyncio.run(run(args.users, args.repeat, args.concurrency)) else 1)
+
+if __name__ == "__main__":
+    main()
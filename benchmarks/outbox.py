@@ -0,0 +1,185 @@
+"""Исходящая очередь против локального Bot API с ограничением частоты.
+
+Заглушка Bot API (benchmarks.fake_telegram) ограничивает вызовы так же,
+как Telegram: не больше --rate в секунду всего и --chat-rate в секунду
+(подряд до --chat-burst) в один чат, сверх этого отвечает 429 с
+retry_after. Каждый из --chats чатов одновременно получает --messages
+сообщений, одну правку и один ответ на нажатие кнопки (как рассылка о
+кризисе). Режимы:
+
+1. без очереди: все вызовы сразу, как await в обработчиках - часть
+   получает 429, и обработчик завершился бы ошибкой;
+2. через utils.outbox.Outbox с теми же ограничениями: все вызовы
+   доставлены, порядок сообщений в чате сохранен, ответы на нажатия
+   уходят раньше правок.
+
+    python -m benchmarks.outbox --chats 40 --messages 5 --rate 30 --chat-rate 1 --chat-burst 3
+"""
+import argparse
+import asyncio
+import logging
+import re
+import sys
+import time
+from collections import defaultdict
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage
+from aiohttp import web
+
+from benchmarks.common import format_latency
+from benchmarks.fake_telegram import FakeTelegram
+from utils.outbox import ANSWER, EDIT, SEND, Outbox, TokenBucket, lane_of
+from utils.runner import create_bot
+
+class ThrottlingTelegram(FakeTelegram):
+    """Заглушка с ограничением частоты вызовов: общим и на чат"""
+
+    def __init__(self, rate: float, chat_rate: float, chat_burst: float, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.bucket = TokenBucket(rate, rate, time.monotonic())
+        self.chat_buckets = {}
+        self.rejected = 0
+        # Чат -> номера сообщений в порядке получения
+        self.received = defaultdict(list)
+
+    def _allowed(self, bucket: TokenBucket, now: float) -> bool:
+        if bucket.ready_at(now) > now:
+            return False
+        bucket.take(now)
+        return True
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if method in ("sendMessage", "editMessageText", "answerCallbackQuery"):
+            params = dict(await request.post())
+            now = time.monotonic()
+            allowed = self._allowed(self.bucket, now)
+            if allowed and "chat_id" in params:
+                chat_id = int(params["chat_id"])
+                bucket = self.chat_buckets.get(chat_id)
+                if bucket is None:
+                    bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+                allowed = self._allowed(bucket, now)
+            if not allowed:
+                self.rejected += 1
+                return web.json_response({
+                    "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1}
+                }, status=429)
+            if "chat_id" in params:
+                match = re.search(r"#(\d+)", params.get("text", ""))
+                self.received[int(params["chat_id"])].append(int(match.group(1)) if match else -1)
+            self.calls[method] += 1
+            handler = getattr(self, f"_method_{method}", None)
+            result = await handler(params) if handler else True
+            return web.json_response({"ok": True, "result": result})
+        return await super()._handle(request)
+
+def _workload(bot, chats: int, messages: int) -> list:
+    """Вызовы в порядке постановки: сообщения чата с номерами, в середине - правка и ответ на нажатие"""
+    calls = []
+    for number in range(messages):
+        for chat_id in range(1, chats + 1):
+            calls.append(SendMessage(chat_id=chat_id, text=f"Сообщение #{number}").as_(bot))
+            if number == messages // 2:
+                calls.append(EditMessageText(chat_id=chat_id, message_id=1, text=f"Правка #{number}").as_(bot))
+                calls.append(AnswerCallbackQuery(callback_query_id=str(chat_id)).as_(bot))
+    return calls
+
+def _ordered(fake: ThrottlingTelegram) -> bool:
+    return all(numbers == sorted(numbers) for numbers in fake.received.values())
+
+async def _direct(fake: ThrottlingTelegram, bot, chats: int, messages: int) -> dict:
+    calls = _workload(bot, chats, messages)
+
+    async def call(method):
+        try:
+            await method
+            return True
+        except TelegramRetryAfter:
+            return False
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[call(method) for method in calls])
+    return {'elapsed': time.perf_counter() - started, 'total': len(calls), 'delivered': sum(results)}
+
+async def _queued(fake: ThrottlingTelegram, bot, chats: int, messages: int, rate: float, chat_rate: float, chat_burst: float) -> dict:
+    outbox = Outbox(rate=rate, chat_rate=chat_rate, chat_burst=chat_burst, max_retries=10)
+    calls = _workload(bot, chats, messages)
+    latency = defaultdict(list)
+    started = time.perf_counter()
+
+    def done(lane: int):
+        return lambda future: latency[lane].append(time.perf_counter() - started)
+
+    for method in calls:
+        outbox.send(method).add_done_callback(done(lane_of(method)))
+    enqueued = time.perf_counter() - started
+    await outbox.flush()
+    elapsed = time.perf_counter() - started
+    await outbox.stop()
+    stats = outbox.stats()
+    return {
+        'elapsed': elapsed, 'total': len(calls), 'delivered': stats['sent'], 'retried': stats['retried'],
+        'enqueued': enqueued, 'latency': latency
+    }
+
+async def run(chats: int, messages: int, rate: float, chat_rate: float, chat_burst: float) -> bool:
+    print(
+        f"{chats} чатов по {messages} сообщений, правке и ответу на нажатие; "
+        f"ограничения: {rate:.0f}/с всего, {chat_rate:g}/с на чат (подряд до {chat_burst:g})"
+    )
+
+    fake = ThrottlingTelegram(rate, chat_rate, chat_burst)
+    await fake.start()
+    bot = create_bot(token="123456:outbox", api_url=fake.base_url)
+    direct = await _direct(fake, bot, chats, messages)
+    print(
+        f"  без очереди:   {direct['delivered']} из {direct['total']} доставлено за {direct['elapsed']:.2f}с, "
+        f"отклонено 429: {fake.rejected}"
+    )
+    await bot.session.close()
+    await fake.stop()
+
+    # Ведра заглушки наполнены заново
+    fake = ThrottlingTelegram(rate, chat_rate, chat_burst)
+    await fake.start()
+    bot = create_bot(token="123456:outbox", api_url=fake.base_url)
+    queued = await _queued(fake, bot, chats, messages, rate, chat_rate, chat_burst)
+    await bot.session.close()
+    await fake.stop()
+    ordered = _ordered(fake)
+    latency = queued['latency']
+    answers_first = max(latency[ANSWER]) < sorted(latency[EDIT])[len(latency[EDIT]) // 2]
+    print(
+        f"  через очередь: {queued['delivered']} из {queued['total']} доставлено за {queued['elapsed']:.2f}с "
+        f"({queued['delivered'] / queued['elapsed']:.1f} вызовов/с при лимите {rate:.0f}/с), "
+        f"отклонено 429: {fake.rejected}, повторов: {queued['retried']}"
+    )
+    print(f"    постановка в очередь: {queued['enqueued'] * 1000:.2f} мс на все вызовы")
+    for lane, name in ((ANSWER, "ответы на нажатия"), (SEND, "сообщения"), (EDIT, "правки")):
+        print(f"    {name:<18} {format_latency(latency[lane])}")
+    print(
+        f"  порядок сообщений в чатах: {'ok' if ordered else 'НАРУШЕН'}; "
+        f"ответы раньше половины правок: {'ok' if answers_first else 'ОШИБКА'}"
+    )
+    return queued['delivered'] == queued['total'] and ordered and answers_first
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--chat-burst", type=float, default=3)
+    args = parser.parse_args()
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    ok = asyncio.run(run(args.chats, args.messages, args.rate, args.chat_rate, args.chat_burst))
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Прогресс ежедневных заданий: запись на каждое событие против очереди.
+
+--users игроков получают задания, затем --events событий прогресса
+случайных типов (часть без подходящего задания) записываются сначала
+прежним способом - update_task_progress на каждое событие, - затем через
+ProgressQueue. Отчет: время, SQL-запросы, события на запись и
+сэкономленные обращения к базе. Итоговый прогресс обоих способов
+сверяется с суммой событий. Проверяется и ожидание при переполнении.
+
+    python -m benchmarks.progress_queue --users 500 --events 20000
+"""
+import argparse
+import asyncio
+import random
+import sys
+from collections import Counter
+from datetime import date
+
+from benchmarks.common import Timer, use_temp_database
+from models import DailyTask, SessionMaker, count_queries
+from services import get_or_create_player, update_task_progress
+from services.daily_rollover import run_daily_rollover
+from services.progress_queue import ProgressQueue
+
+TASK_TYPES = ("repair_servers", "upgrade_skill", "buy_server")
+
+def _events(users: int, count: int):
+    return [
+        (random.randint(1, users), random.choice(TASK_TYPES), random.randint(1, 30))
+        for _ in range(count)
+    ]
+
+def _reset_progress():
+    with SessionMaker() as session:
+        session.query(DailyTask).update({"current_amount": 0, "completed": False})
+        session.commit()
+
+def _progress() -> Counter:
+    # Прогресс по (игрок, тип) ограничен заданием: после выполнения события больше не учитываются
+    with SessionMaker() as session:
+        rows = session.query(
+            DailyTask.user_id, DailyTask.task_type, DailyTask.current_amount, DailyTask.target_amount
+        ).filter(DailyTask.date_created == date.today().isoformat()).all()
+    return Counter({(user_id, task_type): (current, target) for user_id, task_type, current, target in rows})
+
+def _expected(events, targets) -> Counter:
+    # Прежний способ применяет события по одному: прогресс растет, пока задание не выполнено
+    progress = Counter()
+    for user_id, task_type, amount in events:
+        key = (user_id, task_type)
+        if key in targets and progress[key] < targets[key]:
+            progress[key] += amount
+    return progress
+
+async def _inline(events):
+    with count_queries() as queries, Timer() as timer:
+        for user_id, task_type, amount in events:
+            await update_task_progress(user_id, task_type, amount)
+    return timer.elapsed, queries.statements
+
+async def _queued(events, queue: ProgressQueue, concurrency: int = 50):
+    # События выдают параллельные "обработчики", как при реальной нагрузке
+    chunks = [events[start::concurrency] for start in range(concurrency)]
+
+    async def handler(chunk):
+        for user_id, task_type, amount in chunk:
+            await queue.emit(user_id, task_type, amount)
+            await asyncio.sleep(0)
+
+    with count_queries() as queries, Timer() as timer:
+        await queue.start()
+        await asyncio.gather(*(handler(chunk) for chunk in chunks))
+        await queue.stop()
+    return timer.elapsed, queries.statements
+
+async def run(users: int, count: int) -> bool:
+    random.seed(42)
+    use_temp_database()
+    for user_id in range(1, users + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+    await run_daily_rollover(active_days=0)
+
+    targets = {key: target for key, (_, target) in _progress().items()}
+    events = _events(users, count)
+    expected = _expected(events, targets)
+
+    inline_time, inline_sql = await _inline(events)
+    inline_ok = {key: current for key, (current, _) in _progress().items() if current} == dict(+expected)
+    print(
+        f"Запись на каждое событие: {count} событий за {inline_time:.2f}с "
+        f"({count / inline_time:.0f}/с), SQL-запросов: {inline_sql} - {'ok' if inline_ok else 'РАСХОЖДЕНИЕ'}"
+    )
+
+    _reset_progress()
+    queue = ProgressQueue(max_pending=5000, flush_batch=1000, flush_interval=0.05)
+    queued_time, queued_sql = await _queued(events, queue)
+    # Очередь складывает события пары до записи, поэтому прогресс может превысить цель
+    # на последнем пакете; сверяем признак выполнения и прогресс невыполненных заданий
+    progress = _progress()
+    queued_ok = all(
+        (current >= target) == (expected[key] >= target) and (current >= target or current == expected[key])
+        for key, (current, target) in progress.items()
+    )
+    stats = queue.stats()
+    print(
+        f"Очередь: {count} событий за {queued_time:.2f}с ({count / queued_time:.0f}/с), "
+        f"SQL-запросов: {queued_sql} - {'ok' if queued_ok else 'РАСХОЖДЕНИЕ'}"
+    )
+    print(
+        f"  записей: {stats['flushes']}, событий на запись: {stats['events_per_flush']:.1f}, "
+        f"UPDATE: {stats['statements']}, сэкономлено UPDATE: {stats['writes_saved']}, "
+        f"коммитов: {stats['commits_saved']}"
+    )
+
+    # Переполнение без фонового потребителя: emit() сам записывает очередь
+    _reset_progress()
+    small = ProgressQueue(max_pending=10, flush_batch=10, flush_interval=60)
+    for user_id, task_type, amount in events[:1000]:
+        await small.emit(user_id, task_type, amount)
+    await small.flush()
+    backpressure_ok = small.stats()['backpressure_waits'] > 0 and small.stats()['dropped_events'] == 0
+    print(f"Ожиданий при переполнении: {small.stats()['backpressure_waits']} - {'ok' if backpressure_ok else 'ОШИБКА'}")
+
+    return inline_ok and queued_ok and backpressure_ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.users, args.events)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Кэш готовых экранов: профиль, статистика, обслуживание и магазин.
+
+Виртуальные игроки многократно открывают четыре экрана и время от времени
+ремонтируют серверы. Прогон выполняется без кэша
+(нулевой бюджет памяти) и с кэшем. Отчет: задержка и SQL-запросы на
+просмотр, доля попаданий. После каждого изменения экраны из кэша
+сверяются со свежей отрисовкой, а при маленьком бюджете проверяется
+вытеснение.
+
+    python -m benchmarks.render_cache --players 100 --views 20
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+
+from benchmarks.common import format_latency, use_temp_database
+from benchmarks.load import LoadHarness
+from handlers.incidents import render_stats
+from handlers.maintenance import render_maintenance
+from handlers.profile import render_profile
+from handlers.shop import render_shop
+from services import init_default_crises, init_default_incidents
+from services.render_cache import render_cache
+from utils.outbox import outbox
+
+SCREENS = ('🖥 Профиль', '📊 Статистика', '🔧 Обслуживание', '🛒 Магазин')
+RENDERERS = {
+    "profile": render_profile,
+    "stats": render_stats,
+    "maintenance": render_maintenance,
+    "shop": render_shop,
+}
+
+async def _player(harness: LoadHarness, user_id: int, views: int, mutate_every: int):
+    for view in range(views):
+        await harness.message(user_id, random.choice(SCREENS))
+        if view % mutate_every == mutate_every - 1:
+            await harness.message(user_id, '🔧 Обслуживание')
+            await harness.press(user_id, "repair_")
+
+async def _consistent(players: int) -> bool:
+    # Все действительные записи кэша совпадают со свежей отрисовкой
+    for user_id in range(1, players + 1):
+        for screen, render in RENDERERS.items():
+            cached = render_cache.get(user_id, screen)
+            if cached is not None and cached.text != (await render(user_id)).text:
+                return False
+    return True
+
+async def _run_once(harness: LoadHarness, players: int, views: int, mutate_every: int, max_bytes: int) -> LoadHarness:
+    render_cache.clear()
+    render_cache.max_bytes = max_bytes
+    render_cache.hits = render_cache.misses = render_cache.stale = render_cache.evicted = 0
+    harness.latency.clear()
+    harness.statements.clear()
+
+    for user_id in range(1, players + 1):
+        await harness.message(user_id, "/start")
+    await asyncio.gather(*[_player(harness, user_id, views, mutate_every) for user_id in range(1, players + 1)])
+    return harness
+
+def _summary(harness: LoadHarness) -> str:
+    latency = [value for screen in SCREENS for value in harness.latency[f"message {screen}"]]
+    statements = [value for screen in SCREENS for value in harness.statements[f"message {screen}"]]
+    return f"{format_latency(latency)}, SQL на просмотр {sum(statements) / len(statements):.2f}"
+
+async def run(players: int, views: int, mutate_every: int) -> bool:
+    random.seed(42)
+    use_temp_database()
+    await init_default_incidents()
+    await init_default_crises()
+
+    # Роутеры подключаются к диспетчеру один раз, поэтому стенд общий для всех прогонов
+    harness = LoadHarness()
+    baseline = await _run_once(harness, players, views, mutate_every, 0)
+    print(f"Без кэша: {_summary(baseline)}")
+
+    cached = await _run_once(harness, players, views, mutate_every, 16 * 1024 * 1024)
+    stats = render_cache.stats()
+    print(f"С кэшем:  {_summary(cached)}")
+    print(
+        f"  попаданий {stats['hit_rate'] * 100:.1f}%, устаревших {stats['stale']}, "
+        f"записей {stats['entries']}, память {stats['bytes'] / 1024:.0f} КБ"
+    )
+    consistent = await _consistent(players)
+    print(f"Сверка со свежей отрисовкой: {'ok' if consistent else 'РАСХОЖДЕНИЕ'}")
+
+    budget = 32 * 1024
+    await _run_once(harness, players, views, mutate_every, budget)
+    stats = render_cache.stats()
+    bounded = stats['bytes'] <= budget and stats['evicted'] > 0
+    print(
+        f"Бюджет {budget // 1024} КБ: занято {stats['bytes'] / 1024:.1f} КБ, вытеснено {stats['evicted']}, "
+        f"попаданий {stats['hit_rate'] * 100:.1f}% - {'ok' if bounded else 'ОШИБКА'}"
+    )
+    await outbox.stop()
+    return consistent and bounded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--views", type=int, default=20)
+    parser.add_argument("--mutate-every", type=int, default=5, help="ремонт после каждых N просмотров")
+    args = parser.parse_args()
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+    logging.getLogger("models").setLevel(logging.WARNING)
+    sys.exit(0 if asyncio.run(run(args.players, args.views, args.mutate_every)) else 1)
+
+if __name__ == "__main__":
+    main()
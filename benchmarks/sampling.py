@@ -0,0 +1,93 @@
+"""Взвешенный выбор кризиса: прежний список повторов против таблиц псевдонимов.
+
+Для каталогов из 5, 500 и 50 000 кризисов замеряется стоимость одного выбора
+прежним способом (построение списка [crisis] * int(weight * 10) на каждый вызов)
+и через Catalog.crisis_sampler. Затем критерий хи-квадрат проверяет, что
+распределение выборки совпадает с ожидаемым по весам.
+
+    python -m benchmarks.sampling --samples 200000
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from collections import Counter
+
+from services.catalog import Catalog, CrisisDef
+from services.formulas import crisis_weight
+
+def _catalog(size: int) -> Catalog:
+    crises = [
+        CrisisDef(
+            id=index, name=f"crisis{index}", description="", severity=random.randint(1, 5),
+            server_damage=10, money_loss=100, reputation_loss=1
+        )
+        for index in range(size)
+    ]
+    return Catalog([], crises)
+
+def _legacy_choice(crises, server_health: float):
+    # Копия прежнего алгоритма из crisis_service
+    health_factor = (100 - server_health) / 100
+    weighted_crises = []
+    for crisis in crises:
+        weight = 1 + (crisis.severity / 5) * health_factor * 2
+        weighted_crises.extend([crisis] * int(weight * 10))
+    return random.choice(weighted_crises)
+
+def _per_call(func, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls
+
+def _chi_square_p_value(statistic: float, degrees: int) -> float:
+    # Аппроксимация Уилсона-Хилферти для верхнего хвоста распределения хи-квадрат
+    z = ((statistic / degrees) ** (1 / 3) - (1 - 2 / (9 * degrees))) / math.sqrt(2 / (9 * degrees))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def _distribution_test(catalog: Catalog, server_health: int, samples: int, choose) -> float:
+    weights = [crisis_weight(crisis.severity, server_health) for crisis in catalog.crises]
+    total = sum(weights)
+    # Кризисы одной серьезности неразличимы по весу, поэтому сравниваем по серьезности
+    expected = Counter()
+    for crisis, weight in zip(catalog.crises, weights):
+        expected[crisis.severity] += samples * weight / total
+    observed = Counter(choose().severity for _ in range(samples))
+    statistic = sum((observed[severity] - count) ** 2 / count for severity, count in expected.items())
+    return _chi_square_p_value(statistic, max(1, len(expected) - 1))
+
+def run(samples: int) -> bool:
+    random.seed(42)
+    ok = True
+    print(f"{'размер':>8} {'прежний, мкс':>14} {'alias, мкс':>12} {'ускорение':>10}")
+    for size in (5, 500, 50000):
+        catalog = _catalog(size)
+        health = random.uniform(0, 100)
+        calls = max(20, 200000 // size)
+        catalog.crisis_sampler(health)  # Таблица строится при первом обращении
+        
+        legacy = _per_call(lambda: _legacy_choice(catalog.crises, health), calls)
+        alias = _per_call(lambda: catalog.crisis_sampler(health).choice(), 100000)
+        print(f"{size:>8} {legacy * 1e6:>14.2f} {alias * 1e6:>12.3f} {legacy / alias:>9.0f}x")
+    
+    print("\nКритерий хи-квадрат (по серьезности кризиса):")
+    for size in (5, 500):
+        catalog = _catalog(size)
+        for health in (0, 50, 100):
+            p_alias = _distribution_test(catalog, health, samples, lambda: catalog.crisis_sampler(health).choice())
+            p_legacy = _distribution_test(catalog, health, samples // 10, lambda: _legacy_choice(catalog.crises, health))
+            status = "ok" if p_alias > 0.001 else "РАСХОЖДЕНИЕ"
+            ok = ok and p_alias > 0.001
+            print(f"  размер={size:<5} здоровье={health:<3} p(alias)={p_alias:.3f} p(прежний)={p_legacy:.3f} {status}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=200000)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.samples) else 1)
+
+if __name__ == "__main__":
+    main()
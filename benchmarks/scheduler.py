@@ -0,0 +1,133 @@
+"""Отложенные сообщения: sleep в обработчике против общего планировщика.
+
+1. С VirtualClock проверяется порядок срабатывания, отмена и замена
+   заданий по ключу без реального ожидания.
+2. Стоимость планирования и памяти для --pending одновременных задержек.
+3. Пропускная способность обработчика кризиса при ограничении
+   параллельности: прежний вариант держит слот на время задержки, новый
+   ставит задание в планировщик и сразу освобождает слот.
+
+    python -m benchmarks.scheduler --pending 100000 --updates 2000 --delay 0.5
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+
+from utils.concurrency import ConcurrencyLimitMiddleware
+from utils.scheduler import Scheduler, VirtualClock
+
+async def _virtual_clock_checks() -> bool:
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    fired = []
+
+    async def record(value):
+        fired.append((clock(), value))
+
+    delays = [random.uniform(0, 100) for _ in range(10000)]
+    for index, delay in enumerate(delays):
+        scheduler.call_later(delay, record, index)
+
+    # Замена по ключу: сработать должно только последнее задание
+    scheduler.call_later(5, record, "old", key=("incident", 1))
+    scheduler.call_later(7, record, "new", key=("incident", 1))
+    # Отмена по ключу
+    scheduler.call_later(3, record, "cancelled", key=("incident", 2))
+    scheduler.cancel(("incident", 2))
+
+    while len(scheduler):
+        clock.advance(0.5)
+        scheduler.run_due()
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    values = [value for _, value in fired]
+    times = [moment for moment, _ in fired]
+    expected_order = sorted(range(len(delays)), key=lambda index: delays[index])
+    on_time = all(
+        moment - 0.5 <= delays[value] <= moment
+        for moment, value in fired if isinstance(value, int)
+    )
+    ok = (
+        [value for value in values if isinstance(value, int)] == expected_order
+        and "new" in values and "old" not in values and "cancelled" not in values
+        and times == sorted(times) and on_time
+    )
+    print(f"Виртуальные часы: {len(fired)} срабатываний, порядок и отмена - {'ok' if ok else 'ОШИБКА'}")
+    return ok
+
+def _scale(pending: int):
+    scheduler = Scheduler(VirtualClock())
+
+    async def noop(_):
+        pass
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for user_id in range(pending):
+        scheduler.call_later(random.uniform(1, 5), noop, user_id, key=("incident", user_id))
+    schedule_time = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for user_id in range(0, pending, 2):
+        scheduler.cancel(("incident", user_id))
+    cancel_time = time.perf_counter() - started
+    print(
+        f"{pending} задержек: планирование {schedule_time / pending * 1e6:.2f} мкс, "
+        f"отмена {cancel_time / (pending // 2) * 1e6:.2f} мкс, память {memory / pending:.0f} байт на задание, "
+        f"осталось {len(scheduler)}"
+    )
+
+async def _throughput(updates: int, delay: float, limit: int):
+    async def send(_):
+        await asyncio.sleep(0.001)  # Отправка сообщения
+
+    async def sleeping_handler(event, data):
+        await send(event)
+        await asyncio.sleep(delay)
+        await send(event)
+
+    scheduler = Scheduler()
+    await scheduler.start()
+
+    async def scheduled_handler(event, data):
+        await send(event)
+        scheduler.call_later(delay, send, event, key=("incident", event))
+
+    results = {}
+    for name, handler in (("sleep в обработчике", sleeping_handler), ("планировщик", scheduled_handler)):
+        limiter = ConcurrencyLimitMiddleware(limit)
+        started = time.perf_counter()
+        await asyncio.gather(*(limiter(handler, update_id, {}) for update_id in range(updates)))
+        elapsed = time.perf_counter() - started
+        results[name] = updates / elapsed
+        print(f"  {name:<20} {updates / elapsed:>9.0f} обновлений/с")
+
+    await scheduler.stop()
+    print(f"  отправлено отложенных: {scheduler.fired}, ошибок: {scheduler.failed}")
+    return scheduler.fired == updates and scheduler.failed == 0
+
+async def run(pending: int, updates: int, delay: float, limit: int) -> bool:
+    random.seed(42)
+    ok = await _virtual_clock_checks()
+    _scale(pending)
+    print(f"Обработчик кризиса, {updates} обновлений, задержка {delay}с, параллельность {limit}:")
+    ok = await _throughput(updates, delay, limit) and ok
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pending", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.pending, args.updates, args.delay, args.limit)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Пропускная способность записи при 1, 4 и 16 шардах.
+
+Для каждого числа шардов создается временная база с --players игроками,
+затем в течение --seconds секунд:
+
+1. --writers корутин одного процесса вызывают сервисы записи (опыт, износ
+   серверов, улучшение навыка) для случайных игроков;
+2. --processes процессов выполняют короткие транзакции записи в шарды
+   своих игроков - так видно ограничение единственного писателя SQLite,
+   которое в одном процессе скрыто за GIL.
+
+Проверяется, что рейтинг, собранный из всех шардов, совпадает с полной
+сортировкой игроков. В конце база с одним шардом
+перераспределяется на 4 шарда инструментом models.rebalance: каждый игрок
+со всеми строками должен оказаться в своем шарде, повторный запуск
+ничего не переносит.
+
+    python -m benchmarks.sharding --players 20000 --writers 64 --processes 8 --seconds 5
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+import time
+
+from sqlalchemy import func, insert
+
+from benchmarks.common import format_latency, use_temp_database
+from models import Player, Skill, router, run_on_all_shards
+from services.economy import credit
+from models.rebalance import rebalance
+from models.sharding import create_shard_engines
+from services import (
+    decrease_server_health, get_rating, init_default_crises, init_default_incidents, load_leaderboard,
+    update_experience, upgrade_skill
+)
+
+SKILLS = ('Linux', 'Networking', 'Docker', 'CI/CD', 'Monitoring')
+
+def _fill(players: int) -> None:
+    for shard, engine in enumerate(router.engines):
+        user_ids = [user_id for user_id in range(1, players + 1) if router.shard_for(user_id) == shard]
+        with engine.begin() as connection:
+            connection.execute(insert(Player), [
+                dict(user_id=user_id, username=f"user{user_id}", level=random.randint(1, 20),
+                     experience=random.randint(0, 2000), money=10 ** 9)
+                for user_id in user_ids
+            ])
+            connection.execute(insert(Skill), [
+                dict(user_id=user_id, skill_name=name, skill_level=1) for user_id in user_ids for name in SKILLS
+            ])
+
+async def _writer(players: int, deadline: float, latency: list):
+    while time.perf_counter() < deadline:
+        user_id = random.randint(1, players)
+        started = time.perf_counter()
+        operation = random.random()
+        if operation < 0.5:
+            await update_experience(user_id, random.randint(1, 50))
+        elif operation < 0.8:
+            await decrease_server_health(user_id, 0.1)
+        else:
+            await upgrade_skill(user_id, random.choice(SKILLS))
+        latency.append(time.perf_counter() - started)
+
+def _process_writer(url: str, shards: int, players: int, seconds: float) -> int:
+    # Отдельный процесс со своими соединениями к тем же файлам шардов
+    router.configure(create_shard_engines(url, shards))
+    writes = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = random.randint(1, players)
+        with router.session_for(user_id) as session:
+            credit(session, user_id, 1, experience=Player.experience + 1)
+            session.commit()
+        writes += 1
+    return writes
+
+def _shard_rows(session) -> list:
+    return session.query(Player.user_id, Player.level, Player.experience).all()
+
+async def _rating_matches(players: int) -> bool:
+    # Рейтинг из памяти против полной сортировки строк всех шардов
+    await load_leaderboard()
+    rows = [row for shard_rows in await run_on_all_shards(_shard_rows) for row in shard_rows]
+    expected = [row[0] for row in sorted(rows, key=lambda row: (-row[1], -row[2], row[0]))]
+    rating = await get_rating(expected[-1])
+    with router.session_for(expected[0]) as session:
+        leader = session.get(Player, expected[0]).username
+    return (
+        len(rows) == players and rating['total'] == players and rating['rank'] == players
+        and rating['top'][0][0] == leader
+    )
+
+async def _measure(shards: int, players: int, writers: int, processes: int, seconds: float) -> dict:
+    use_temp_database(shards=shards)
+    await init_default_incidents()
+    await init_default_crises()
+    _fill(players)
+    await load_leaderboard()
+
+    latency = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(_writer(players, deadline, latency) for _ in range(writers)))
+    rating_ok = await _rating_matches(players)
+
+    url = router.engines[0].url.render_as_string(hide_password=False)
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        process_writes = sum(pool.starmap(_process_writer, [(url, shards, players, seconds)] * processes))
+
+    print(
+        f"[{shards:>2} шард(ов)] сервисы в одном процессе: {len(latency) / seconds:>6.0f} записей/с "
+        f"({format_latency(latency)}); {processes} процессов: {process_writes / seconds:>6.0f} записей/с; "
+        f"рейтинг из всех шардов: {'ok' if rating_ok else 'ОШИБКА'}"
+    )
+    return {
+        'writes': len(latency) / seconds, 'process_writes': process_writes / seconds,
+        'ok': rating_ok, 'url': url
+    }
+
+def _counts(engines) -> list:
+    counts = []
+    for shard, engine in enumerate(engines):
+        with engine.connect() as connection:
+            counts.append((
+                connection.execute(func.count(Player.user_id).select()).scalar(),
+                connection.execute(func.count(Skill.id).select()).scalar(),
+                connection.execute(
+                    func.count(Player.user_id).select().where(Player.user_id % len(engines) != shard)
+                ).scalar(),
+            ))
+    return counts
+
+def _check_rebalance(url: str, players: int) -> bool:
+    engines = create_shard_engines(url, 4)
+    started = time.perf_counter()
+    moved = rebalance(1, 4, engines=engines)
+    elapsed = time.perf_counter() - started
+    repeated = rebalance(1, 4, engines=engines)
+
+    counts = _counts(engines)
+    total_players = sum(count[0] for count in counts)
+    total_skills = sum(count[1] for count in counts)
+    misplaced = sum(count[2] for count in counts)
+    ok = total_players == players and total_skills == players * len(SKILLS) and misplaced == 0 and not repeated
+    print(
+        f"Перераспределение 1 -> 4: {sum(moved.values())} игроков за {elapsed:.1f}с, "
+        f"по шардам {[count[0] for count in counts]}, не на своем месте {misplaced}, "
+        f"повторный запуск перенес {sum(repeated.values())} - {'ok' if ok else 'ОШИБКА'}"
+    )
+    return ok
+
+async def run(players: int, writers: int, processes: int, seconds: float) -> bool:
+    random.seed(42)
+    results = {}
+    for shards in (1, 4, 16):
+        results[shards] = await _measure(shards, players, writers, processes, seconds)
+
+    for key, name in (('writes', "в одном процессе"), ('process_writes', f"в {processes} процессах")):
+        base = results[1][key]
+        print(f"Ускорение записи {name}: " + ", ".join(
+            f"{shards} шардов - {result[key] / base:.1f}x" for shards, result in results.items()
+        ))
+    ok = all(result['ok'] for result in results.values())
+    return _check_rebalance(results[1]['url'], players) and ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=20000)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.players, args.writers, args.processes, args.seconds)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""SQLite с параметрами по умолчанию против настроенной (WAL, synchronous=NORMAL, mmap).
+
+Для каждого варианта создается новая временная база с --players игроками,
+затем --writers потоков выполняют короткие транзакции записи (начисление
+денег и опыта с коммитом), а --readers потоков одновременно читают
+профили. Выводится число транзакций в секунду, задержка записи и число
+ошибок блокировки. Вариант «настроенная + echo» показывает стоимость
+логирования каждого запроса (вывод уходит в /dev/null).
+
+    python -m benchmarks.sqlite_tuning --players 10000 --writers 8 --readers 4 --seconds 5
+"""
+import argparse
+import contextlib
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.common import format_latency, use_temp_database
+from models import Player, SessionMaker, create_db_engine, router
+from services.economy import credit
+
+VARIANTS = (
+    ("по умолчанию", dict(tuned=False)),
+    ("настроенная", dict(tuned=True)),
+    ("настроенная + echo", dict(tuned=True, echo=True)),
+)
+
+def _setup(players: int, devnull, tuned: bool, echo: bool = False):
+    engine = use_temp_database(tuned=tuned)
+    if echo:
+        # Логгер echo пишет в sys.stdout, захваченный при создании движка; в корневой
+        # обработчик запросы не передаются, чтобы не дублировать вывод в консоль
+        with contextlib.redirect_stdout(devnull):
+            engine = create_db_engine(engine.url, echo=True, tuned=tuned)
+        logging.getLogger("sqlalchemy.engine.Engine").propagate = False
+        router.configure([engine])
+
+    with SessionMaker() as session:
+        session.execute(insert(Player), [
+            dict(user_id=user_id, username=f"user{user_id}") for user_id in range(1, players + 1)
+        ])
+        session.commit()
+    return engine
+
+def _writer(players: int, deadline: float, latency: list, errors: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with SessionMaker() as session:
+                credit(session, random.randint(1, players), 10, experience=Player.experience + 1)
+                session.commit()
+        except OperationalError:
+            errors.append(1)
+            continue
+        latency.append(time.perf_counter() - started)
+
+def _reader(players: int, deadline: float, reads: list, errors: list):
+    while time.perf_counter() < deadline:
+        try:
+            with SessionMaker() as session:
+                session.execute(select(Player).where(Player.user_id == random.randint(1, players))).first()
+        except OperationalError:
+            errors.append(1)
+            continue
+        reads.append(1)
+
+def _measure(players: int, writers: int, readers: int, seconds: float) -> dict:
+    deadline = time.perf_counter() + seconds
+    latency, reads, errors = [], [], []
+    threads = [
+        threading.Thread(target=_writer, args=(players, deadline, latency, errors)) for _ in range(writers)
+    ] + [
+        threading.Thread(target=_reader, args=(players, deadline, reads, errors)) for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'writes': len(latency), 'reads': len(reads), 'errors': len(errors), 'latency': latency}
+
+def run(players: int, writers: int, readers: int, seconds: float) -> bool:
+    random.seed(42)
+    results = {}
+    devnull = open(os.devnull, "w")
+    for name, options in VARIANTS:
+        engine = _setup(players, devnull, **options)
+        with engine.connect() as connection:
+            journal = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+            synchronous = connection.exec_driver_sql("PRAGMA synchronous").scalar()
+
+        result = results[name] = _measure(players, writers, readers, seconds)
+        engine.dispose()
+        print(
+            f"[{name}] journal_mode={journal}, synchronous={synchronous}: "
+            f"{result['writes'] / seconds:.0f} записей/с, {result['reads'] / seconds:.0f} чтений/с, "
+            f"ошибок блокировки {result['errors']}"
+        )
+        print(f"  задержка записи: {format_latency(result['latency'])}")
+
+    devnull.close()
+
+    default, tuned, echo = (results[name] for name, _ in VARIANTS)
+    print(
+        f"Настроенная SQLite: записей больше в {tuned['writes'] / max(1, default['writes']):.1f} раз; "
+        f"echo снижает запись на {(1 - echo['writes'] / max(1, tuned['writes'])) * 100:.0f}%"
+    )
+    return tuned['errors'] == 0 and tuned['writes'] > default['writes']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.players, args.writers, args.readers, args.seconds) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Пропускная способность бота при 1, 2 и 4 процессах-обработчиках.
+
+Для каждого числа воркеров создается временная база с --players игроками,
+main.py запускается отдельным процессом с WORKERS=N и локальной
+заглушкой Bot API (benchmarks.fake_telegram). Замеры:
+
+1. --updates сообщений (профиль, статистика, рейтинг, инцидент) от
+   случайных игроков - время до ответа на все, обновлений в секунду;
+2. нажатие решения каждого показанного инцидента: незавершенный инцидент
+   хранится в базе, каждое нажатие должно получить результат;
+3. по одному запросу рейтинга от игрока каждого воркера: место должно
+   совпасть с сортировкой игроков в базе, то есть изменения опыта из
+   других воркеров дошли до рейтинга этого воркера.
+
+WORKERS=1 - обычный запуск в одном процессе без супервизора.
+
+    python -m benchmarks.workers --players 1000 --updates 5000 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import signal
+import sys
+import time
+
+from sqlalchemy import select
+
+from benchmarks.common import use_temp_database
+from benchmarks.fake_telegram import FakeTelegram, callback_update, message_update
+from models import Player, SessionMaker
+from services import get_or_create_player, init_default_crises, init_default_incidents
+from utils.workers import worker_for
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTS = ('🖥 Профиль', '📊 Статистика', '📈 Рейтинг', '🚨 Инцидент')
+
+class WorkersTelegram(FakeTelegram):
+    """Заглушка, запоминающая ответы бота с кнопками"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_poll = asyncio.Event()
+        self.sent = []
+
+    async def _method_getUpdates(self, params: dict):
+        self.first_poll.set()
+        return await super()._method_getUpdates(params)
+
+    async def _method_sendMessage(self, params: dict):
+        markup = json.loads(params.get("reply_markup") or "{}")
+        buttons = [
+            button.get("callback_data") for row in markup.get("inline_keyboard", []) for button in row
+        ]
+        self.sent.append((int(params["chat_id"]), params.get("text", ""), buttons))
+        return await super()._method_sendMessage(params)
+
+async def _wait(condition, timeout: float = 300) -> None:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("бот не ответил на все обновления")
+        await asyncio.sleep(0.01)
+
+def _expected_ranks() -> dict:
+    with SessionMaker() as session:
+        rows = session.execute(select(Player.user_id, Player.level, Player.experience)).all()
+    ordered = sorted(rows, key=lambda row: (-row[1], -row[2], row[0]))
+    return {row[0]: rank for rank, row in enumerate(ordered, 1)}
+
+async def _measure(workers: int, players: int, count: int) -> dict:
+    engine = use_temp_database()
+    await init_default_incidents()
+    await init_default_crises()
+    for user_id in range(1, players + 1):
+        await get_or_create_player(user_id, f"user{user_id}")
+    engine.dispose()
+
+    fake = WorkersTelegram()
+    await fake.start()
+    env = dict(
+        os.environ, BOT_TOKEN="123456:bench", TELEGRAM_API_URL=fake.base_url,
+        DATABASE_URL=engine.url.render_as_string(hide_password=False), DATABASE_SHARDS="1",
+        RUN_MODE="polling", WORKERS=str(workers), FAST_START="false", LOG_LEVEL="WARNING",
+        # Инцидент после кризиса не должен прийти во время замера, а показанный - истечь до нажатия
+        CRISIS_FOLLOWUP_DELAY="600", INCIDENT_GRACE_TTL="3600",
+        # Замеряется обработка, а не ограничения частоты отправки
+        OUTBOX_RATE="0", OUTBOX_CHAT_RATE="0"
+    )
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "main.py", cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    log = asyncio.create_task(process.stderr.read())
+    try:
+        await asyncio.wait_for(fake.first_poll.wait(), 300)
+
+        # 1. Сообщения от случайных игроков
+        updates = [
+            message_update(update_id, random.randint(1, players), random.choice(TEXTS))
+            for update_id in range(1, count + 1)
+        ]
+        started = time.perf_counter()
+        fake.updates.extend(updates)
+        await _wait(lambda: len(fake.sent) >= count)
+        elapsed = time.perf_counter() - started
+
+        # 2. Решение последнего показанного инцидента каждого игрока
+        incidents = {}
+        for chat_id, text, buttons in fake.sent:
+            solutions = [button for button in buttons if button and button.startswith("solution_")]
+            if solutions:
+                incidents[chat_id] = random.choice(solutions)
+        edits_before = fake.calls['editMessageText']
+        fake.updates.extend(
+            callback_update(count + index + 1, user_id, data, "🚨 ИНЦИДЕНТ")
+            for index, (user_id, data) in enumerate(incidents.items())
+        )
+        await _wait(lambda: fake.calls['editMessageText'] - edits_before >= len(incidents))
+        solved = fake.calls['editMessageText'] - edits_before
+
+        # 3. Место в рейтинге у игрока каждого воркера
+        await asyncio.sleep(0.5)
+        expected = _expected_ranks()
+        probes = {}
+        for user_id in range(1, players + 1):
+            probes.setdefault(worker_for({"message": {"from": {"id": user_id}}}, workers), user_id)
+        sent_before = len(fake.sent)
+        fake.updates.extend(
+            message_update(count + len(incidents) + index + 1, user_id, '📈 Рейтинг')
+            for index, user_id in enumerate(probes.values())
+        )
+        await _wait(lambda: len(fake.sent) - sent_before >= len(probes))
+        ranks_ok = True
+        for chat_id, text, _ in fake.sent[sent_before:]:
+            match = re.search(r"Ваше место: (\d+) из (\d+)", text)
+            ranks_ok = ranks_ok and bool(match) and int(match.group(1)) == expected[chat_id]
+    finally:
+        process.send_signal(signal.SIGINT)
+        await process.wait()
+        stderr = (await log).decode(errors="replace")
+        await fake.stop()
+        if "Traceback" in stderr:
+            print(stderr[-3000:])
+
+    ok = solved == len(incidents) and ranks_ok and "Traceback" not in stderr
+    print(
+        f"[{workers} воркер(ов)] {count} обновлений за {elapsed:.2f}с ({count / elapsed:>5.0f} обновлений/с); "
+        f"решено инцидентов {solved} из {len(incidents)}; места в рейтинге у {len(probes)} воркеров: "
+        f"{'ok' if ranks_ok else 'ОШИБКА'}"
+    )
+    return {'rate': count / elapsed, 'ok': ok}
+
+async def run(players: int, count: int, worker_counts: list) -> bool:
+    random.seed(42)
+    results = {workers: await _measure(workers, players, count) for workers in worker_counts}
+    base = results[worker_counts[0]]['rate']
+    print(f"Процессор: {os.cpu_count()} ядер; ускорение: " + ", ".join(
+        f"{workers} - {result['rate'] / base:.2f}x" for workers, result in results.items()
+    ))
+    return all(result['ok'] for result in results.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--workers", default="1,2,4")
+    args = parser.parse_args()
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    logging.getLogger("models.migrations").setLevel(logging.WARNING)
+    worker_counts = [int(workers) for workers in args.workers.split(",")]
+    sys.exit(0 if asyncio.run(run(args.players, args.updates, worker_counts)) else 1)
+
+if __name__ == "__main__":
+    main()
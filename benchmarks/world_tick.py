@@ -0,0 +1,176 @@
+"""Такт симуляции мира: пакетные UPDATE против обхода игроков через ORM.
+
+Заполняет временную базу --players игроками (каждый десятый давно не
+заходил), замеряет полный такт и проверяет:
+
+1. неактивные игроки не изменились, у активных списано содержание серверов;
+2. число фоновых кризисов близко к ожидаемому по формулам из
+   services/formulas.py;
+3. такт, прерванный на середине, продолжается с контрольной точки и
+   применяется к каждому активному игроку ровно один раз, а повторный
+   запуск ничего не делает.
+
+Для сравнения замеряется обход через ORM с коммитом на игрока на
+--legacy-players игроках.
+
+    python -m benchmarks.world_tick --players 1000000 --chunk 5000
+"""
+import argparse
+import asyncio
+import math
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, update
+
+from benchmarks.common import Timer, use_temp_database
+from config import WORLD_ACTIVE_DAYS
+from models import Player, SessionMaker
+from services import init_default_crises
+from services.catalog import get_catalog
+from services.formulas import (
+    BACKGROUND_CRISIS_SHARE, HEALTH_DECAY_PER_TICK, UPKEEP_PRICE, crisis_chance, crisis_raw_weight,
+    reputation_prevention
+)
+from services.world_tick import _tick_chunk, run_world_tick
+
+def _is_active(user_id: int) -> bool:
+    return user_id % 10 != 0
+
+def _fill_players(players: int) -> list:
+    # Возвращает (здоровье, репутация) активных игроков для расчета ожидаемого числа кризисов
+    now = datetime.now().isoformat()
+    inactive = (datetime.now() - timedelta(days=WORLD_ACTIVE_DAYS + 30)).isoformat()
+    active = []
+    with SessionMaker() as session:
+        for start in range(1, players + 1, 50000):
+            rows = []
+            for user_id in range(start, min(players, start + 49999) + 1):
+                row = dict(
+                    user_id=user_id, username=f"user{user_id}",
+                    server_health=random.uniform(0, 100), reputation=random.randint(0, 100),
+                    servers=random.randint(1, 5), money=random.randint(10000, 20000),
+                    last_activity=now if _is_active(user_id) else inactive
+                )
+                if _is_active(user_id):
+                    active.append((row['server_health'], row['reputation']))
+                rows.append(row)
+            session.execute(insert(Player), rows)
+        session.commit()
+    return active
+
+def _expected_crises(active: list, severities: list) -> tuple:
+    # Ожидаемое число срабатываний и его дисперсия
+    mean = variance = 0.0
+    for health, reputation in active:
+        health = max(0.0, health - HEALTH_DECAY_PER_TICK)
+        weights = [crisis_raw_weight(severity, health) for severity in severities]
+        base = BACKGROUND_CRISIS_SHARE * crisis_chance(health) * (1 - reputation_prevention(reputation))
+        for weight in weights:
+            probability = base * weight / sum(weights)
+            mean += probability
+            variance += probability * (1 - probability)
+    return mean, variance
+
+def _totals(active: bool) -> tuple:
+    with SessionMaker() as session:
+        return tuple(session.query(
+            func.count(), func.total(Player.server_health), func.total(Player.money),
+            func.total(Player.reputation), func.total(Player.servers)
+        ).filter(Player.user_id % 10 != 0 if active else Player.user_id % 10 == 0).one())
+
+def _legacy(players: int) -> float:
+    # Прежний подход: загрузка игрока через ORM, расчет в Python и коммит на каждого
+    with Timer() as timer:
+        for user_id in range(1, players + 1):
+            with SessionMaker() as session:
+                crises = get_catalog(session).crises
+                player = session.get(Player, user_id)
+                player.server_health = max(0.0, player.server_health - HEALTH_DECAY_PER_TICK)
+                player.money = max(0, player.money - player.servers * UPKEEP_PRICE)
+
+                health = player.server_health
+                weights = [crisis_raw_weight(crisis.severity, health) for crisis in crises]
+                base = BACKGROUND_CRISIS_SHARE * crisis_chance(health) * (1 - reputation_prevention(player.reputation))
+                for crisis, weight in zip(crises, weights):
+                    if random.random() < base * weight / sum(weights):
+                        player.server_health = max(0.0, player.server_health - crisis.server_damage)
+                        player.money = max(0, player.money - crisis.money_loss)
+                        player.reputation = max(0, player.reputation - crisis.reputation_loss)
+                session.commit()
+    return timer.elapsed
+
+async def run(players: int, chunk: int, legacy_players: int) -> bool:
+    random.seed(42)
+    use_temp_database()
+    await init_default_crises()
+    with Timer() as timer:
+        active = _fill_players(players)
+    print(f"Игроков: {players} (активных {len(active)}), заполнение базы {timer.elapsed:.1f}с")
+
+    inactive_before = _totals(False)
+    active_before = _totals(True)
+    result = await run_world_tick("bench-1", chunk_size=chunk)
+    print(
+        f"Такт: {result.players} игроков, {result.chunks} пакетов, {result.elapsed:.2f}с "
+        f"({result.players / result.elapsed:.0f} игроков/с)"
+    )
+
+    # 1. Неактивные не тронуты; у активных без кризисов списано ровно содержание
+    inactive_ok = _totals(False) == inactive_before
+    count, _, money_after, _, servers = _totals(True)
+    crises = get_catalog(None).crises
+    upkeep = servers * UPKEEP_PRICE
+    crisis_loss = active_before[2] - upkeep - money_after
+    money_ok = result.players == count == len(active) and 0 <= crisis_loss <= result.crises * max(
+        crisis.money_loss for crisis in crises
+    )
+    print(f"Неактивные не изменились: {'ok' if inactive_ok else 'ОШИБКА'}, содержание списано: {'ok' if money_ok else 'ОШИБКА'}")
+
+    # 2. Число кризисов в пределах пяти стандартных отклонений от ожидаемого
+    mean, variance = _expected_crises(active, [crisis.severity for crisis in crises])
+    crises_ok = abs(result.crises - mean) <= 5 * math.sqrt(variance) + 1
+    print(f"Фоновых кризисов: {result.crises}, ожидалось ~{mean:.0f} - {'ok' if crises_ok else 'ОШИБКА'}")
+
+    # 3. Прерывание и продолжение. Здоровье выставляется так, чтобы после износа
+    # стало ровно 100% и шанс кризиса был нулевым: у каждого игрока должно остаться 100
+    with SessionMaker() as session:
+        session.execute(update(Player).values(server_health=100 + HEALTH_DECAY_PER_TICK))
+        session.commit()
+        for _ in range(max(1, result.chunks // 2)):
+            _tick_chunk(session, "bench-2", chunk, None)
+    resumed = await run_world_tick("bench-2", chunk_size=chunk, active_days=0)
+    repeated = await run_world_tick("bench-2", chunk_size=chunk, active_days=0)
+    with SessionMaker() as session:
+        exact = session.query(func.count()).filter(
+            Player.server_health == 100
+        ).scalar()
+    resumed_ok = exact == players and repeated.chunks == 0
+    print(
+        f"Продолжение после прерывания: {resumed.players} игроков дообработано, "
+        f"повторный запуск пакетов: {repeated.chunks} - {'ok' if resumed_ok else 'ОШИБКА'}"
+    )
+
+    if legacy_players:
+        elapsed = _legacy(min(legacy_players, players))
+        rate = min(legacy_players, players) / elapsed
+        print(
+            f"Обход через ORM: {rate:.0f} игроков/с, на {len(active)} активных ~{len(active) / rate:.0f}с "
+            f"(пакетный такт быстрее в {result.players / result.elapsed / rate:.1f} раз)"
+        )
+
+    ok = inactive_ok and money_ok and crises_ok and resumed_ok
+    print("Результат:", "ok" if ok else "ОШИБКА")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000000)
+    parser.add_argument("--chunk", type=int, default=5000)
+    parser.add_argument("--legacy-players", type=int, default=5000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.players, args.chunk, args.legacy_players)) else 1)
+
+if __name__ == "__main__":
+    main()
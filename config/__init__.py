@@ -1 +1,15 @@
-from config.settings import BOT_TOKEN, DATABASE_URL, LOG_LEVEL
+from config.settings import (
+    BOT_TOKEN, DATABASE_URL, DATABASE_SHARDS, LOG_LEVEL, ADMIN_IDS,
+    DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE,
+    RUN_MODE, DROP_PENDING_UPDATES, TELEGRAM_API_URL, MAX_CONCURRENT_UPDATES, SHUTDOWN_DRAIN_TIMEOUT,
+    DUPLICATE_CALLBACK_WINDOW, OUTBOX_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_MAX_RETRIES,
+    FAST_START, STARTUP_TARGET, WORKERS,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT,
+    INCIDENT_STORE, INCIDENT_STORE_MAX_ENTRIES, FSM_STORAGE, INCIDENT_TTL, INCIDENT_GRACE_TTL,
+    DAILY_ROLLOVER_BATCH, DAILY_ACTIVE_DAYS, DAILY_ROLLOVER_LEAD,
+    PROGRESS_QUEUE_SIZE, PROGRESS_FLUSH_BATCH, PROGRESS_FLUSH_INTERVAL, ONBOARDING_BATCH,
+    RENDER_CACHE_MAX_BYTES, CRISIS_FOLLOWUP_DELAY,
+    WORLD_TICK_INTERVAL, WORLD_TICK_CHUNK, WORLD_ACTIVE_DAYS,
+    METRICS_HOST, METRICS_PORT, PROFILE_SLOW_UPDATES, PROFILE_INTERVAL, PROFILE_KEEP, PROFILE_DIR
+)
@@ -10,8 +10,107 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не задан в .env файле")
 
+# Режим получения обновлений: "polling" или "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+# Сбрасывать ли накопившиеся обновления при запуске
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"
+# Адрес Bot API (например, локальный сервер); пусто - api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Максимум одновременно обрабатываемых обновлений и время ожидания их завершения при остановке
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "100"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+# Исходящая очередь Bot API: вызовов в секунду всего и в один чат, вызовов в чат подряд,
+# повторов после 429 и ошибок сети (0 в частоте - без ограничения)
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", "30"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = float(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+# Окно (секунды), в котором повторное нажатие той же кнопки не обрабатывается (0 - обрабатывать все)
+DUPLICATE_CALLBACK_WINDOW = float(os.getenv("DUPLICATE_CALLBACK_WINDOW", "1.0"))
+# Процессы-обработчики: больше 1 - супервизор получает обновления и распределяет их
+# по воркерам по user_id; инциденты и FSM при этом хранятся в базе
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Быстрый запуск: рейтинг строится в фоне, пока бот уже принимает обновления.
+# Целевое время (секунды) от запуска процесса до приема обновлений - превышение пишется в лог
+FAST_START = os.getenv("FAST_START", "true").lower() == "true"
+STARTUP_TARGET = float(os.getenv("STARTUP_TARGET", "5"))
+
+# Настройки вебхука
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+
+# Администраторы бота (идентификаторы Telegram через запятую)
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+
 # Настройки базы данных
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///devops_simulator.db")
+# Количество шардов с данными игроков (user_id % DATABASE_SHARDS). Нулевой шард - сама
+# база DATABASE_URL, остальные - файлы рядом с ней. Поддерживается только SQLite
+DATABASE_SHARDS = int(os.getenv("DATABASE_SHARDS", "1"))
+# Вывод всех SQL-запросов в лог (только для отладки)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+# Пул соединений: постоянные соединения, дополнительные при пиковой нагрузке,
+# ожидание свободного соединения и пересоздание соединений старше DB_POOL_RECYCLE секунд (-1 - никогда)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+# Настройки SQLite: режим журнала, синхронизация, ожидание блокировки (мс) и размер mmap (байты)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Хранилище незавершенных инцидентов: "memory" или "sqlite"
+INCIDENT_STORE = os.getenv("INCIDENT_STORE", "memory")
+INCIDENT_STORE_MAX_ENTRIES = int(os.getenv("INCIDENT_STORE_MAX_ENTRIES", "100000"))
+# Хранилище состояний FSM: "memory" или "sqlite"
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+# Время жизни инцидента без ограничения по времени и запас сверх time_sensitive (секунды)
+INCIDENT_TTL = int(os.getenv("INCIDENT_TTL", "3600"))
+INCIDENT_GRACE_TTL = int(os.getenv("INCIDENT_GRACE_TTL", "300"))
+
+# Пакетный перенос ежедневных заданий: размер пакета, за сколько дней игрок считается
+# активным (0 - все игроки) и за сколько секунд до полуночи создаются задания на завтра
+DAILY_ROLLOVER_BATCH = int(os.getenv("DAILY_ROLLOVER_BATCH", "2000"))
+DAILY_ACTIVE_DAYS = int(os.getenv("DAILY_ACTIVE_DAYS", "7"))
+DAILY_ROLLOVER_LEAD = int(os.getenv("DAILY_ROLLOVER_LEAD", "900"))
+
+# Очередь прогресса ежедневных заданий: максимум пар (игрок, тип задания) в очереди,
+# размер пакета, при котором запись начинается досрочно, и интервал записи (секунды)
+PROGRESS_QUEUE_SIZE = int(os.getenv("PROGRESS_QUEUE_SIZE", "10000"))
+PROGRESS_FLUSH_BATCH = int(os.getenv("PROGRESS_FLUSH_BATCH", "1000"))
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "1.0"))
+
+# Пакетная регистрация новых игроков: максимум игроков в одном INSERT
+ONBOARDING_BATCH = int(os.getenv("ONBOARDING_BATCH", "500"))
+
+# Фоновая симуляция мира: интервал такта (секунды, 0 - такт выключен), размер пакета
+# игроков и за сколько дней игрок считается активным (0 - все игроки). По умолчанию
+# выключена: износ, содержание и фоновые кризисы еще не сбалансированы (benchmarks.balance)
+WORLD_TICK_INTERVAL = int(os.getenv("WORLD_TICK_INTERVAL", "0"))
+WORLD_TICK_CHUNK = int(os.getenv("WORLD_TICK_CHUNK", "5000"))
+WORLD_ACTIVE_DAYS = int(os.getenv("WORLD_ACTIVE_DAYS", "7"))
+
+# Задержка (секунды) перед отправкой инцидента после сообщения о кризисе
+CRISIS_FOLLOWUP_DELAY = float(os.getenv("CRISIS_FOLLOWUP_DELAY", "3"))
+
+# Ограничение памяти кэша готовых экранов (байты)
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Метрики в текстовом формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+# (0 - выключены; воркер с номером i слушает METRICS_PORT + i)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Выборочный профилировщик: стеки цикла событий раз в PROFILE_INTERVAL секунд,
+# PROFILE_KEEP самых долгих обновлений сохраняются в PROFILE_DIR при остановке
+PROFILE_SLOW_UPDATES = os.getenv("PROFILE_SLOW_UPDATES", "false").lower() == "true"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
 
 # Настройки логирования
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
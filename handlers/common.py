@@ -1,22 +1,94 @@
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
+from config import ADMIN_IDS
 from utils.keyboards import get_main_keyboard
-from services import get_or_create_player
+from services.catalog import reload_catalog
+from services.incident_store import incident_store
+from services.onboarding import onboarding
+from services.progress_queue import progress_queue
+from services.render_cache import render_cache
+from utils.outbox import outbox
 
 # Создаем роутер для общих команд
-common_router = Router()
+common_router = Router(name="common_router")
 
 @common_router.message(Command("start"))
 async def cmd_start(message: Message):
     user_id = message.from_user.id
     username = message.from_user.username or message.from_user.first_name
     
-    await get_or_create_player(user_id, username)
+    # Одновременные /start новых игроков записываются общим пакетом
+    await onboarding.register(user_id, username)
     
-    await message.answer(
+    outbox.send(message.answer(
         f"👋 Привет, {username}! Добро пожаловать в Симулятор DevOps-инженера!\n\n"
         f"Твоя задача - решать технические инциденты, улучшать навыки и развивать инфраструктуру.\n\n"
         f"Используй кнопки меню для навигации.", 
         reply_markup=get_main_keyboard()
-    )
+    ))
+
+@common_router.message(Command("reload_catalog"))
+async def cmd_reload_catalog(message: Message):
+    # Перечитываем каталоги после изменения инцидентов или кризисов в базе
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    catalog = await reload_catalog()
+    
+    outbox.send(message.answer(
+        f"🔄 Каталог обновлен: {len(catalog.incidents)} инцидентов, {len(catalog.crises)} кризисов."
+    ))
+
+@common_router.message(Command("store_stats"))
+async def cmd_store_stats(message: Message):
+    # Счетчики хранилища незавершенных инцидентов
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    stats = incident_store.stats()
+    
+    outbox.send(message.answer(
+        f"🗄 Хранилище инцидентов: {stats['backend']}\n"
+        f"Сохранено: {stats['puts']}\n"
+        f"Найдено: {stats['hits']}, не найдено: {stats['misses']}\n"
+        f"Истекло: {stats['expired']}, вытеснено: {stats['evicted']}\n"
+        f"Память: {stats['memory_bytes'] / 1024:.1f} КБ"
+    ))
+
+@common_router.message(Command("queue_stats"))
+async def cmd_queue_stats(message: Message):
+    # Счетчики очереди прогресса ежедневных заданий
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    stats = progress_queue.stats()
+    registration = onboarding.stats()
+    
+    outbox.send(message.answer(
+        f"📥 Очередь прогресса заданий\n"
+        f"В очереди: {stats['pending']}, событий всего: {stats['events']}\n"
+        f"Записей: {stats['flushes']}, событий на запись: {stats['events_per_flush']:.1f}\n"
+        f"UPDATE: {stats['statements']}, изменено строк: {stats['rows_updated']}\n"
+        f"Сэкономлено UPDATE: {stats['writes_saved']}, коммитов: {stats['commits_saved']}\n"
+        f"Ожиданий при переполнении: {stats['backpressure_waits']}, потеряно: {stats['dropped_events']}\n\n"
+        f"👋 Регистрация: создано {registration['created']}, уже были {registration['existing']}\n"
+        f"Пакетов: {registration['batches']}, игроков на пакет: {registration['players_per_batch']:.1f}, "
+        f"ошибок: {registration['failed']}"
+    ))
+
+@common_router.message(Command("cache_stats"))
+async def cmd_cache_stats(message: Message):
+    # Счетчики кэша готовых экранов
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    stats = render_cache.stats()
+    
+    outbox.send(message.answer(
+        f"🧠 Кэш экранов: {stats['entries']} записей\n"
+        f"Память: {(stats['bytes'] + stats['version_bytes']) / 1024:.1f} из {stats['max_bytes'] / 1024:.0f} КБ "
+        f"(версии {stats['versions']} игроков: {stats['version_bytes'] / 1024:.1f} КБ)\n"
+        f"Попадания: {stats['hits']}, промахи: {stats['misses']}, устаревшие: {stats['stale']}\n"
+        f"Доля попаданий: {stats['hit_rate'] * 100:.1f}%, вытеснено: {stats['evicted']}"
+    ))
@@ -1,25 +1,33 @@
 import time
 import json
-import asyncio
+import logging
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from services import generate_incident, solve_incident
+from config import CRISIS_FOLLOWUP_DELAY
+from models import count_queries
+from services import generate_incident, solve_incident, get_player_profile
 from utils.keyboards import get_incident_solutions_keyboard
-from models import SessionMaker, Player, Skill
-from services.maintenance_service import decrease_server_health
-from services.daily_service import update_task_progress
 from services.crisis_service import generate_random_crisis
+from services.formulas import FAILURE_HEALTH_LOSS, MAX_REPUTATION
+from services.incident_store import incident_store, incident_ttl
+from services.render_cache import Rendered, render_cache
+from utils.scheduler import scheduler
+from utils.outbox import outbox
 
-# Создаем роутер для инцидентов
-incident_router = Router()
+logger = logging.getLogger(__name__)
 
-# Временное хранилище для данных пользователей
-user_data = {}
+# Создаем роутер для инцидентов
+incident_router = Router(name="incident_router")
 
 @incident_router.message(F.text == '🚨 Инцидент')
 async def handle_incident(message: Message):
     user_id = message.from_user.id
     
+    # Новый запрос заменяет инцидент, еще ожидающий отправки после кризиса
+    scheduler.cancel(("incident", user_id))
+    
     # Проверяем, не произошел ли кризис
     crisis_result = await generate_random_crisis(user_id)
     
@@ -27,17 +35,17 @@ async def handle_incident(message: Message):
         crisis, prevented = crisis_result
         
         if prevented:
-            await message.answer(
+            outbox.send(message.answer(
                 f"⚠️ *ПРЕДОТВРАЩЕНО: {crisis.name}*\n\n"
                 f"Благодаря вашей бдительности и хорошему мониторингу, удалось предотвратить кризис:\n"
                 f"{crisis.description}\n\n"
                 f"Ваши навыки мониторинга и высокая репутация помогли вам заметить и решить проблему заранее!",
                 parse_mode="Markdown"
-            )
+            ))
         else:
             severity_stars = "🔴" * crisis.severity + "⚪" * (5 - crisis.severity)
             
-            await message.answer(
+            outbox.send(message.answer(
                 f"🚨 *КРИЗИС: {crisis.name}*\n\n"
                 f"📝 *Описание:* {crisis.description}\n"
                 f"⚠️ *Серьезность:* {severity_stars}\n\n"
@@ -47,17 +55,23 @@ async def handle_incident(message: Message):
                 f"- Репутация снизилась на {crisis.reputation_loss} пунктов\n\n"
                 f"Вам следует проверить состояние серверов и при необходимости выполнить ремонт.",
                 parse_mode="Markdown"
-            )
+            ))
             
-            # Даем время пользователю прочитать сообщение о кризисе
-            await asyncio.sleep(3)
+            # Даем время пользователю прочитать сообщение о кризисе: инцидент придет
+            # отдельным сообщением, а обработчик завершается сразу
+            scheduler.call_later(CRISIS_FOLLOWUP_DELAY, send_incident, message, key=("incident", user_id))
+            return
     
-    # Далее генерируем обычный инцидент
+    await send_incident(message)
+
+async def send_incident(message: Message):
+    """Генерация обычного инцидента и отправка его игроку"""
+    user_id = message.from_user.id
     incident = await generate_incident(user_id)
     
     if incident:
         # Сохраняем время начала инцидента для расчёта награды
-        user_data[user_id] = {'incident_id': incident.id, 'start_time': time.time()}
+        await incident_store.put(user_id, incident.id, incident_ttl(incident.time_sensitive))
         
         stars = "⭐" * incident.difficulty + "☆" * (5 - incident.difficulty)
         
@@ -66,7 +80,7 @@ async def handle_incident(message: Message):
         if incident.time_sensitive > 0:
             time_info = f"\n⏱ *Ограничение времени:* {incident.time_sensitive} секунд!"
         
-        await message.answer(
+        outbox.send(message.answer(
             f"🚨 *ИНЦИДЕНТ: {incident.name}*\n\n"
             f"📝 *Описание:* {incident.description}\n"
             f"🔥 *Сложность:* {stars}\n"
@@ -74,48 +88,30 @@ async def handle_incident(message: Message):
             f"Выберите решение:",
             parse_mode="Markdown",
             reply_markup=get_incident_solutions_keyboard(incident)
-        )
+        ))
     else:
-        await message.answer("Сейчас нет активных инцидентов. Попробуйте позже.")
+        outbox.send(message.answer("Сейчас нет активных инцидентов. Попробуйте позже."))
 
 @incident_router.callback_query(F.data.startswith('solution_'))
 async def handle_solution(call: CallbackQuery):
     user_id = call.from_user.id
     
-    if user_id in user_data:
-        incident_data = user_data[user_id]
-        solution_time = time.time() - incident_data['start_time']
-        incident_id = incident_data['incident_id']
+    # Забираем инцидент сразу: повторное нажатие уже не найдет его
+    pending = await incident_store.pop(user_id)
+    
+    if pending:
+        solution_time = time.time() - pending.start_time
+        incident_id = pending.incident_id
         
         # Получаем решение из callback_data
         solution_key = call.data.split('_')[1]
         
-        # Обрабатываем решение
-        success, reward, exp_gain, level_up = await solve_incident(
-            user_id, incident_id, solution_key, solution_time
-        )
-        
-        # Обновляем статистику и состояние серверов
-        with SessionMaker() as session:
-            player = session.query(Player).filter(Player.user_id == user_id).first()
-            if player:
-                if success:
-                    player.successful_fixes += 1
-                    # Увеличиваем репутацию при успехе
-                    player.reputation = min(100, player.reputation + 2)
-                else:
-                    player.failed_fixes += 1
-                    # Снижаем репутацию при неудаче
-                    player.reputation = max(0, player.reputation - 5)
-                    
-                    # Уменьшаем здоровье серверов при неудаче
-                    await decrease_server_health(user_id, 5.0)
-                
-                session.commit()
-        
-        # Обновляем прогресс ежедневного задания
-        if success:
-            await update_task_progress(user_id, "solve_incidents")
+        # Обрабатываем решение одной транзакцией
+        with count_queries() as queries:
+            success, reward, exp_gain, level_up = await solve_incident(
+                user_id, incident_id, solution_key, solution_time
+            )
+        logger.debug("Решение инцидента %s: %d SQL-запросов", incident_id, queries.statements)
         
         if success:
             result_message = f"✅ *Успех!* Инцидент решен за {solution_time:.1f} секунд!\n\n" \
@@ -128,43 +124,45 @@ async def handle_solution(call: CallbackQuery):
             result_message = f"❌ *Неудача!* Ваше решение не сработало.\n\n" \
                              f"💰 Потеряно: ${-reward}\n" \
                              f"⭐️ Опыт: +{exp_gain} (учимся на ошибках)\n\n" \
-                             f"Состояние серверов снизилось на 5%.\n" \
+                             f"Состояние серверов снизилось на {FAILURE_HEALTH_LOSS:g}%.\n" \
                              f"Возможно, вам стоит улучшить навыки или выбрать другой подход."
                 
-        await call.message.edit_text(
+        outbox.send(call.message.edit_text(
             text=call.message.text + f"\n\n{result_message}",
             parse_mode="Markdown"
-        )
+        ))
         
-        # Удаляем временные данные пользователя
-        del user_data[user_id]
-        
-        await call.answer()
+        outbox.send(call.answer())
     else:
-        await call.answer("Инцидент не найден. Пожалуйста, сгенерируйте новый.")
+        outbox.send(call.answer("Инцидент не найден. Пожалуйста, сгенерируйте новый."))
+
+async def render_stats(user_id: int) -> Optional[Rendered]:
+    player, _ = await get_player_profile(user_id)
+    
+    if not player:
+        return None
+    
+    total_incidents = player.successful_fixes + player.failed_fixes
+    success_rate = 0 if total_incidents == 0 else (player.successful_fixes / total_incidents) * 100
+    
+    return Rendered(
+        f"📊 *Статистика DevOps-инженера*\n\n"
+        f"🖥 *Состояние серверов:* {player.server_health:.1f}%\n"
+        f"👨‍💻 *Репутация:* {player.reputation}/{MAX_REPUTATION}\n"
+        f"✅ *Успешно решено инцидентов:* {player.successful_fixes}\n"
+        f"❌ *Проваленных инцидентов:* {player.failed_fixes}\n"
+        f"📈 *Процент успеха:* {success_rate:.1f}%\n\n"
+        f"Продолжайте повышать свои навыки и решать инциденты!"
+    )
 
 # Новый обработчик для просмотра статистики решений
 @incident_router.message(F.text == '📊 Статистика')
 async def show_stats(message: Message):
     user_id = message.from_user.id
+    rendered = await render_cache.render(user_id, "stats", lambda: render_stats(user_id))
     
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            await message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start")
-            return
-        
-        total_incidents = player.successful_fixes + player.failed_fixes
-        success_rate = 0 if total_incidents == 0 else (player.successful_fixes / total_incidents) * 100
-        
-        await message.answer(
-            f"📊 *Статистика DevOps-инженера*\n\n"
-            f"🖥 *Состояние серверов:* {player.server_health:.1f}%\n"
-            f"👨‍💻 *Репутация:* {player.reputation}/100\n"
-            f"✅ *Успешно решено инцидентов:* {player.successful_fixes}\n"
-            f"❌ *Проваленных инцидентов:* {player.failed_fixes}\n"
-            f"📈 *Процент успеха:* {success_rate:.1f}%\n\n"
-            f"Продолжайте повышать свои навыки и решать инциденты!",
-            parse_mode="Markdown"
-        )
+    if not rendered:
+        outbox.send(message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start"))
+        return
+    
+    outbox.send(message.answer(rendered.text, parse_mode="Markdown"))
@@ -1,21 +1,23 @@
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 
 from services import get_player_profile, repair_server
 from utils.keyboards import get_maintenance_keyboard
-from services.daily_service import update_task_progress
+from services.formulas import repair_price
+from services.progress_queue import progress_queue
+from services.render_cache import Rendered, render_cache
+from utils.outbox import outbox
 
 # Создаем роутер для обслуживания
-maintenance_router = Router()
+maintenance_router = Router(name="maintenance_router")
 
-@maintenance_router.message(F.text == '🔧 Обслуживание')
-async def show_maintenance(message: Message):
-    user_id = message.from_user.id
+async def render_maintenance(user_id: int) -> Optional[Rendered]:
     player, _ = await get_player_profile(user_id)
     
     if not player:
-        await message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start")
-        return
+        return None
     
     server_health = player.server_health
     health_status = "🟢 Отлично" if server_health > 90 else \
@@ -23,19 +25,29 @@ async def show_maintenance(message: Message):
                    "🟠 Удовлетворительно" if server_health > 50 else \
                    "🔴 Критически"
     
-    repair_cost = int((100 - server_health) * player.servers * 5)
+    repair_cost = int(repair_price(100 - server_health, player.servers))
     
-    await message.answer(
+    return Rendered(
         f"🔧 *Обслуживание серверов*\n\n"
         f"Текущее состояние: {health_status} ({server_health:.1f}%)\n"
         f"Количество серверов: {player.servers}\n\n"
         f"Стоимость полного ремонта: ${repair_cost}\n\n"
         f"Низкое здоровье серверов увеличивает вероятность сбоев и снижает\n"
         f"эффективность решения инцидентов.",
-        parse_mode="Markdown",
-        reply_markup=get_maintenance_keyboard(repair_cost)
+        get_maintenance_keyboard(repair_cost)
     )
 
+@maintenance_router.message(F.text == '🔧 Обслуживание')
+async def show_maintenance(message: Message):
+    user_id = message.from_user.id
+    rendered = await render_cache.render(user_id, "maintenance", lambda: render_maintenance(user_id))
+    
+    if not rendered:
+        outbox.send(message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start"))
+        return
+    
+    outbox.send(message.answer(rendered.text, parse_mode="Markdown", reply_markup=rendered.reply_markup))
+
 @maintenance_router.callback_query(F.data.startswith('repair_'))
 async def handle_repair(call: CallbackQuery):
     user_id = call.from_user.id
@@ -45,7 +57,7 @@ async def handle_repair(call: CallbackQuery):
     
     if success:
         # Обновляем прогресс ежедневного задания
-        await update_task_progress(user_id, "repair_servers", repair_amount)
+        await progress_queue.emit(user_id, "repair_servers", repair_amount)
         
         health_status = "🟢 Отлично" if new_health > 90 else \
                        "🟡 Хорошо" if new_health > 70 else \
@@ -53,9 +65,9 @@ async def handle_repair(call: CallbackQuery):
                        "🔴 Критически"
         
         player, _ = await get_player_profile(user_id)
-        repair_cost = int((100 - new_health) * player.servers * 5)
+        repair_cost = int(repair_price(100 - new_health, player.servers))
         
-        await call.message.edit_text(
+        outbox.send(call.message.edit_text(
             f"🔧 *Обслуживание серверов*\n\n"
             f"✅ Ремонт выполнен успешно!\n"
             f"Потрачено: ${cost}\n\n"
@@ -64,8 +76,8 @@ async def handle_repair(call: CallbackQuery):
             f"Стоимость полного ремонта: ${repair_cost}",
             parse_mode="Markdown",
             reply_markup=get_maintenance_keyboard(repair_cost)
-        )
+        ))
         
-        await call.answer("Ремонт выполнен успешно!")
+        outbox.send(call.answer("Ремонт выполнен успешно!"))
     else:
-        await call.answer(f"Недостаточно средств! Необходимо ${cost}") 
\ No newline at end of file
+        outbox.send(call.answer(f"Недостаточно средств! Необходимо ${cost}")) 
\ No newline at end of file
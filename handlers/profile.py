@@ -1,30 +1,42 @@
+from typing import Optional
+
 from aiogram import Router
 from aiogram.types import Message
 from aiogram import F
 from aiogram.filters import Command
 
 from services import get_player_profile
+from services.formulas import next_level_experience
+from services.render_cache import Rendered, render_cache
+from utils.outbox import outbox
 
 # Создаем роутер для профиля
-profile_router = Router()
+profile_router = Router(name="profile_router")
+
+async def render_profile(user_id: int) -> Optional[Rendered]:
+    player, skills = await get_player_profile(user_id)
+    
+    if not player:
+        return None
+    
+    skills_text = "\n".join([f"• {skill.skill_name}: {skill.skill_level} уровень" for skill in skills])
+    
+    return Rendered(
+        f"🖥 *Профиль DevOps-инженера*\n\n"
+        f"👤 *Имя:* {player.username}\n"
+        f"📊 *Уровень:* {player.level}\n"
+        f"⭐️ *Опыт:* {player.experience}/{next_level_experience(player.level)}\n"
+        f"💰 *Деньги:* ${player.money}\n"
+        f"🖥 *Серверы:* {player.servers}\n\n"
+        f"*Навыки:*\n{skills_text}"
+    )
 
 @profile_router.message(F.text == '🖥 Профиль')
 async def show_profile(message: Message):
     user_id = message.from_user.id
-    player, skills = await get_player_profile(user_id)
+    rendered = await render_cache.render(user_id, "profile", lambda: render_profile(user_id))
     
-    if player:
-        skills_text = "\n".join([f"• {skill.skill_name}: {skill.skill_level} уровень" for skill in skills])
-        
-        await message.answer(
-            f"🖥 *Профиль DevOps-инженера*\n\n"
-            f"👤 *Имя:* {player.username}\n"
-            f"📊 *Уровень:* {player.level}\n"
-            f"⭐️ *Опыт:* {player.experience}/{player.level*100}\n"
-            f"💰 *Деньги:* ${player.money}\n"
-            f"🖥 *Серверы:* {player.servers}\n\n"
-            f"*Навыки:*\n{skills_text}",
-            parse_mode="Markdown"
-        )
+    if rendered:
+        outbox.send(message.answer(rendered.text, parse_mode="Markdown"))
     else:
-        await message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start")
+        outbox.send(message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start"))
@@ -1,43 +1,49 @@
 from aiogram import Router, F
 from aiogram.types import Message
 
-from models import Player, SessionMaker
+from services import get_rating
+from utils.outbox import outbox
 
 # Создаем роутер для рейтинга
-rating_router = Router()
+rating_router = Router(name="rating_router")
 
 @rating_router.message(F.text == '📈 Рейтинг')
 async def show_rating(message: Message):
-    with SessionMaker() as session:
-        # Получаем топ-10 игроков по уровню
-        top_players = session.query(
-            Player.username, 
-            Player.level, 
-            Player.experience,
-            Player.successful_fixes,
-            Player.server_health
-        ).order_by(
-            Player.level.desc(), 
-            Player.experience.desc()
-        ).limit(10).all()
-        
-        if not top_players:
-            await message.answer("Пока нет данных для рейтинга.")
-            return
-        
-        # Форматируем список лидеров
-        rating_text = "\n\n".join([
-            f"{i+1}. *{player[0]}*\n"
-            f"Уровень: {player[1]}\n"
-            f"Опыт: {player[2]}\n"
-            f"Решено инцидентов: {player[3]}\n"
-            f"Состояние серверов: {player[4]:.1f}%"
-            for i, player in enumerate(top_players)
-        ])
-        
-        await message.answer(
-            f"📈 *Рейтинг лучших DevOps-инженеров*\n\n"
-            f"{rating_text}\n\n"
-            f"Продолжайте улучшать свои навыки, чтобы подняться в рейтинге!",
-            parse_mode="Markdown"
-        )
\ No newline at end of file
+    # Топ-10 и соседи игрока берутся из рейтинга в памяти, из базы - только их строки
+    rating = await get_rating(message.from_user.id, limit=10, radius=2)
+    top_players = rating['top']
+    
+    if not top_players:
+        outbox.send(message.answer("Пока нет данных для рейтинга."))
+        return
+    
+    # Форматируем список лидеров
+    rating_text = "\n\n".join([
+        f"{i+1}. *{player[0]}*\n"
+        f"Уровень: {player[1]}\n"
+        f"Опыт: {player[2]}\n"
+        f"Решено инцидентов: {player[3]}\n"
+        f"Состояние серверов: {player[4]:.1f}%"
+        for i, player in enumerate(top_players)
+    ])
+    
+    # Место игрока и ближайшие соседи, если он не в топе
+    position_text = ""
+    if rating['rank']:
+        position_text = f"Ваше место: {rating['rank']} из {rating['total']}\n\n"
+        if rating['rank'] > len(top_players):
+            neighbours_text = "\n".join([
+                f"{rating['neighbours_from'] + i}. "
+                f"{'👉 ' if user_id == message.from_user.id else ''}{player[0]} — "
+                f"уровень {player[1]}, опыт {player[2]}"
+                for i, (user_id, player) in enumerate(rating['neighbours'])
+            ])
+            position_text += f"{neighbours_text}\n\n"
+    
+    outbox.send(message.answer(
+        f"📈 *Рейтинг лучших DevOps-инженеров*\n\n"
+        f"{rating_text}\n\n"
+        f"{position_text}"
+        f"Продолжайте улучшать свои навыки, чтобы подняться в рейтинге!",
+        parse_mode="Markdown"
+    ))
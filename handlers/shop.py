@@ -1,31 +1,43 @@
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from services import get_player_profile, buy_server, upgrade_skill
 from utils.keyboards import get_shop_keyboard, get_skills_keyboard
-from services.daily_service import update_task_progress
+from services.formulas import SERVER_BONUS_PER_SERVER, server_price
+from services.progress_queue import progress_queue
+from services.render_cache import Rendered, render_cache
+from utils.outbox import outbox
 
 # Создаем роутер для магазина
-shop_router = Router()
+shop_router = Router(name="shop_router")
 
-@shop_router.message(F.text == '🛒 Магазин')
-async def show_shop(message: Message):
-    user_id = message.from_user.id
+async def render_shop(user_id: int) -> Optional[Rendered]:
     player, _ = await get_player_profile(user_id)
     
     if not player:
-        await message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start")
-        return
+        return None
     
-    server_cost = player.servers * 1000
+    server_cost = server_price(player.servers)
     
-    await message.answer(
+    return Rendered(
         "🛒 *Магазин DevOps-инженера*\n\n"
         f"У вас сейчас {player.servers} серверов.\n"
-        f"Каждый новый сервер увеличивает доход от решения инцидентов на 10%.",
-        parse_mode="Markdown",
-        reply_markup=get_shop_keyboard(server_cost)
+        f"Каждый новый сервер увеличивает доход от решения инцидентов на {SERVER_BONUS_PER_SERVER:.0%}.",
+        get_shop_keyboard(server_cost)
     )
 
+@shop_router.message(F.text == '🛒 Магазин')
+async def show_shop(message: Message):
+    user_id = message.from_user.id
+    rendered = await render_cache.render(user_id, "shop", lambda: render_shop(user_id))
+    
+    if not rendered:
+        outbox.send(message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start"))
+        return
+    
+    outbox.send(message.answer(rendered.text, parse_mode="Markdown", reply_markup=rendered.reply_markup))
+
 @shop_router.callback_query(F.data == "buy_server")
 async def handle_buy_server(call: CallbackQuery):
     user_id = call.from_user.id
@@ -36,23 +48,23 @@ async def handle_buy_server(call: CallbackQuery):
         player, _ = await get_player_profile(user_id)
         
         if not player:
-            await call.answer("Произошла ошибка.")
+            outbox.send(call.answer("Произошла ошибка."))
             return
         
-        new_server_cost = player.servers * 1000
+        new_server_cost = server_price(player.servers)
         
-        await call.message.edit_text(
+        outbox.send(call.message.edit_text(
             "🛒 *Магазин DevOps-инженера*\n\n"
             f"✅ Новый сервер куплен!\n"
             f"У вас сейчас {player.servers} серверов.\n"
-            f"Каждый сервер увеличивает доход от решения инцидентов на 10%.",
+            f"Каждый сервер увеличивает доход от решения инцидентов на {SERVER_BONUS_PER_SERVER:.0%}.",
             parse_mode="Markdown",
             reply_markup=get_shop_keyboard(new_server_cost)
-        )
+        ))
         
-        await call.answer("Новый сервер успешно куплен!")
+        outbox.send(call.answer("Новый сервер успешно куплен!"))
     else:
-        await call.answer(f"Недостаточно средств! Необходимо ${cost}")
+        outbox.send(call.answer(f"Недостаточно средств! Необходимо ${cost}"))
 
 @shop_router.message(F.text == '📊 Навыки')
 async def show_skills(message: Message):
@@ -60,15 +72,15 @@ async def show_skills(message: Message):
     player, skills = await get_player_profile(user_id)
     
     if not player:
-        await message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start")
+        outbox.send(message.answer("Произошла ошибка. Пожалуйста, перезапустите бота командой /start"))
         return
     
-    await message.answer(
+    outbox.send(message.answer(
         "📊 *Ваши навыки DevOps-инженера*\n\n"
         "Выберите навык для улучшения:",
         parse_mode="Markdown",
         reply_markup=get_skills_keyboard(skills)
-    )
+    ))
 
 @shop_router.callback_query(F.data.startswith('upgrade_'))
 async def handle_skill_upgrade(call: CallbackQuery):
@@ -79,22 +91,22 @@ async def handle_skill_upgrade(call: CallbackQuery):
     
     if success:
         # Обновляем прогресс ежедневного задания
-        await update_task_progress(user_id, "upgrade_skill")
+        await progress_queue.emit(user_id, "upgrade_skill")
         
-        await call.answer(f"Навык {skill_name} улучшен до уровня {new_level}!")
+        outbox.send(call.answer(f"Навык {skill_name} улучшен до уровня {new_level}!"))
         
         # Обновляем меню навыков
         player, skills = await get_player_profile(user_id)
         
         if not player:
-            await call.message.edit_text("Произошла ошибка. Пожалуйста, перезапустите бота командой /start")
+            outbox.send(call.message.edit_text("Произошла ошибка. Пожалуйста, перезапустите бота командой /start"))
             return
         
-        await call.message.edit_text(
+        outbox.send(call.message.edit_text(
             "📊 *Ваши навыки DevOps-инженера*\n\n"
             "Навык успешно улучшен! Выберите навык для улучшения:",
             parse_mode="Markdown",
             reply_markup=get_skills_keyboard(skills)
-        )
+        ))
     else:
-        await call.answer(f"Недостаточно средств! Необходимо ${cost}")
+        outbox.send(call.answer(f"Недостаточно средств! Необходимо ${cost}"))
@@ -3,9 +3,10 @@ from aiogram.types import Message, CallbackQuery
 
 from services import get_daily_tasks, claim_task_reward
 from utils.keyboards import get_daily_tasks_keyboard
+from utils.outbox import outbox
 
 # Создаем роутер для заданий
-tasks_router = Router()
+tasks_router = Router(name="tasks_router")
 
 @tasks_router.message(F.text == '📋 Задания')
 async def show_daily_tasks(message: Message):
@@ -13,7 +14,7 @@ async def show_daily_tasks(message: Message):
     tasks = await get_daily_tasks(user_id)
     
     if not tasks:
-        await message.answer("У вас пока нет активных заданий. Попробуйте позже.")
+        outbox.send(message.answer("У вас пока нет активных заданий. Попробуйте позже."))
         return
     
     tasks_text = "\n\n".join([
@@ -26,13 +27,13 @@ async def show_daily_tasks(message: Message):
     
     markup = get_daily_tasks_keyboard(tasks)
     
-    await message.answer(
+    outbox.send(message.answer(
         f"📋 *Ежедневные задания*\n\n"
         f"{tasks_text}\n\n"
         f"Выполняйте задания, чтобы получать дополнительные награды!",
         parse_mode="Markdown",
         reply_markup=markup
-    )
+    ))
 
 @tasks_router.callback_query(F.data.startswith('claim_task_'))
 async def handle_claim_task(call: CallbackQuery):
@@ -42,13 +43,13 @@ async def handle_claim_task(call: CallbackQuery):
     success, money, exp = await claim_task_reward(user_id, task_id)
     
     if success:
-        await call.answer(f"Награда получена: ${money} и {exp} опыта!")
+        outbox.send(call.answer(f"Награда получена: ${money} и {exp} опыта!"))
         
         # Обновляем список заданий
         tasks = await get_daily_tasks(user_id)
         
         if not tasks:
-            await call.message.edit_text("У вас нет активных заданий.")
+            outbox.send(call.message.edit_text("У вас нет активных заданий."))
             return
         
         tasks_text = "\n\n".join([
@@ -61,12 +62,12 @@ async def handle_claim_task(call: CallbackQuery):
         
         markup = get_daily_tasks_keyboard(tasks)
         
-        await call.message.edit_text(
+        outbox.send(call.message.edit_text(
             f"📋 *Ежедневные задания*\n\n"
             f"{tasks_text}\n\n"
             f"Выполняйте задания, чтобы получать дополнительные награды!",
             parse_mode="Markdown",
             reply_markup=markup
-        )
+        ))
     else:
-        await call.answer("Не удалось получить награду. Возможно, задание еще не выполнено.") 
\ No newline at end of file
+        outbox.send(call.answer("Не удалось получить награду. Возможно, задание еще не выполнено.")) 
\ No newline at end of file
@@ -1,250 +1,164 @@
+# Первым импортом: отсчет времени запуска начинается до тяжелых библиотек
+from utils.startup import startup
 import asyncio
 import logging
-import random
-import time
-from datetime import datetime
-from typing import List, Tuple, Optional, Dict, Any
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, func, Float
-from sqlalchemy.orm import sessionmaker, relationship, Session, declarative_base
-from config import BOT_TOKEN
-from models.database import Base, engine, init_database
+import os
+from aiogram import Dispatcher
+from config import (
+    RUN_MODE, FAST_START, STARTUP_TARGET, WORKERS, OUTBOX_RATE, METRICS_PORT, PROFILE_SLOW_UPDATES, PROFILE_DIR
+)
+from models.database import init_database
 from services.incident_service import init_default_incidents
 from services.crisis_service import init_default_crises
+from services.leaderboard import load_leaderboard, load_leaderboard_in_background, wait_leaderboard
+from services.daily_rollover import daily_rollover_loop
+from services.world_tick import world_tick_loop
+from services.progress_queue import progress_queue
+from services.fsm_storage import create_fsm_storage
 from handlers import setup_routers
+from utils.metrics import setup_metrics
+from utils.profiler import setup_profiler
+from utils.scheduler import scheduler
+from utils.runner import (
+    create_bot, setup_concurrency, setup_user_serialization, setup_outbox, run_polling, run_webhook
+)
+from utils.workers import WorkerChannel, run_supervisor, serve_worker
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+bot = create_bot()
 
-# Настройка SQLAlchemy
-engine = create_engine('sqlite:///devops_simulator.db')
-Base = declarative_base()
-SessionMaker = sessionmaker(bind=engine)
+# Инициализация базы данных
+async def prepare_database():
+    """Миграции и заполнение каталогов; при нескольких воркерах выполняется супервизором"""
+    with startup.phase("миграции"):
+        init_database()  # Применяем миграции схемы, данные сохраняются
+    with startup.phase("каталоги"):
+        await init_default_incidents()
+        await init_default_crises()
+
+async def load_rating():
+    if FAST_START:
+        # Рейтинг строится в фоне, бот тем временем уже принимает обновления
+        load_leaderboard_in_background()
+    else:
+        with startup.phase("рейтинг"):
+            await load_leaderboard()
 
-# Временное хранилище для данных пользователей
-user_data: Dict[int, Dict[str, Any]] = {}
+async def init_db():
+    """Инициализация базы данных и заполнение начальными данными"""
+    await prepare_database()
+    await load_rating()
 
-# Модели SQLAlchemy
-class Player(Base):
-    __tablename__ = 'players'
+def create_dispatcher(worker_index: int = 0) -> Dispatcher:
+    """Диспетчер со всеми роутерами, middleware и обработчиками запуска и остановки"""
+    # Инициализация диспетчера с хранилищем состояний
+    dp = Dispatcher(storage=create_fsm_storage())
     
-    user_id = Column(Integer, primary_key=True)
-    username = Column(String)
-    level = Column(Integer, default=1)
-    experience = Column(Integer, default=0)
-    money = Column(Integer, default=1000)
-    servers = Column(Integer, default=1)
-    last_incident = Column(String, nullable=True)
-    last_activity = Column(String)
+    # Ограничение параллельной обработки обновлений
+    limiter = setup_concurrency(dp)
     
-    skills = relationship("Skill", back_populates="player", cascade="all, delete-orphan")
-
-class Skill(Base):
-    __tablename__ = 'skills'
+    # Обновления одного игрока по очереди, двойные нажатия кнопок не обрабатываются
+    serializer = setup_user_serialization(dp)
     
-    id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('players.user_id'))
-    skill_name = Column(String)
-    skill_level = Column(Integer, default=1)
+    # Замеры обработчиков и SQL; воркеры слушают соседние порты и пишут стеки в свои каталоги
+    profiler = None
+    if PROFILE_SLOW_UPDATES:
+        directory = os.path.join(PROFILE_DIR, f"worker{worker_index}") if WORKERS > 1 else PROFILE_DIR
+        profiler = setup_profiler(dp, directory)
+    setup_metrics(
+        dp, METRICS_PORT + worker_index if METRICS_PORT else 0,
+        limiter=limiter, serializer=serializer, profiler=profiler
+    )
     
-    player = relationship("Player", back_populates="skills")
-
-class Incident(Base):
-    __tablename__ = 'incidents'
+    # Очередь прогресса заданий: запуск вместе с ботом, запись остатка после завершения обновлений
+    dp.startup.register(progress_queue.start)
+    dp.shutdown.register(progress_queue.stop)
     
-    id = Column(Integer, primary_key=True)
-    name = Column(String)
-    description = Column(String)
-    difficulty = Column(Integer)
-    reward = Column(Integer)
-
-# Инициализация базы данных
-async def init_db():
-    """Инициализация базы данных и заполнение начальными данными"""
-    init_database()  # Пересоздаем все таблицы
-    await init_default_incidents()
-    await init_default_crises()
-
-# Получение или создание игрока
-async def get_or_create_player(user_id: int, username: str) -> Player:
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            player = Player(
-                user_id=user_id,
-                username=username,
-                last_activity=datetime.now().isoformat()
-            )
-            session.add(player)
-            session.commit()
-            
-            # Создаем начальные навыки
-            basic_skills = [
-                Skill(user_id=user_id, skill_name='Linux', skill_level=1),
-                Skill(user_id=user_id, skill_name='Networking', skill_level=1),
-                Skill(user_id=user_id, skill_name='Docker', skill_level=1),
-                Skill(user_id=user_id, skill_name='CI/CD', skill_level=1),
-                Skill(user_id=user_id, skill_name='Monitoring', skill_level=1)
-            ]
-            session.add_all(basic_skills)
-            session.commit()
-            
-            # Перезагружаем игрока, чтобы получить связанные навыки
-            session.refresh(player)
-        
-        return player
-
-# Получение профиля игрока
-async def get_player_profile(user_id: int) -> Tuple[Optional[Player], List[Skill]]:
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if player:
-            skills = session.query(Skill).filter(Skill.user_id == user_id).all()
-            return player, skills
-        return None, []
-
-# Обновление опыта и уровня
-async def update_experience(user_id: int, exp_gain: int) -> Tuple[int, int, bool]:
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return 1, 0, False
-        
-        player.experience += exp_gain
-        level_up = False
-        
-        # Формула для повышения уровня: 100 * текущий_уровень
-        next_level_exp = 100 * player.level
-        
-        if player.experience >= next_level_exp:
-            player.level += 1
-            level_up = True
-        
-        player.last_activity = datetime.now().isoformat()
-        session.commit()
-        
-        return player.level, player.experience, level_up
+    # Планировщик отложенных сообщений: при остановке оставшиеся отправляются сразу
+    dp.startup.register(scheduler.start)
+    dp.shutdown.register(scheduler.stop)
+    
+    # Исходящие сообщения через очередь с ограничением частоты; воркеры делят общий лимит.
+    # Останавливается после планировщика, чтобы отправить и его последние сообщения
+    setup_outbox(dp, OUTBOX_RATE / WORKERS)
+    
+    # Регистрация роутеров
+    with startup.phase("роутеры"):
+        setup_routers(dp)
+    
+    # Последний обработчик запуска: отметка готовности принимать обновления
+    dp.startup.register(on_ready)
+    return dp
 
-# Генерация случайного инцидента
-async def generate_incident(user_id: int) -> Optional[Incident]:
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return None
-        
-        player_level = player.level
-        
-        # Получаем инциденты, соответствующие уровню игрока +/- 1
-        min_difficulty = max(1, player_level - 1)
-        max_difficulty = player_level + 1
-        
-        incidents = session.query(Incident).filter(
-            Incident.difficulty.between(min_difficulty, max_difficulty)
-        ).all()
-        
-        if not incidents:
-            return None
-        
-        return random.choice(incidents)
+async def on_ready():
+    """Бот готов принимать обновления"""
+    startup.mark_ready(STARTUP_TARGET)
 
-# Обработка инцидента
-async def solve_incident(user_id: int, incident_id: int, solution_time: float) -> Tuple[int, int, bool]:
-    with SessionMaker() as session:
-        incident = session.query(Incident).filter(Incident.id == incident_id).first()
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not incident or not player:
-            return 0, 0, False
-        
-        difficulty = incident.difficulty
-        base_reward = incident.reward
-        
-        # Бонус от количества серверов
-        server_bonus = 1 + (player.servers - 1) * 0.1
-        
-        # Расчет награды в зависимости от времени решения и сложности
-        reward_modifier = max(0.5, 1.5 - (solution_time / 60))  # Чем быстрее решение, тем выше награда
-        reward = int(base_reward * reward_modifier * server_bonus)
-        exp_gain = int(difficulty * 20 * reward_modifier)
-        
-        # Обновляем статистику игрока
-        player.money += reward
-        player.last_activity = datetime.now().isoformat()
-        session.commit()
-        
-        # Обновляем опыт и получаем новый уровень
-        level, experience, level_up = await update_experience(user_id, exp_gain)
-        
-        return reward, exp_gain, level_up
+# Фоновые задачи: перенос ежедневных заданий и симуляция мира
+background_tasks = []
 
-# Улучшение навыка
-async def upgrade_skill(user_id: int, skill_name: str) -> Tuple[bool, int, int]:
-    with SessionMaker() as session:
-        skill = session.query(Skill).filter(
-            Skill.user_id == user_id,
-            Skill.skill_name == skill_name
-        ).first()
-        
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not skill or not player:
-            return False, 0, 0
-        
-        current_level = skill.skill_level
-        upgrade_cost = current_level * 200
-        
-        if player.money >= upgrade_cost:
-            skill.skill_level += 1
-            player.money -= upgrade_cost
-            session.commit()
-            
-            return True, skill.skill_level, upgrade_cost
-        else:
-            return False, current_level, upgrade_cost
+async def background_jobs():
+    # При быстром запуске задачи ждут загрузки рейтинга, чтобы не отнимать у нее процессор
+    await wait_leaderboard()
+    await asyncio.gather(daily_rollover_loop(), world_tick_loop())
 
-# Покупка сервера
-async def buy_server(user_id: int) -> Tuple[bool, int]:
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return False, 0
-        
-        server_cost = player.servers * 1000
-        
-        if player.money >= server_cost:
-            player.servers += 1
-            player.money -= server_cost
-            session.commit()
-            
-            return True, server_cost
-        else:
-            return False, server_cost
+async def start_background_jobs():
+    background_tasks.append(asyncio.create_task(background_jobs()))
 
 async def main():
+    startup.mark_imported()
+    
     # Настройка логирования
     logging.basicConfig(level=logging.INFO)
     
-    # Инициализация диспетчера с хранилищем состояний
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Регистрация роутеров
-    setup_routers(dp)
+    dp = create_dispatcher()
     
     # Инициализация базы данных
     await init_db()
     
+    # Фоновые задачи при быстром запуске стартуют после готовности и не отнимают у нее время
+    if FAST_START:
+        dp.startup.register(start_background_jobs)
+    else:
+        await start_background_jobs()
+    
     # Запуск бота
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await run_polling(dp, bot)
+    finally:
+        for task in background_tasks:
+            task.cancel()
+
+async def worker_main(channel: WorkerChannel):
+    """Воркер: свой диспетчер и рейтинг, обновления приходят от супервизора"""
+    startup.mark_imported()
+    dp = create_dispatcher(channel.index)
+    await load_rating()
+    
+    # Фоновые задачи выполняет только первый воркер
+    if channel.index == 0:
+        dp.startup.register(start_background_jobs)
+    
+    try:
+        await serve_worker(dp, bot, channel)
+    finally:
+        for task in background_tasks:
+            task.cancel()
+
+def run_worker(channel: WorkerChannel):
+    asyncio.run(worker_main(channel))
+
+async def supervise():
+    """Супервизор: подготовка базы, затем WORKERS процессов-обработчиков"""
+    startup.mark_imported()
+    await prepare_database()
+    await run_supervisor(run_worker, WORKERS)
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    asyncio.run(supervise() if WORKERS > 1 else main())
@@ -1,6 +1,10 @@
-from models.database import Base, SessionMaker, engine
+from models.database import Base, SessionMaker, engine, create_db_engine, run_in_session, count_queries
 from models.player import Player
 from models.skill import Skill
 from models.incident import Incident
 from models.crisis import Crisis
-from models.daily_task import DailyTask
\ No newline at end of file
+from models.daily_task import DailyTask
+from models.active_incident import ActiveIncident
+from models.job_checkpoint import JobCheckpoint
+from models.fsm_state import FsmState
+from models.sharding import router, group_by_shard, run_for_user, run_on_shard, run_on_all_shards
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, Float, Index
+
+from models.database import Base
+
+class ActiveIncident(Base):
+    __tablename__ = 'active_incidents'
+    __table_args__ = (
+        Index('ix_active_incidents_expires_at', 'expires_at'),
+    )
+    
+    user_id = Column(Integer, primary_key=True)
+    incident_id = Column(Integer)
+    start_time = Column(Float)   # Время показа инцидента (time.time())
+    expires_at = Column(Float)   # После этого момента инцидент считается брошенным
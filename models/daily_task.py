@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from models.database import Base
 
 class DailyTask(Base):
     __tablename__ = 'daily_tasks'
+    __table_args__ = (
+        # Одно задание каждого типа на день: пакетный перенос и get_daily_tasks вставляют с ON CONFLICT DO NOTHING
+        Index('ux_daily_tasks_user_date_type', 'user_id', 'date_created', 'task_type', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('players.user_id'))
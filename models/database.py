@@ -1,19 +1,135 @@
-from sqlalchemy import create_engine
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-# Создание движка SQLAlchemy
-engine = create_engine('sqlite:///devops_simulator.db', echo=True)
+from config import (
+    DATABASE_URL, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # Применяется к каждому новому соединению пула: WAL позволяет читать во время записи,
+    # synchronous=NORMAL в режиме WAL не ждет fsync на каждом коммите
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+def create_db_engine(url: str = DATABASE_URL, echo: bool = DB_ECHO, tuned: bool = True) -> Engine:
+    """Движок SQLAlchemy по настройкам из config.
+
+    Размер пула, переполнение, ожидание и пересоздание соединений берутся из
+    DB_POOL_*. Для файловой SQLite каждое соединение настраивается PRAGMA из
+    SQLITE_*; tuned=False оставляет параметры SQLite по умолчанию.
+    """
+    url = make_url(url)
+    sqlite = url.get_backend_name() == "sqlite"
+    if sqlite and url.database in (None, "", ":memory:"):
+        # База в памяти живет в одном соединении, пул к ней не применим
+        return create_engine(url, echo=echo)
+
+    engine = create_engine(
+        url,
+        echo=echo,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE
+    )
+    if sqlite and tuned:
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+# Движок SQLAlchemy
+engine = create_db_engine()
 
 # Базовый класс для моделей
 Base = declarative_base()
 
-# Фабрика сессий
-SessionMaker = sessionmaker(bind=engine)
+# Фабрика сессий. Объекты возвращаются из рабочих потоков уже отсоединенными,
+# поэтому атрибуты не должны сбрасываться при коммите
+SessionMaker = sessionmaker(bind=engine, expire_on_commit=False)
+
+# Пул потоков для блокирующих операций с базой данных.
+# Каждый поток держит одно постоянное соединение пула, переполнение остается
+# для кода вне пула потоков (миграции, бенчмарки)
+DB_EXECUTOR_THREADS = DB_POOL_SIZE
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix="db")
+
+# Счетчик SQL-запросов текущей корутины (передается в рабочие потоки вместе с контекстом)
+_query_counter = contextvars.ContextVar("query_counter", default=None)
+
+# Наблюдатель за каждым выполненным запросом: on_statement(statement, seconds).
+# Вызывается в потоке, выполнившем запрос (см. utils.metrics)
+on_statement = None
+
+class QueryCounter:
+    """Количество и суммарное время SQL-запросов, выполненных внутри count_queries()"""
+    __slots__ = ("statements", "seconds", "parent")
+
+    def __init__(self, parent=None):
+        self.statements = 0
+        self.seconds = 0.0
+        self.parent = parent
+
+@contextmanager
+def count_queries():
+    """Подсчет SQL-запросов, выполненных в текущем контексте (например, за один callback).
+
+    Вложенные счетчики учитывают запросы и во всех внешних.
+    """
+    counter = QueryCounter(_query_counter.get())
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    while counter is not None:
+        counter.statements += 1
+        counter = counter.parent
+    if context is not None:
+        context._statement_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_statement(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_statement_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    counter = _query_counter.get()
+    while counter is not None:
+        counter.seconds += elapsed
+        counter = counter.parent
+    if on_statement is not None:
+        on_statement(statement, elapsed)
 
 def init_database():
-    """Создание всех таблиц"""
-    Base.metadata.drop_all(engine)  # Удаляем все существующие таблицы
-    Base.metadata.create_all(engine)  # Создаем таблицы заново
+    """Приведение схемы к актуальной версии без потери данных"""
+    # Импорт здесь, чтобы модели успели зарегистрироваться в Base.metadata
+    from models.migrations import migrate, missing_indexes
+    from models.sharding import router
+    
+    for shard, shard_engine in enumerate(router.engines):
+        migrate(shard_engine)
+        
+        missing = missing_indexes(shard_engine)
+        if missing:
+            logger.warning("В шарде %s отсутствуют индексы: %s", shard, ", ".join(missing))
 
 def get_session():
     """Получение сессии базы данных"""
@@ -21,4 +137,23 @@ def get_session():
     try:
         yield session
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+async def _run_with(session_factory, func, args, kwargs):
+    def call():
+        with session_factory() as session:
+            return func(session, *args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, context.run, call)
+
+async def run_in_session(func, *args, **kwargs):
+    """Выполнение синхронной функции func(session, *args, **kwargs) в пуле потоков.
+
+    Сессия открывается и закрывается в рабочем потоке, поэтому цикл событий
+    aiogram не блокируется на вводе-выводе SQLite. Контекстные переменные
+    вызывающей корутины передаются в поток. Сессия открывается в основной
+    базе (нулевом шарде); данные игрока читаются через models.sharding.run_for_user.
+    """
+    return await _run_with(SessionMaker, func, args, kwargs)
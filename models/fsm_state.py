@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Text
+
+from models.database import Base
+
+class FsmState(Base):
+    __tablename__ = 'fsm_states'
+    
+    # Ключ aiogram StorageKey; тема чата без форума хранится как 0
+    user_id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, primary_key=True)
+    bot_id = Column(Integer, primary_key=True)
+    thread_id = Column(Integer, primary_key=True, default=0)
+    destiny = Column(String, primary_key=True, default="default")
+    state = Column(String, nullable=True)
+    data = Column(Text, default="{}")            # Данные состояния в JSON
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, JSON
+from sqlalchemy import Column, Integer, String, JSON, Index
 
 from models.database import Base
 
 class Incident(Base):
     __tablename__ = 'incidents'
+    __table_args__ = (
+        Index('ix_incidents_difficulty', 'difficulty'),
+    )
     
     id = Column(Integer, primary_key=True)
     name = Column(String)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Boolean
+
+from models.database import Base
+
+class JobCheckpoint(Base):
+    __tablename__ = 'job_checkpoints'
+    
+    job = Column(String, primary_key=True)      # Имя фоновой задачи, например "daily_rollover"
+    run_key = Column(String)                    # Текущий запуск (например, дата), прогресс другого запуска не учитывается
+    position = Column(Integer, default=0)       # Последний обработанный user_id
+    processed = Column(Integer, default=0)      # Обработано записей в текущем запуске
+    finished = Column(Boolean, default=False)
+    updated_at = Column(String)
@@ -0,0 +1,206 @@
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+
+from models.database import Base
+
+logger = logging.getLogger(__name__)
+
+def _create_tables(connection):
+    # Схема первой версии бота. Текущие модели сюда не подставляются: следующие
+    # миграции должны применяться к одной и той же схеме и на новой, и на
+    # старой базе. IF NOT EXISTS - для баз, созданных до появления миграций
+    statements = [
+        "CREATE TABLE IF NOT EXISTS players ("
+        "user_id INTEGER NOT NULL, "
+        "username VARCHAR, "
+        "level INTEGER, "
+        "experience INTEGER, "
+        "money INTEGER, "
+        "servers INTEGER, "
+        "server_health FLOAT, "
+        "reputation INTEGER, "
+        "successful_fixes INTEGER, "
+        "failed_fixes INTEGER, "
+        "last_incident VARCHAR, "
+        "last_activity VARCHAR, "
+        "PRIMARY KEY (user_id))",
+        "CREATE TABLE IF NOT EXISTS incidents ("
+        "id INTEGER NOT NULL, "
+        "name VARCHAR, "
+        "description VARCHAR, "
+        "difficulty INTEGER, "
+        "reward INTEGER, "
+        "possible_solutions JSON, "
+        "time_sensitive INTEGER, "
+        "PRIMARY KEY (id))",
+        "CREATE TABLE IF NOT EXISTS crises ("
+        "id INTEGER NOT NULL, "
+        "name VARCHAR, "
+        "description VARCHAR, "
+        "severity INTEGER, "
+        "server_damage INTEGER, "
+        "money_loss INTEGER, "
+        "reputation_loss INTEGER, "
+        "PRIMARY KEY (id))",
+        "CREATE TABLE IF NOT EXISTS skills ("
+        "id INTEGER NOT NULL, "
+        "user_id INTEGER, "
+        "skill_name VARCHAR, "
+        "skill_level INTEGER, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY(user_id) REFERENCES players (user_id))",
+        "CREATE TABLE IF NOT EXISTS daily_tasks ("
+        "id INTEGER NOT NULL, "
+        "user_id INTEGER, "
+        "task_type VARCHAR, "
+        "description VARCHAR, "
+        "target_amount INTEGER, "
+        "current_amount INTEGER, "
+        "reward_money INTEGER, "
+        "reward_exp INTEGER, "
+        "completed BOOLEAN, "
+        "claimed BOOLEAN, "
+        "date_created VARCHAR, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY(user_id) REFERENCES players (user_id))",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+def _create_lookup_indexes(connection):
+    # Составные индексы под фильтры сервисов и сортировку рейтинга
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_skills_user_skill ON skills (user_id, skill_name)",
+        "CREATE INDEX IF NOT EXISTS ix_daily_tasks_user_date_type ON daily_tasks (user_id, date_created, task_type)",
+        "CREATE INDEX IF NOT EXISTS ix_players_level_experience ON players (level, experience)",
+        "CREATE INDEX IF NOT EXISTS ix_incidents_difficulty ON incidents (difficulty)",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+def _create_active_incidents(connection):
+    # Незавершенные инциденты вместо словаря user_data в памяти обработчика
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS active_incidents ("
+        "user_id INTEGER NOT NULL PRIMARY KEY, "
+        "incident_id INTEGER, "
+        "start_time FLOAT, "
+        "expires_at FLOAT)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_active_incidents_expires_at ON active_incidents (expires_at)"
+    ))
+
+def _create_job_checkpoints(connection):
+    # Прогресс фоновых задач для продолжения после перезапуска
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS job_checkpoints ("
+        "job VARCHAR NOT NULL PRIMARY KEY, "
+        "run_key VARCHAR, "
+        "position INTEGER, "
+        "processed INTEGER, "
+        "finished BOOLEAN, "
+        "updated_at VARCHAR)"
+    ))
+
+def _create_fsm_states(connection):
+    # Состояния FSM, общие для процессов-обработчиков
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS fsm_states ("
+        "user_id INTEGER NOT NULL, "
+        "chat_id INTEGER NOT NULL, "
+        "bot_id INTEGER NOT NULL, "
+        "thread_id INTEGER NOT NULL, "
+        "destiny VARCHAR NOT NULL, "
+        "state VARCHAR, "
+        "data TEXT, "
+        "PRIMARY KEY (user_id, chat_id, bot_id, thread_id, destiny))"
+    ))
+
+def _unique_daily_tasks(connection):
+    # Пакетный перенос и запасной путь в get_daily_tasks могли создать игроку два
+    # набора заданий на день: оставляем по одному заданию каждого типа (полученное,
+    # если награду уже забрали) и запрещаем повторы уникальным индексом
+    connection.execute(text(
+        "DELETE FROM daily_tasks WHERE id IN ("
+        "SELECT id FROM ("
+        "SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY user_id, date_created, task_type ORDER BY claimed DESC, id"
+        ") AS copy FROM daily_tasks"
+        ") WHERE copy > 1)"
+    ))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_daily_tasks_user_date_type "
+        "ON daily_tasks (user_id, date_created, task_type)"
+    ))
+    # Уникальный индекс с теми же столбцами заменяет обычный
+    connection.execute(text("DROP INDEX IF EXISTS ix_daily_tasks_user_date_type"))
+
+# Версионированный список миграций. Новые миграции добавляются только в конец,
+# уже выпущенные не изменяются
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "Начальная схема", _create_tables),
+    (2, "Индексы для частых выборок", _create_lookup_indexes),
+    (3, "Таблица активных инцидентов", _create_active_incidents),
+    (4, "Таблица контрольных точек фоновых задач", _create_job_checkpoints),
+    (5, "Таблица состояний FSM", _create_fsm_states),
+    (6, "Уникальные ежедневные задания", _unique_daily_tasks),
+]
+
+def _ensure_version_table(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_at VARCHAR NOT NULL)"
+    ))
+
+def current_version(engine) -> int:
+    """Последняя примененная версия схемы"""
+    with engine.begin() as connection:
+        _ensure_version_table(connection)
+        version = connection.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+def migrate(engine) -> List[int]:
+    """Применение недостающих миграций, каждая в своей транзакции. Повторный запуск ничего не делает"""
+    applied = []
+    version = current_version(engine)
+    
+    for migration_version, name, upgrade in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        
+        with engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": migration_version, "name": name, "applied_at": datetime.now().isoformat()}
+            )
+        
+        logger.info("Применена миграция %s: %s", migration_version, name)
+        applied.append(migration_version)
+    
+    return applied
+
+def missing_indexes(engine) -> List[str]:
+    """Индексы, объявленные в моделях, но отсутствующие в базе"""
+    inspector = inspect(engine)
+    missing = []
+    
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            missing.extend(f"{table.name}.{index.name}" for index in table.indexes)
+            continue
+        
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(
+            f"{table.name}.{index.name}"
+            for index in table.indexes
+            if index.name not in existing
+        )
+    
+    return missing
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index
 from sqlalchemy.orm import relationship
 
 from models.database import Base
 
 class Player(Base):
     __tablename__ = 'players'
+    __table_args__ = (
+        Index('ix_players_level_experience', 'level', 'experience'),
+    )
     
     user_id = Column(Integer, primary_key=True)
     username = Column(String)
@@ -0,0 +1,113 @@
+"""Перераспределение игроков при изменении числа шардов.
+
+Запускается при остановленном боте, затем в .env указывается новое
+DATABASE_SHARDS:
+
+    python -m models.rebalance --from 1 --to 4
+
+Игроки переносятся пакетами: строки игрока копируются в новый шард
+(с предварительным удалением его строк там), коммит, затем удаляются из
+старого шарда. Прерванный перенос безопасно запускать повторно. Новые
+шарды получают схему и каталоги инцидентов и кризисов из нулевого шарда.
+"""
+import argparse
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from sqlalchemy import delete, func, insert, select, union
+
+from config import DATABASE_URL, DATABASE_SHARDS
+from models.database import Base
+from models.migrations import migrate
+from models.sharding import create_shard_engines
+
+logger = logging.getLogger(__name__)
+
+# Таблицы с данными игроков переносятся вместе с игроком, остальные (каталоги) копируются целиком
+PLAYER_TABLES = [table for table in Base.metadata.sorted_tables if "user_id" in table.c]
+CATALOG_TABLES = [Base.metadata.tables["incidents"], Base.metadata.tables["crises"]]
+
+def _copied_columns(table) -> list:
+    # Суррогатный ключ (id навыка, задания) в новом шарде назначается заново
+    if "user_id" in table.primary_key.columns:
+        return list(table.c)
+    return [column for column in table.c if not column.primary_key]
+
+def _copy_catalogs(source, target) -> None:
+    with source.connect() as source_connection, target.begin() as target_connection:
+        for table in CATALOG_TABLES:
+            if target_connection.execute(select(func.count()).select_from(table)).scalar():
+                continue
+            rows = [dict(row._mapping) for row in source_connection.execute(select(table))]
+            if rows:
+                target_connection.execute(insert(table), rows)
+
+def _misplaced_users(engine, shard: int, count: int, batch: int) -> List[int]:
+    # Игроки со строками хотя бы в одной таблице, которым место в другом шарде
+    query = union(*(
+        select(table.c.user_id).where(table.c.user_id % count != shard) for table in PLAYER_TABLES
+    )).subquery()
+    with engine.connect() as connection:
+        return list(connection.execute(
+            select(query.c.user_id).order_by(query.c.user_id).limit(batch)
+        ).scalars())
+
+def _move_users(source, target, user_ids: List[int]) -> None:
+    with source.connect() as source_connection, target.begin() as target_connection:
+        for table in PLAYER_TABLES:
+            columns = _copied_columns(table)
+            rows = [
+                dict(row._mapping) for row in source_connection.execute(
+                    select(*columns).where(table.c.user_id.in_(user_ids))
+                )
+            ]
+            target_connection.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+            if rows:
+                target_connection.execute(insert(table), rows)
+
+    with source.begin() as source_connection:
+        # Дочерние таблицы раньше игроков
+        for table in reversed(PLAYER_TABLES):
+            source_connection.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+
+def rebalance(old_count: int, new_count: int, url: str = DATABASE_URL, batch: int = 1000, engines=None) -> Dict[int, int]:
+    """Перенос игроков из old_count шардов в new_count, возвращает число перенесенных игроков по целевым шардам"""
+    engines = engines or create_shard_engines(url, max(old_count, new_count))
+    for engine in engines:
+        migrate(engine)
+    for engine in engines[1:new_count]:
+        _copy_catalogs(engines[0], engine)
+
+    moved: Dict[int, int] = defaultdict(int)
+    for shard in range(len(engines)):
+        while True:
+            user_ids = _misplaced_users(engines[shard], shard, new_count, batch)
+            if not user_ids:
+                break
+            by_target: Dict[int, List[int]] = defaultdict(list)
+            for user_id in user_ids:
+                by_target[user_id % new_count].append(user_id)
+            for target, target_user_ids in by_target.items():
+                _move_users(engines[shard], engines[target], target_user_ids)
+                moved[target] += len(target_user_ids)
+        logger.info("Шард %s: перенос завершен", shard)
+
+    if new_count < old_count:
+        logger.info("Шарды %s..%s пусты и больше не используются", new_count, old_count - 1)
+    return dict(moved)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="old_count", type=int, default=DATABASE_SHARDS)
+    parser.add_argument("--to", dest="new_count", type=int, required=True)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    moved = rebalance(args.old_count, args.new_count, batch=args.batch)
+    print(f"Перенесено игроков: {sum(moved.values())} ({', '.join(f'шард {shard}: {count}' for shard, count in sorted(moved.items()))})")
+    print(f"Укажите DATABASE_SHARDS={args.new_count} в .env перед запуском бота")
+
+if __name__ == "__main__":
+    main()
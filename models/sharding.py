@@ -0,0 +1,89 @@
+"""Шардирование данных игроков.
+
+Игрок с user_id хранится в шарде user_id % count вместе со всеми своими
+строками (навыки, задания, незавершенный инцидент). Каталоги инцидентов и
+кризисов есть в каждом шарде, контрольные точки фоновых задач у каждого
+шарда свои. Сервисы не знают о шардах: синхронные функции получают сессию
+нужного шарда через run_for_user, фоновые задачи и рейтинг обходят все
+шарды через run_on_all_shards.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, TypeVar
+
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import sessionmaker
+
+import models.database as database
+from config import DATABASE_URL, DATABASE_SHARDS
+
+T = TypeVar("T")
+
+def shard_url(url: str, shard: int) -> str:
+    """Адрес файла шарда SQLite: нулевой шард - сама база, остальные - devops_simulator.shard1.db и т.д."""
+    url = make_url(url)
+    if shard == 0:
+        return url.render_as_string(hide_password=False)
+    stem, suffix = os.path.splitext(url.database)
+    return url.set(database=f"{stem}.shard{shard}{suffix}").render_as_string(hide_password=False)
+
+def create_shard_engines(url: str = DATABASE_URL, count: int = DATABASE_SHARDS, base: Engine = None, **options) -> List[Engine]:
+    """Движки шардов SQLite: нулевой шард - сама база, остальные - файлы рядом с ней.
+
+    Сервисы пишут через INSERT ... ON CONFLICT диалекта SQLite и random() SQLite,
+    поэтому другие базы данных не поддерживаются.
+    """
+    backend = make_url(url).get_backend_name()
+    if backend != "sqlite":
+        raise ValueError(f"Данные игроков хранятся только в SQLite, а DATABASE_URL указывает на {backend}")
+    base = base or database.create_db_engine(url, **options)
+    return [base] + [database.create_db_engine(shard_url(url, shard), **options) for shard in range(1, count)]
+
+class ShardRouter:
+    """Выбор шарда по user_id и фабрики сессий шардов"""
+
+    def __init__(self, engines: List[Engine]):
+        self.configure(engines)
+
+    def configure(self, engines: List[Engine]) -> None:
+        """Замена набора шардов; нулевой шард становится основной базой models.database"""
+        self.engines = list(engines)
+        database.engine = self.engines[0]
+        database.SessionMaker.configure(bind=self.engines[0])
+        self.session_makers = [database.SessionMaker] + [
+            sessionmaker(bind=engine, expire_on_commit=False) for engine in self.engines[1:]
+        ]
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, user_id: int) -> int:
+        return user_id % len(self.engines)
+
+    def session_for(self, user_id: int):
+        """Новая сессия в шарде игрока (для кода вне пула потоков)"""
+        return self.session_makers[self.shard_for(user_id)]()
+
+router = ShardRouter(create_shard_engines(base=database.engine))
+
+def group_by_shard(items: Iterable[T], user_id: Callable[[T], int] = lambda item: item) -> Dict[int, List[T]]:
+    """Разбиение элементов (по умолчанию самих user_id) по шардам"""
+    groups: Dict[int, List[T]] = defaultdict(list)
+    for item in items:
+        groups[router.shard_for(user_id(item))].append(item)
+    return groups
+
+async def run_on_shard(shard: int, func, *args, **kwargs):
+    """Выполнение func(session, *args, **kwargs) в пуле потоков с сессией указанного шарда"""
+    return await database._run_with(router.session_makers[shard], func, args, kwargs)
+
+async def run_for_user(func, user_id: int, *args, **kwargs):
+    """Как run_in_session, но в шарде игрока: func(session, user_id, *args, **kwargs)"""
+    return await run_on_shard(router.shard_for(user_id), func, user_id, *args, **kwargs)
+
+async def run_on_all_shards(func, *args, **kwargs) -> List[Any]:
+    """Параллельное выполнение func(session, *args, **kwargs) во всех шардах, результаты по порядку шардов"""
+    return list(await asyncio.gather(*(
+        run_on_shard(shard, func, *args, **kwargs) for shard in range(len(router))
+    )))
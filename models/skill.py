@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from models.database import Base
 
 class Skill(Base):
     __tablename__ = 'skills'
+    __table_args__ = (
+        Index('ix_skills_user_skill', 'user_id', 'skill_name'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('players.user_id'))
@@ -0,0 +1,296 @@
+"""Офлайн-симулятор баланса экономики инцидентов.
+
+Карьеры игроков считаются массивами NumPy сразу по всем игрокам. За день
+игрок actions раз нажимает «Инцидент»: сначала проверяется кризис, затем
+решается инцидент своего уровня из каталога; между нажатиями проходят такты
+симуляции мира (износ серверов, содержание, фоновые кризисы). В конце дня
+игрок тратит деньги: ремонт при здоровье ниже repair_below, улучшение
+самого слабого навыка, покупка сервера.
+
+Шансы, награды, опыт и цены считаются функциями services/formulas.py, а
+каталог строится из тех же строк, что заполняет init_default_incidents,
+поэтому симулятор не расходится с обработчиками. Упрощения: задания дня не
+моделируются, такты мира между нажатиями объединяются (износ и содержание
+умножаются на число тактов, между нажатиями - не больше одного фонового
+кризиса).
+
+Боту NumPy не нужен, симулятору - нужен (pip install -r requirements-dev.txt).
+"""
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError(
+        "Для симулятора баланса нужен NumPy: pip install -r requirements-dev.txt"
+    ) from error
+
+from config import WORLD_TICK_INTERVAL
+from models import Player
+from services.catalog import Catalog, build_catalog
+from services.crisis_service import default_crises
+from services.formulas import (
+    FAILURE_HEALTH_LOSS, HEALTH_DECAY_PER_TICK, REPUTATION_LOSS, UPKEEP_PRICE,
+    background_crisis_probability, crisis_chance, crisis_prevention, crisis_weight, failure_experience,
+    failure_penalty, health_after_damage, incident_experience, incident_reward, late_penalty, next_level_experience,
+    repair_experience, repair_price, reputation_after_loss, reputation_after_success, server_price,
+    skill_upgrade_price, success_rate, time_modifier
+)
+from services.incident_service import default_incidents
+from services.player_service import BASIC_SKILLS
+
+MONITORING = BASIC_SKILLS.index('Monitoring')
+
+# Стратегии выбора решения: лучшее по шансу успеха или случайное
+STRATEGIES = ("best", "random")
+
+class BalanceReport(NamedTuple):
+    """Итог симуляции: показатели на конец каждого дня (массивы длины days)"""
+    players: int
+    days: int
+    elapsed: float
+    curves: Dict[str, np.ndarray]
+
+def default_catalog() -> Catalog:
+    """Каталог базовых инцидентов и кризисов без базы данных"""
+    incidents = default_incidents()
+    crises = default_crises()
+    for number, row in enumerate(incidents + crises, 1):
+        row.id = number
+    return build_catalog(incidents, crises)
+
+class _Tables:
+    """Каталог в виде массивов, индексируемых номером инцидента или кризиса"""
+
+    def __init__(self, catalog: Catalog):
+        incidents = list(catalog.incidents.values())
+        width = max(len(incident.possible_solutions) for incident in incidents)
+        self.difficulty = np.array([incident.difficulty for incident in incidents], dtype=np.int64)
+        self.reward = np.array([incident.reward for incident in incidents], dtype=np.int64)
+        self.limit = np.array([incident.time_sensitive for incident in incidents], dtype=np.float64)
+        self.solutions = np.array([len(incident.possible_solutions) for incident in incidents], dtype=np.int64)
+        # Недостающие решения дополняются шансом -1, чтобы не выбираться
+        self.rates = np.full((len(incidents), width), -1.0)
+        self.skills = np.zeros((len(incidents), width), dtype=np.int64)
+        for row, incident in enumerate(incidents):
+            for column, solution in enumerate(incident.possible_solutions.values()):
+                self.rates[row, column] = solution.success_rate
+                self.skills[row, column] = BASIC_SKILLS.index(solution.skill)
+
+        # Инциденты каждого уровня (уровень +/- 1 сложности); выше последнего уровня инцидентов нет
+        position = {incident.id: row for row, incident in enumerate(incidents)}
+        self.top_level = int(self.difficulty.max()) + 2
+        bands = [catalog.incidents_for_level(level) if level else () for level in range(self.top_level + 1)]
+        self.band_size = np.array([len(band) for band in bands], dtype=np.int64)
+        self.bands = np.zeros((len(bands), max(self.band_size.max(), 1)), dtype=np.int64)
+        for level, band in enumerate(bands):
+            self.bands[level, :len(band)] = [position[incident.id] for incident in band]
+
+        crises = catalog.crises
+        self.severity = np.array([crisis.severity for crisis in crises], dtype=np.int64)
+        self.damage = np.array([crisis.server_damage for crisis in crises], dtype=np.float64)
+        self.money_loss = np.array([crisis.money_loss for crisis in crises], dtype=np.int64)
+        self.reputation_loss = np.array([crisis.reputation_loss for crisis in crises], dtype=np.int64)
+        # Накопленные целые веса выбора кризиса для каждого процента здоровья, как в Catalog.crisis_sampler
+        self.crisis_weights = np.cumsum([
+            [crisis_weight(crisis.severity, bucket) for crisis in crises] for bucket in range(101)
+        ], axis=1)
+
+class _Careers:
+    """Состояние всех игроков и счетчики текущего дня"""
+
+    def __init__(self, tables: _Tables, players: int, rng: np.random.Generator):
+        self.tables = tables
+        self.rng = rng
+        self.players = players
+        defaults = Player.__table__.c
+        self.level = np.full(players, defaults.level.default.arg, dtype=np.int64)
+        self.experience = np.full(players, defaults.experience.default.arg, dtype=np.int64)
+        self.money = np.full(players, defaults.money.default.arg, dtype=np.int64)
+        self.servers = np.full(players, defaults.servers.default.arg, dtype=np.int64)
+        self.health = np.full(players, defaults.server_health.default.arg, dtype=np.float64)
+        self.reputation = np.full(players, defaults.reputation.default.arg, dtype=np.int64)
+        self.skills = np.ones((players, len(BASIC_SKILLS)), dtype=np.int64)
+        self.reset_day()
+
+    def reset_day(self) -> None:
+        self.minted = 0
+        self.burned = 0
+        self.attempts = 0
+        self.successes = 0
+        self.crises = 0
+        self.idle = 0
+
+    def _set_money(self, money: np.ndarray) -> None:
+        delta = money - self.money
+        self.minted += int(delta[delta > 0].sum())
+        self.burned -= int(delta[delta < 0].sum())
+        self.money = money
+
+    def _add_experience(self, gained: np.ndarray, amount: np.ndarray) -> None:
+        # apply_experience: не больше одного уровня за начисление
+        self.experience = self.experience + np.where(gained, amount, 0)
+        self.level = self.level + (gained & (self.experience >= next_level_experience(self.level)))
+
+    def crisis(self) -> None:
+        """Проверка кризиса при нажатии «Инцидент» (generate_random_crisis)"""
+        tables, rng = self.tables, self.rng
+        happened = rng.random(self.players) < crisis_chance(self.health)
+        weights = tables.crisis_weights[np.clip(np.round(self.health), 0, 100).astype(np.int64)]
+        roll = rng.random(self.players) * weights[:, -1]
+        crisis = (weights <= roll[:, None]).sum(axis=1)
+        prevented = rng.random(self.players) < crisis_prevention(self.reputation, self.skills[:, MONITORING])
+        hit = happened & ~prevented
+        self.crises += int(hit.sum())
+        self._set_money(np.where(hit, np.maximum(self.money - tables.money_loss[crisis], 0), self.money))
+        self.reputation = np.where(
+            hit, reputation_after_loss(self.reputation, tables.reputation_loss[crisis], maximum=np.maximum), self.reputation
+        )
+        self.health = np.where(hit, health_after_damage(self.health, tables.damage[crisis], maximum=np.maximum), self.health)
+
+    def incident(self, strategy: str, solve_time: Tuple[float, float]) -> None:
+        """Инцидент уровня игрока и его решение (generate_incident + solve_incident)"""
+        tables, rng, players = self.tables, self.rng, self.players
+        level = np.minimum(self.level, tables.top_level)
+        size = tables.band_size[level]
+        active = size > 0
+        self.idle += int((~active).sum())
+        incident = tables.bands[level, (rng.random(players) * size).astype(np.int64)]
+
+        rates = tables.rates[incident]
+        levels = np.take_along_axis(self.skills, tables.skills[incident], axis=1)
+        chances = np.where(rates >= 0, success_rate(rates, levels, np.minimum), -1.0)
+        if strategy == "best":
+            choice = chances.argmax(axis=1)
+        else:
+            choice = (rng.random(players) * tables.solutions[incident]).astype(np.int64)
+        chance = chances[np.arange(players), choice]
+
+        elapsed = rng.uniform(solve_time[0], solve_time[1], players)
+        limit = tables.limit[incident]
+        timed = limit > 0
+        late = active & timed & (elapsed > limit)
+        success = active & ~late & (rng.random(players) < chance)
+        failure = active & ~late & ~success
+        self.attempts += int(active.sum())
+        self.successes += int(success.sum())
+
+        base = tables.reward[incident]
+        difficulty = tables.difficulty[incident]
+        modifier = np.where(timed, time_modifier(elapsed, np.where(timed, limit, 1.0), np.maximum), 1.0)
+        reward = incident_reward(base, modifier, self.servers).astype(np.int64)
+        money = np.where(success, self.money + reward, self.money)
+        money = np.where(late, money - late_penalty(base), money)
+        money = np.where(failure, np.maximum(money - failure_penalty(base), 0), money)
+        self._set_money(money)
+
+        experience = np.where(success, incident_experience(difficulty, modifier).astype(np.int64), failure_experience(difficulty))
+        self._add_experience(success | failure, experience)
+
+        # PlayerUnitOfWork.record_outcome
+        lost = late | failure
+        self.reputation = np.where(success, reputation_after_success(self.reputation, minimum=np.minimum), self.reputation)
+        self.reputation = np.where(lost, reputation_after_loss(self.reputation, REPUTATION_LOSS, maximum=np.maximum), self.reputation)
+        self.health = np.where(lost, health_after_damage(self.health, FAILURE_HEALTH_LOSS, maximum=np.maximum), self.health)
+
+    def world_ticks(self, ticks: int) -> None:
+        """ticks тактов симуляции мира одним шагом (services.world_tick): не больше одного фонового кризиса"""
+        if ticks <= 0:
+            return
+        tables = self.tables
+        self.health = np.maximum(self.health - HEALTH_DECAY_PER_TICK * ticks, 0)
+        self._set_money(np.maximum(self.money - self.servers * UPKEEP_PRICE * ticks, 0))
+        # Вероятности всех кризисов одним вызовом: строки - кризисы, столбцы - игроки
+        probability = background_crisis_probability(
+            tables.severity[:, None], tables.severity.tolist(), self.health, self.reputation
+        )
+        total = probability.sum(axis=0)
+        hit = self.rng.random(self.players) < 1 - (1 - total) ** ticks
+        roll = self.rng.random(self.players) * total
+        crisis = np.minimum((probability.cumsum(axis=0) <= roll).sum(axis=0), len(tables.severity) - 1)
+        self.crises += int(hit.sum())
+        self._set_money(np.where(hit, np.maximum(self.money - tables.money_loss[crisis], 0), self.money))
+        self.reputation = np.where(
+            hit, reputation_after_loss(self.reputation, tables.reputation_loss[crisis], maximum=np.maximum), self.reputation
+        )
+        self.health = np.where(hit, health_after_damage(self.health, tables.damage[crisis], maximum=np.maximum), self.health)
+
+    def spend(self, repair_below: float) -> None:
+        """Траты в конце дня: ремонт, улучшение самого слабого навыка, сервер"""
+        players = np.arange(self.players)
+
+        # repair_server: ремонт до 100%, опыт за ремонт
+        percent = 100 - self.health
+        cost = repair_price(percent, self.servers).astype(np.int64)
+        repair = (self.health < repair_below) & (self.money >= cost)
+        self._set_money(self.money - np.where(repair, cost, 0))
+        self.health = np.where(repair, 100.0, self.health)
+        experience = repair_experience(percent).astype(np.int64)
+        self._add_experience(repair & (experience > 0), experience)
+
+        # upgrade_skill
+        weakest = self.skills.argmin(axis=1)
+        current = self.skills[players, weakest]
+        cost = skill_upgrade_price(current)
+        upgrade = self.money >= cost
+        self._set_money(self.money - np.where(upgrade, cost, 0))
+        self.skills[players, weakest] = current + upgrade
+
+        # buy_server
+        cost = server_price(self.servers)
+        buy = self.money >= cost
+        self._set_money(self.money - np.where(buy, cost, 0))
+        self.servers = self.servers + buy
+
+def simulate(
+    players: int,
+    days: int,
+    actions: int = 10,
+    strategy: str = "best",
+    solve_time: Tuple[float, float] = (5, 40),
+    repair_below: float = 50,
+    ticks_per_day: int = 86400 // WORLD_TICK_INTERVAL if WORLD_TICK_INTERVAL > 0 else 0,
+    catalog: Optional[Catalog] = None,
+    seed: Optional[int] = None
+) -> BalanceReport:
+    """Симуляция days дней карьеры players игроков.
+
+    actions - нажатий «Инцидент» в день, solve_time - границы равномерно
+    распределенного времени решения в секундах, ticks_per_day - тактов
+    симуляции мира в день (по умолчанию из WORLD_TICK_INTERVAL, 0 - такт выключен).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия {strategy!r}, доступны: {', '.join(STRATEGIES)}")
+    started = time.perf_counter()
+    careers = _Careers(_Tables(catalog or default_catalog()), players, np.random.default_rng(seed))
+
+    # Такты мира распределяются поровну между нажатиями, остаток - после последнего
+    ticks, rest = divmod(ticks_per_day, actions) if actions else (0, ticks_per_day)
+    names = (
+        "level_p10", "level_p50", "level_p90", "money_p50", "money_mean", "money_supply", "minted", "burned",
+        "servers_mean", "skill_mean", "success_rate", "crises_per_player", "idle_share"
+    )
+    curves = {name: np.zeros(days) for name in names}
+    for day in range(days):
+        careers.reset_day()
+        for _ in range(actions):
+            careers.crisis()
+            careers.incident(strategy, solve_time)
+            careers.world_ticks(ticks)
+        careers.world_ticks(rest)
+        careers.spend(repair_below)
+
+        curves["level_p10"][day], curves["level_p50"][day], curves["level_p90"][day] = np.percentile(careers.level, (10, 50, 90))
+        curves["money_p50"][day] = np.median(careers.money)
+        curves["money_mean"][day] = careers.money.mean()
+        curves["money_supply"][day] = careers.money.sum()
+        curves["minted"][day] = careers.minted
+        curves["burned"][day] = careers.burned
+        curves["servers_mean"][day] = careers.servers.mean()
+        curves["skill_mean"][day] = careers.skills.mean()
+        curves["success_rate"][day] = careers.successes / careers.attempts if careers.attempts else 0
+        curves["crises_per_player"][day] = careers.crises / players
+        curves["idle_share"][day] = careers.idle / (players * actions) if actions else 0
+
+    return BalanceReport(players, days, time.perf_counter() - started, curves)
@@ -0,0 +1,147 @@
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+from models import Crisis, Incident, run_in_session
+from services.formulas import crisis_weight
+from utils.keyboards import build_solutions_keyboard
+from utils.sampling import WeightedSampler
+
+class _Frozen:
+    """Базовый класс неизменяемых записей каталога"""
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} неизменяем")
+
+    def __repr__(self):
+        key = self.__slots__[0]
+        return f"{type(self).__name__}({key}={getattr(self, key)!r}, name={self.name!r})"
+
+class SolutionDef(_Frozen):
+    """Вариант решения инцидента"""
+    __slots__ = ("key", "name", "success_rate", "skill")
+
+class IncidentDef(_Frozen):
+    """Инцидент из каталога"""
+    __slots__ = (
+        "id", "name", "description", "difficulty", "reward", "possible_solutions", "time_sensitive",
+        "solutions_keyboard"
+    )
+
+class CrisisDef(_Frozen):
+    """Кризис из каталога"""
+    __slots__ = ("id", "name", "description", "severity", "server_damage", "money_loss", "reputation_loss")
+
+def _incident_def(incident: Incident) -> IncidentDef:
+    solutions = {
+        key: SolutionDef(key=key, name=solution['name'], success_rate=solution['success_rate'], skill=solution['skill'])
+        for key, solution in (incident.possible_solutions or {}).items()
+    }
+    return IncidentDef(
+        id=incident.id,
+        name=incident.name,
+        description=incident.description,
+        difficulty=incident.difficulty,
+        reward=incident.reward,
+        possible_solutions=MappingProxyType(solutions),
+        time_sensitive=incident.time_sensitive or 0,
+        # Клавиатура решений строится один раз и отдается всем игрокам
+        solutions_keyboard=build_solutions_keyboard(solutions)
+    )
+
+def _crisis_def(crisis: Crisis) -> CrisisDef:
+    return CrisisDef(
+        id=crisis.id,
+        name=crisis.name,
+        description=crisis.description,
+        severity=crisis.severity,
+        server_damage=crisis.server_damage,
+        money_loss=crisis.money_loss,
+        reputation_loss=crisis.reputation_loss
+    )
+
+class Catalog:
+    """Неизменяемый снимок каталогов инцидентов и кризисов.
+
+    Для каждого уровня игрока заранее собран список инцидентов сложности
+    уровень +/- 1, поэтому выбор инцидента не требует запросов к базе.
+    Таблицы для взвешенного выбора кризисов строятся по одной на каждый
+    процент здоровья серверов при первом обращении.
+    """
+
+    def __init__(self, incidents: Iterable[IncidentDef], crises: Iterable[CrisisDef]):
+        self.incidents: Mapping[int, IncidentDef] = MappingProxyType({incident.id: incident for incident in incidents})
+        self.crises: Tuple[CrisisDef, ...] = tuple(crises)
+
+        max_difficulty = max((incident.difficulty for incident in self.incidents.values()), default=0)
+        bands: Dict[int, Tuple[IncidentDef, ...]] = {}
+        for level in range(1, max_difficulty + 2):
+            min_difficulty = max(1, level - 1)
+            bands[level] = tuple(
+                incident for incident in self.incidents.values()
+                if min_difficulty <= incident.difficulty <= level + 1
+            )
+        self._bands = bands
+        self._incident_samplers: Dict[int, WeightedSampler[IncidentDef]] = {
+            level: WeightedSampler(band) for level, band in bands.items() if band
+        }
+        self._crisis_samplers: Dict[int, WeightedSampler[CrisisDef]] = {}
+
+    def incident(self, incident_id: int) -> Optional[IncidentDef]:
+        """Инцидент по идентификатору"""
+        return self.incidents.get(incident_id)
+
+    def incidents_for_level(self, level: int) -> Tuple[IncidentDef, ...]:
+        """Инциденты, подходящие игроку указанного уровня"""
+        return self._bands.get(max(1, level), ())
+
+    def incident_sampler(self, level: int) -> Optional[WeightedSampler[IncidentDef]]:
+        """Равновероятный выбор инцидента для игрока указанного уровня"""
+        return self._incident_samplers.get(max(1, level))
+
+    def crisis_sampler(self, server_health: float) -> Optional[WeightedSampler[CrisisDef]]:
+        """Взвешенный выбор кризиса для здоровья серверов, округленного до процента"""
+        if not self.crises:
+            return None
+        
+        bucket = min(100, max(0, round(server_health)))
+        sampler = self._crisis_samplers.get(bucket)
+        if sampler is None:
+            weights = [crisis_weight(crisis.severity, bucket) for crisis in self.crises]
+            sampler = self._crisis_samplers[bucket] = WeightedSampler(self.crises, weights)
+        return sampler
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+# Передача перезагрузки каталога другим процессам (см. utils.workers)
+on_reload: Optional[Callable[[], None]] = None
+
+def build_catalog(incidents: Iterable[Incident], crises: Iterable[Crisis]) -> Catalog:
+    """Каталог из строк моделей (загруженных из базы или созданных в памяти)"""
+    return Catalog([_incident_def(incident) for incident in incidents], [_crisis_def(crisis) for crisis in crises])
+
+def _load_catalog(session) -> Catalog:
+    global _catalog
+    catalog = build_catalog(session.query(Incident).all(), session.query(Crisis).all())
+    _catalog = catalog
+    return catalog
+
+def get_catalog(session) -> Catalog:
+    """Текущий каталог; при первом обращении загружается через переданную сессию"""
+    catalog = _catalog
+    if catalog is None:
+        with _catalog_lock:
+            catalog = _catalog or _load_catalog(session)
+    return catalog
+
+async def reload_catalog(publish: bool = True) -> Catalog:
+    """Перечитать каталоги из базы (после изменения инцидентов или кризисов)"""
+    catalog = await run_in_session(_load_catalog)
+    if publish and on_reload is not None:
+        on_reload()
+    return catalog
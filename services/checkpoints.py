@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models import JobCheckpoint
+
+class Checkpoint(NamedTuple):
+    """Прогресс фоновой задачи в текущем запуске"""
+    position: int
+    processed: int
+    finished: bool
+
+def load_checkpoint(session, job: str, run_key: str) -> Checkpoint:
+    """Прогресс задачи; прогресс другого запуска (например, вчерашнего) не учитывается"""
+    row = session.get(JobCheckpoint, job)
+    if row is None or row.run_key != run_key:
+        return Checkpoint(0, 0, False)
+    return Checkpoint(row.position or 0, row.processed or 0, bool(row.finished))
+
+def save_checkpoint(session, job: str, run_key: str, position: int, processed: int, finished: bool = False) -> None:
+    """Запись прогресса в текущей транзакции, коммит выполняет вызывающий код вместе с данными пакета"""
+    values = dict(
+        run_key=run_key,
+        position=position,
+        processed=processed,
+        finished=finished,
+        updated_at=datetime.now().isoformat()
+    )
+    session.execute(
+        insert(JobCheckpoint).values(job=job, **values).on_conflict_do_update(
+            index_elements=[JobCheckpoint.job], set_=values
+        )
+    )
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as day_start
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from config import DAILY_ROLLOVER_BATCH, DAILY_ACTIVE_DAYS, DAILY_ROLLOVER_LEAD
+from models import DailyTask, Player, router, run_on_shard
+from services.checkpoints import load_checkpoint, save_checkpoint
+from services.daily_service import build_daily_tasks
+
+logger = logging.getLogger(__name__)
+
+JOB = "daily_rollover"
+
+class RolloverResult(NamedTuple):
+    """Итог переноса ежедневных заданий"""
+    day: str
+    players: int
+    tasks: int
+    batches: int
+    elapsed: float
+
+def _rollover_batch(session, day: str, batch_size: int, active_since: Optional[str], rng) -> Optional[tuple]:
+    checkpoint = load_checkpoint(session, JOB, day)
+    if checkpoint.finished:
+        return None
+    
+    query = session.query(Player.user_id, Player.level).filter(Player.user_id > checkpoint.position)
+    if active_since:
+        query = query.filter(Player.last_activity >= active_since)
+    players = query.order_by(Player.user_id).limit(batch_size).all()
+    
+    if not players:
+        save_checkpoint(session, JOB, day, checkpoint.position, checkpoint.processed, finished=True)
+        session.commit()
+        return None
+    
+    first, last = players[0].user_id, players[-1].user_id
+    previous_day = (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+    
+    # Задания старше вчерашних больше не показываются
+    session.execute(delete(DailyTask).where(
+        DailyTask.user_id.between(first, last),
+        DailyTask.date_created < previous_day
+    ))
+    
+    # Игроки, уже получившие задания на этот день (например, через запасной путь в get_daily_tasks)
+    ready = {
+        user_id for user_id, in session.query(DailyTask.user_id).filter(
+            DailyTask.user_id.between(first, last),
+            DailyTask.date_created == day
+        ).distinct()
+    }
+    
+    rows = [
+        task
+        for user_id, level in players if user_id not in ready
+        for task in build_daily_tasks(user_id, level, day, rng)
+    ]
+    if rows:
+        # Список словарей выполняется одним executemany; задания, вставленные
+        # запасным путем после проверки выше, пропускает уникальный индекс
+        session.execute(insert(DailyTask).on_conflict_do_nothing(), rows)
+    
+    # Контрольная точка коммитится вместе с заданиями пакета
+    save_checkpoint(session, JOB, day, last, checkpoint.processed + len(players))
+    session.commit()
+    return len(players), len(rows)
+
+async def run_daily_rollover(
+    day: Optional[str] = None,
+    batch_size: int = DAILY_ROLLOVER_BATCH,
+    active_days: int = DAILY_ACTIVE_DAYS,
+    rng: random.Random = random
+) -> RolloverResult:
+    """Создание заданий на день для всех активных игроков пакетами.
+
+    Каждый пакет - отдельная транзакция с контрольной точкой, поэтому
+    прерванный перенос продолжается с места остановки, а повторный запуск
+    для того же дня ничего не делает. active_days=0 - все игроки.
+    """
+    day = day or datetime.now().date().isoformat()
+    active_since = None
+    if active_days:
+        active_since = (date.fromisoformat(day) - timedelta(days=active_days)).isoformat()
+    
+    async def rollover_shard(shard: int) -> Tuple[int, int, int]:
+        players = tasks = batches = 0
+        while True:
+            batch = await run_on_shard(shard, _rollover_batch, day, batch_size, active_since, rng)
+            if batch is None:
+                return players, tasks, batches
+            players += batch[0]
+            tasks += batch[1]
+            batches += 1
+    
+    # Шарды переносятся параллельно, у каждого своя контрольная точка
+    started = time.perf_counter()
+    totals = await asyncio.gather(*(rollover_shard(shard) for shard in range(len(router))))
+    players, tasks, batches = (sum(column) for column in zip(*totals))
+    
+    result = RolloverResult(day, players, tasks, batches, time.perf_counter() - started)
+    if batches:
+        logger.info(
+            "Задания на %s: %s игроков, %s заданий, %s пакетов за %.1fс",
+            day, players, tasks, batches, result.elapsed
+        )
+    return result
+
+async def daily_rollover_loop(lead: float = DAILY_ROLLOVER_LEAD):
+    """Фоновый перенос: сначала догоняем текущий день, затем создаем задания заранее до полуночи"""
+    day = datetime.now().date()
+    while True:
+        try:
+            await run_daily_rollover(day.isoformat())
+        except Exception:
+            logger.exception("Ошибка переноса ежедневных заданий на %s", day)
+        
+        day += timedelta(days=1)
+        start_at = datetime.combine(day, day_start.min) - timedelta(seconds=lead)
+        await asyncio.sleep(max(0.0, (start_at - datetime.now()).total_seconds()))
@@ -1,157 +1,197 @@
 import random
 from datetime import datetime, timedelta
 from typing import List
-from models import DailyTask, Player, SessionMaker
-from services.player_service import update_experience
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+
+from models import DailyTask, Player, run_for_user
+from services.economy import credit
+from services.leaderboard import leaderboard
+from services.player_service import experience_values
+from services.progress_queue import progress_queue
+from services.render_cache import bump_version
+
+# Варианты заданий
+TASK_TYPES = (
+    {
+        "type": "solve_incidents",
+        "description": "Решить инциденты",
+        "min_target": 1,
+        "max_target": 3,
+        "level_bonus": True,    # К максимуму добавляется множитель сложности
+        "money_per_unit": 100,
+        "exp_per_unit": 20
+    },
+    {
+        "type": "upgrade_skill",
+        "description": "Улучшить навыки",
+        "min_target": 1,
+        "max_target": 2,
+        "money_per_unit": 200,
+        "exp_per_unit": 30
+    },
+    {
+        "type": "repair_servers", 
+        "description": "Восстановить здоровье серверов",
+        "min_target": 10,
+        "max_target": 30,
+        "money_per_unit": 10,
+        "exp_per_unit": 2
+    }
+)
+
+def build_daily_tasks(user_id: int, level: int, day: str, rng: random.Random = random) -> List[dict]:
+    """Значения строк DailyTask на указанный день для игрока указанного уровня (без обращения к базе)"""
+    # Множитель сложности зависит от уровня игрока
+    difficulty_multiplier = max(1, level / 2)
+    
+    # Выбираем 2-3 задания случайно
+    num_tasks = rng.randint(2, 3)
+    selected_tasks = rng.sample(TASK_TYPES, min(num_tasks, len(TASK_TYPES)))
+    
+    tasks = []
+    for task_info in selected_tasks:
+        max_target = task_info["max_target"]
+        if task_info.get("level_bonus"):
+            max_target += int(difficulty_multiplier)
+        
+        target_amount = rng.randint(task_info["min_target"], max_target)
+        tasks.append({
+            "user_id": user_id,
+            "task_type": task_info["type"],
+            "description": f"{task_info['description']} ({target_amount})",
+            "target_amount": target_amount,
+            "current_amount": 0,
+            "reward_money": target_amount * task_info["money_per_unit"] * int(difficulty_multiplier),
+            "reward_exp": target_amount * task_info["exp_per_unit"] * int(difficulty_multiplier),
+            "completed": False,
+            "claimed": False,
+            "date_created": day
+        })
+    return tasks
+
+def _generate_daily_tasks(session, user_id: int) -> List[DailyTask]:
+    # Запасной путь для игроков, которых не охватил пакетный перенос заданий
+    level = session.query(Player.level).filter(Player.user_id == user_id).scalar()
+    
+    if level is None:
+        return []
+    
+    today = datetime.now().date().isoformat()
+    
+    # Удаляем старые задания; задания на следующие дни, созданные заранее, сохраняются.
+    # DELETE открывает транзакцию записи, поэтому пакетный перенос не может вставить
+    # задания между проверкой ниже и нашей вставкой
+    session.query(DailyTask).filter(
+        DailyTask.user_id == user_id,
+        DailyTask.date_created < today
+    ).delete(synchronize_session=False)
+    
+    today_tasks = session.query(DailyTask).filter(
+        DailyTask.user_id == user_id,
+        DailyTask.date_created == today
+    )
+    tasks = today_tasks.all()
+    if not tasks:
+        session.execute(insert(DailyTask).on_conflict_do_nothing(), build_daily_tasks(user_id, level, today))
+        tasks = today_tasks.all()
+    session.commit()
+    return tasks
 
 async def generate_daily_tasks(user_id: int) -> List[DailyTask]:
     """Генерирует ежедневные задания для игрока"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return []
-        
-        # Удаляем старые задания, если они есть
-        session.query(DailyTask).filter(DailyTask.user_id == user_id).delete()
-        
-        # Генерируем новые задания
-        today = datetime.now().date().isoformat()
-        
-        # Множитель сложности зависит от уровня игрока
-        difficulty_multiplier = max(1, player.level / 2)
-        
-        # Варианты заданий
-        task_types = [
-            {
-                "type": "solve_incidents",
-                "description": "Решить инциденты",
-                "min_target": 1,
-                "max_target": 3 + int(difficulty_multiplier),
-                "money_per_unit": 100,
-                "exp_per_unit": 20
-            },
-            {
-                "type": "upgrade_skill",
-                "description": "Улучшить навыки",
-                "min_target": 1,
-                "max_target": 2,
-                "money_per_unit": 200,
-                "exp_per_unit": 30
-            },
-            {
-                "type": "repair_servers", 
-                "description": "Восстановить здоровье серверов",
-                "min_target": 10,
-                "max_target": 30,
-                "money_per_unit": 10,
-                "exp_per_unit": 2
-            }
-        ]
-        
-        # Выбираем 2-3 задания случайно
-        num_tasks = random.randint(2, 3)
-        selected_tasks = random.sample(task_types, min(num_tasks, len(task_types)))
-        
-        tasks = []
-        for task_info in selected_tasks:
-            target_amount = random.randint(task_info["min_target"], task_info["max_target"])
-            reward_money = target_amount * task_info["money_per_unit"] * int(difficulty_multiplier)
-            reward_exp = target_amount * task_info["exp_per_unit"] * int(difficulty_multiplier)
-            
-            task = DailyTask(
-                user_id=user_id,
-                task_type=task_info["type"],
-                description=f"{task_info['description']} ({target_amount})",
-                target_amount=target_amount,
-                reward_money=reward_money,
-                reward_exp=reward_exp,
-                date_created=today
-            )
-            
-            session.add(task)
-            tasks.append(task)
-        
-        session.commit()
-        return tasks
+    return await run_for_user(_generate_daily_tasks, user_id)
+
+def _update_task_progress(session, user_id: int, task_type: str, progress: int = 1) -> bool:
+    today = datetime.now().date().isoformat()
+    tasks = session.query(DailyTask).filter(
+        DailyTask.user_id == user_id,
+        DailyTask.date_created == today,
+        DailyTask.task_type == task_type,
+        DailyTask.completed == False
+    ).all()
+    
+    if not tasks:
+        return False
+    
+    for task in tasks:
+        task.current_amount += progress
+        if task.current_amount >= task.target_amount:
+            task.completed = True
+    
+    session.commit()
+    return True
 
 async def update_task_progress(user_id: int, task_type: str, progress: int = 1) -> bool:
     """Обновляет прогресс выполнения задания"""
-    with SessionMaker() as session:
-        tasks = session.query(DailyTask).filter(
+    return await run_for_user(_update_task_progress, user_id, task_type, progress)
+
+def _claim_task_reward(session, user_id: int, task_id: int) -> tuple:
+    # Отмечаем награду полученной условным UPDATE, чтобы повторное нажатие не выдало ее дважды
+    task = session.execute(
+        update(DailyTask).where(
+            DailyTask.id == task_id,
             DailyTask.user_id == user_id,
-            DailyTask.task_type == task_type,
-            DailyTask.completed == False
-        ).all()
-        
-        if not tasks:
-            return False
-        
-        for task in tasks:
-            task.current_amount += progress
-            if task.current_amount >= task.target_amount:
-                task.completed = True
-        
-        session.commit()
-        return True
+            DailyTask.completed == True,
+            DailyTask.claimed == False
+        ).values(
+            claimed=True
+        ).returning(DailyTask.reward_money, DailyTask.reward_exp),
+        execution_options={"synchronize_session": False}
+    ).first()
+    
+    if not task:
+        return False, 0, 0
+    
+    # Начисляем награду и опыт
+    player = credit(
+        session, user_id, task.reward_money,
+        returning=(Player.level, Player.experience),
+        **experience_values(task.reward_exp)
+    )
+    if not player:
+        session.rollback()
+        return False, 0, 0
+    
+    session.commit()
+    leaderboard.update(user_id, player.level, player.experience)
+    bump_version(user_id)
+    return True, task.reward_money, task.reward_exp
 
 async def claim_task_reward(user_id: int, task_id: int) -> tuple:
     """Получить награду за выполненное задание"""
-    with SessionMaker() as session:
-        task = session.query(DailyTask).filter(
-            DailyTask.id == task_id,
-            DailyTask.user_id == user_id,
-            DailyTask.completed == True
-        ).first()
-        
-        if not task or task.claimed:
-            return False, 0, 0
-        
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return False, 0, 0
-        
-        # Начисляем награду
-        player.money += task.reward_money
-        task.claimed = True
-        session.commit()
-        
-        # Начисляем опыт
-        level, exp, level_up = await update_experience(user_id, task.reward_exp)
-        
-        return True, task.reward_money, task.reward_exp
+    await progress_queue.flush_user(user_id)
+    return await run_for_user(_claim_task_reward, user_id, task_id)
+
+def _get_daily_tasks(session, user_id: int) -> List[dict]:
+    # Проверяем, есть ли задания на сегодня
+    today = datetime.now().date().isoformat()
+    tasks = session.query(DailyTask).filter(
+        DailyTask.user_id == user_id,
+        DailyTask.date_created == today
+    ).all()
+    
+    # Обычно задания уже созданы пакетным переносом; новым игрокам создаем здесь
+    if not tasks:
+        tasks = _generate_daily_tasks(session, user_id)
+    
+    # Копируем данные до закрытия сессии
+    return [
+        {
+            'id': task.id,
+            'description': task.description,
+            'current_amount': task.current_amount,
+            'target_amount': task.target_amount,
+            'reward_money': task.reward_money,
+            'reward_exp': task.reward_exp,
+            'completed': task.completed,
+            'claimed': getattr(task, 'claimed', False)
+        }
+        for task in tasks
+    ]
 
 async def get_daily_tasks(user_id: int) -> List[dict]:
     """Получение ежедневных заданий для игрока"""
-    with SessionMaker() as session:
-        # Проверяем, есть ли задания на сегодня
-        today = datetime.now().date().isoformat()
-        tasks = session.query(DailyTask).filter(
-            DailyTask.user_id == user_id,
-            DailyTask.date_created == today
-        ).all()
-        
-        # Если нет заданий на сегодня, создаем новые
-        if not tasks:
-            tasks = await generate_daily_tasks(user_id)
-            # Получаем новые задания из базы
-            tasks = session.query(DailyTask).filter(
-                DailyTask.user_id == user_id,
-                DailyTask.date_created == today
-            ).all()
-        
-        # Копируем данные до закрытия сессии
-        return [
-            {
-                'id': task.id,
-                'description': task.description,
-                'current_amount': task.current_amount,
-                'target_amount': task.target_amount,
-                'reward_money': task.reward_money,
-                'reward_exp': task.reward_exp,
-                'completed': task.completed,
-                'claimed': getattr(task, 'claimed', False)
-            }
-            for task in tasks
-        ] 
\ No newline at end of file
+    # Сначала записываем прогресс, накопленный в очереди
+    await progress_queue.flush_user(user_id)
+    return await run_for_user(_get_daily_tasks, user_id)
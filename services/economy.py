@@ -0,0 +1,55 @@
+from typing import Optional
+
+from sqlalchemy import case, update
+from sqlalchemy.engine import Row
+
+from models import Player
+
+def add_money(amount):
+    """SQL-выражение для начисления денег (вычисляется на стороне базы)"""
+    return Player.money + amount
+
+def subtract_money(amount, floor: int = 0):
+    """SQL-выражение для списания денег без ухода ниже floor"""
+    return case(
+        (Player.money - amount > floor, Player.money - amount),
+        else_=floor
+    )
+
+def debit(session, user_id: int, cost, *conditions, returning=(), **values) -> Optional[Row]:
+    """Условное списание: UPDATE ... SET money = money - cost WHERE money >= cost.
+
+    cost может быть числом или SQL-выражением (например, Player.servers * SERVER_PRICE).
+    Дополнительные условия и значения применяются тем же запросом. Возвращает строку
+    RETURNING (новый баланс и колонки returning) или None, если денег недостаточно,
+    игрок не найден или не выполнено одно из условий.
+    """
+    statement = update(Player).where(
+        Player.user_id == user_id,
+        Player.money >= cost,
+        *conditions
+    ).values(
+        money=Player.money - cost,
+        **values
+    ).returning(Player.money, *returning)
+
+    return session.execute(
+        statement, execution_options={"synchronize_session": False}
+    ).first()
+
+def credit(session, user_id: int, amount, returning=(), **values) -> Optional[Row]:
+    """Начисление денег (и других значений) одним UPDATE без предварительного SELECT.
+
+    Возвращает строку RETURNING (новый баланс и колонки returning) или None,
+    если игрок не найден.
+    """
+    statement = update(Player).where(
+        Player.user_id == user_id
+    ).values(
+        money=add_money(amount),
+        **values
+    ).returning(Player.money, *returning)
+
+    return session.execute(
+        statement, execution_options={"synchronize_session": False}
+    ).first()
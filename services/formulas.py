@@ -0,0 +1,145 @@
+"""Игровые формулы.
+
+Формулы из одних арифметических операций работают одинаково с числами,
+SQL-выражениями SQLAlchemy (например, crisis_chance(Player.server_health))
+и массивами NumPy, поэтому пакетная симуляция мира и симулятор баланса
+(services/balance.py) считают то же, что и обработчики. Ограничения сверху
+и снизу принимают функцию сравнения: min/max для чисел,
+numpy.minimum/numpy.maximum для массивов. Округление до целых выполняет
+вызывающий код.
+"""
+
+# Максимальный шанс кризиса при нулевом здоровье серверов
+MAX_CRISIS_CHANCE = 0.3
+
+# Доля шанса кризиса, который срабатывает сам за один такт симуляции мира
+BACKGROUND_CRISIS_SHARE = 0.05
+
+# Потеря здоровья серверов за один такт симуляции мира (в процентах)
+HEALTH_DECAY_PER_TICK = 0.5
+
+# Шанс предотвратить кризис за каждый уровень навыка Monitoring
+MONITORING_PREVENTION_PER_LEVEL = 0.05
+
+# Каждый уровень навыка сверх первого дает +5% к успеху, но не выше 95%
+SKILL_BONUS_PER_LEVEL = 0.05
+MAX_SUCCESS_RATE = 0.95
+
+# Каждый сервер сверх первого дает +10% к награде
+SERVER_BONUS_PER_SERVER = 0.1
+
+# Множитель награды за скорость: 1.5 при мгновенном решении, не ниже 0.5
+MAX_TIME_MODIFIER = 1.5
+MIN_TIME_MODIFIER = 0.5
+
+# Последствия решения для репутации и серверов
+REPUTATION_GAIN = 2
+REPUTATION_LOSS = 5
+MAX_REPUTATION = 100
+FAILURE_HEALTH_LOSS = 5.0
+
+# Цены в игровой экономике
+SERVER_PRICE = 1000           # Стоимость сервера умножается на количество серверов
+SKILL_UPGRADE_PRICE = 200     # Стоимость улучшения умножается на текущий уровень навыка
+REPAIR_PRICE = 5              # Стоимость 1% здоровья на один сервер
+UPKEEP_PRICE = 2              # Содержание одного сервера за такт симуляции мира
+
+def crisis_chance(server_health):
+    """Шанс кризиса при обращении игрока: чем ниже здоровье, тем выше шанс"""
+    return (100 - server_health) / 100 * MAX_CRISIS_CHANCE
+
+def reputation_prevention(reputation):
+    """Шанс предотвратить кризис за счет репутации (до 50%)"""
+    return reputation / 200
+
+def crisis_prevention(reputation, monitoring_level):
+    """Шанс предотвратить кризис при обращении игрока: репутация и навык Monitoring"""
+    return reputation_prevention(reputation) + monitoring_level * MONITORING_PREVENTION_PER_LEVEL
+
+def crisis_raw_weight(severity, server_health):
+    """Относительный вес кризиса: более серьезные кризисы вероятнее при низком здоровье серверов"""
+    health_factor = (100 - server_health) / 100
+    return 1 + (severity / 5) * health_factor * 2
+
+def crisis_weight(severity: int, server_health: float) -> int:
+    """Целый вес кризиса для таблиц выбора"""
+    # Целые веса сохраняют распределение прежнего списка [crisis] * int(weight * 10)
+    return int(crisis_raw_weight(severity, server_health) * 10)
+
+def background_crisis_probability(severity, severities, server_health, reputation):
+    """Шанс кризиса severity за такт симуляции мира.
+
+    Та же вероятность, что у кризиса при обращении игрока, умноженная на долю
+    фонового срабатывания: шанс кризиса * вес этого кризиса / сумма весов
+    кризисов severities * (1 - предотвращение репутацией).
+    """
+    total_weight = sum(crisis_raw_weight(other, server_health) for other in severities)
+    return (
+        BACKGROUND_CRISIS_SHARE * crisis_chance(server_health)
+        * crisis_raw_weight(severity, server_health) / total_weight
+        * (1 - reputation_prevention(reputation))
+    )
+
+def success_rate(base_rate, skill_level, minimum=min):
+    """Шанс успешного решения с учетом уровня навыка"""
+    return minimum(MAX_SUCCESS_RATE, base_rate + (skill_level - 1) * SKILL_BONUS_PER_LEVEL)
+
+def server_bonus(servers):
+    """Множитель награды от количества серверов"""
+    return 1 + (servers - 1) * SERVER_BONUS_PER_SERVER
+
+def time_modifier(solution_time, time_limit, maximum=max):
+    """Множитель награды и опыта за скорость решения инцидента с ограничением времени"""
+    return maximum(MIN_TIME_MODIFIER, MAX_TIME_MODIFIER - solution_time / time_limit)
+
+def incident_reward(base_reward, modifier, servers):
+    """Награда за успешное решение"""
+    return base_reward * modifier * server_bonus(servers)
+
+def incident_experience(difficulty, modifier):
+    """Опыт за успешное решение"""
+    return difficulty * 20 * modifier
+
+def late_penalty(base_reward):
+    """Штраф за решение после истечения времени"""
+    return base_reward // 2
+
+def failure_penalty(base_reward):
+    """Штраф за неудачное решение"""
+    return base_reward // 4
+
+def failure_experience(difficulty):
+    """Опыт за неудачное решение: «на ошибках учатся»"""
+    return difficulty * 5
+
+def reputation_after_success(reputation, minimum=min):
+    """Репутация после успешного решения (не выше MAX_REPUTATION)"""
+    return minimum(reputation + REPUTATION_GAIN, MAX_REPUTATION)
+
+def reputation_after_loss(reputation, loss, maximum=max):
+    """Репутация после неудачи или кризиса (не ниже нуля)"""
+    return maximum(reputation - loss, 0)
+
+def health_after_damage(server_health, damage, maximum=max):
+    """Здоровье серверов после неудачи или кризиса (не ниже нуля)"""
+    return maximum(server_health - damage, 0)
+
+def next_level_experience(level):
+    """Опыт, при котором игрок переходит на следующий уровень"""
+    return 100 * level
+
+def server_price(servers):
+    """Цена следующего сервера"""
+    return servers * SERVER_PRICE
+
+def skill_upgrade_price(skill_level):
+    """Цена улучшения навыка с текущего уровня"""
+    return skill_level * SKILL_UPGRADE_PRICE
+
+def repair_price(repair_percent, servers):
+    """Цена ремонта всех серверов на repair_percent процентов здоровья"""
+    return repair_percent * servers * REPAIR_PRICE
+
+def repair_experience(repair_percent):
+    """Опыт за ремонт серверов"""
+    return repair_percent / 2
@@ -0,0 +1,110 @@
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from config import FSM_STORAGE
+from models import FsmState, run_for_user
+
+# Состояние и данные одного ключа
+Record = Tuple[Optional[str], Dict[str, Any]]
+
+def _key_filter(key: StorageKey) -> tuple:
+    return (
+        FsmState.user_id == key.user_id,
+        FsmState.chat_id == key.chat_id,
+        FsmState.bot_id == key.bot_id,
+        FsmState.thread_id == (key.thread_id or 0),
+        FsmState.destiny == key.destiny,
+    )
+
+class SqliteStorage(BaseStorage):
+    """Состояния FSM в таблице fsm_states с кэшем записей в памяти процесса.
+
+    aiogram читает состояние при каждом обновлении, поэтому чтения идут из
+    кэша, а запись - в кэш и в базу. Кэш согласован с базой, пока
+    обновления игрока обрабатывает один процесс (см. utils.workers);
+    после перезапуска процесса состояния читаются из базы.
+    """
+
+    def __init__(self, max_cached: int = 10000):
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[StorageKey, Record]" = OrderedDict()
+
+    async def _record(self, key: StorageKey) -> Record:
+        record = self._cache.get(key)
+        if record is None:
+            record = await run_for_user(self._load, key.user_id, key)
+            self._remember(key, record)
+        else:
+            self._cache.move_to_end(key)
+        return record
+
+    def _remember(self, key: StorageKey, record: Record) -> None:
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def _save(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._remember(key, (state, data))
+        await run_for_user(self._store, key.user_id, key, state, json.dumps(data) if data else None)
+
+    @staticmethod
+    def _load(session, user_id: int, key: StorageKey) -> Record:
+        row = session.query(FsmState.state, FsmState.data).filter(*_key_filter(key)).first()
+        if row is None:
+            return None, {}
+        return row.state, json.loads(row.data) if row.data else {}
+
+    @staticmethod
+    def _store(session, user_id: int, key: StorageKey, state: Optional[str], data: Optional[str]) -> None:
+        if state is None and data is None:
+            # Пустое состояние не храним
+            session.execute(delete(FsmState).where(*_key_filter(key)))
+        else:
+            values = dict(state=state, data=data or "{}")
+            session.execute(
+                insert(FsmState).values(
+                    user_id=key.user_id, chat_id=key.chat_id, bot_id=key.bot_id,
+                    thread_id=key.thread_id or 0, destiny=key.destiny, **values
+                ).on_conflict_do_update(
+                    index_elements=[
+                        FsmState.user_id, FsmState.chat_id, FsmState.bot_id, FsmState.thread_id, FsmState.destiny
+                    ],
+                    set_=values
+                )
+            )
+        session.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data = await self._record(key)
+        await self._save(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._record(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        state, _ = await self._record(key)
+        await self._save(key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._record(key)
+        return data.copy()
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+def create_fsm_storage(backend: str = FSM_STORAGE) -> BaseStorage:
+    """Создание хранилища состояний FSM по имени из настроек"""
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SqliteStorage()
+    raise ValueError(f"Неизвестное хранилище состояний: {backend}")
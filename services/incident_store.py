@@ -0,0 +1,174 @@
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from config import INCIDENT_STORE, INCIDENT_STORE_MAX_ENTRIES, INCIDENT_TTL, INCIDENT_GRACE_TTL
+from models import ActiveIncident, run_for_user
+
+class PendingIncident(NamedTuple):
+    """Инцидент, показанный игроку и ожидающий решения"""
+    incident_id: int
+    start_time: float
+    expires_at: float
+
+def incident_ttl(time_sensitive: int) -> float:
+    """Время жизни инцидента: ограничение по времени плюс запас, чтобы просрочка успела оштрафовать"""
+    if time_sensitive and time_sensitive > 0:
+        return time_sensitive + INCIDENT_GRACE_TTL
+    return INCIDENT_TTL
+
+class ActiveIncidentStore(ABC):
+    """Хранилище незавершенных инцидентов с истечением по TTL"""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @abstractmethod
+    async def put(self, user_id: int, incident_id: int, ttl: float) -> PendingIncident:
+        """Сохранить инцидент игрока (заменяет предыдущий)"""
+
+    @abstractmethod
+    async def pop(self, user_id: int) -> Optional[PendingIncident]:
+        """Забрать инцидент игрока; повторный вызов вернет None"""
+
+    def memory_bytes(self) -> int:
+        """Примерный объем памяти процесса, занятый хранилищем"""
+        return 0
+
+    def stats(self) -> dict:
+        """Счетчики попаданий, промахов, истечений и вытеснений"""
+        return {
+            'backend': type(self).__name__,
+            'puts': self.puts,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'memory_bytes': self.memory_bytes(),
+        }
+
+    def _account(self, pending: Optional[PendingIncident], now: float) -> Optional[PendingIncident]:
+        if pending is None:
+            self.misses += 1
+            return None
+        if pending.expires_at <= now:
+            self.expired += 1
+            return None
+        self.hits += 1
+        return pending
+
+class MemoryIncidentStore(ActiveIncidentStore):
+    """Хранилище в памяти процесса с ограничением на количество записей.
+
+    При переполнении вытесняются самые давние инциденты. Просроченные записи
+    удаляются при обращении и при вставке с начала очереди.
+    """
+
+    def __init__(self, max_entries: int = INCIDENT_STORE_MAX_ENTRIES, clock: Callable[[], float] = time.time):
+        super().__init__(clock)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, PendingIncident]" = OrderedDict()
+
+    async def put(self, user_id: int, incident_id: int, ttl: float) -> PendingIncident:
+        now = self.clock()
+        pending = PendingIncident(incident_id, now, now + ttl)
+
+        self._entries.pop(user_id, None)
+        self._entries[user_id] = pending
+        self.puts += 1
+
+        # Сначала убираем просроченные записи из начала очереди, затем самые давние
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.expires_at <= now:
+                self._entries.popitem(last=False)
+                self.expired += 1
+            elif len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            else:
+                break
+
+        return pending
+
+    async def pop(self, user_id: int) -> Optional[PendingIncident]:
+        return self._account(self._entries.pop(user_id, None), self.clock())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memory_bytes(self) -> int:
+        # Словарь плюс кортеж и числа каждой записи
+        entry_size = sys.getsizeof(PendingIncident(0, 0.0, 0.0)) + 3 * sys.getsizeof(0.0) + sys.getsizeof(0)
+        return sys.getsizeof(self._entries) + len(self._entries) * entry_size
+
+class SqliteIncidentStore(ActiveIncidentStore):
+    """Хранилище в таблице active_incidents: переживает перезапуск и доступно нескольким процессам"""
+
+    # Просроченные строки удаляются раз в указанное количество вставок
+    PURGE_EVERY = 1000
+
+    async def put(self, user_id: int, incident_id: int, ttl: float) -> PendingIncident:
+        now = self.clock()
+        pending = PendingIncident(incident_id, now, now + ttl)
+        self.puts += 1
+        purge = self.puts % self.PURGE_EVERY == 0
+
+        purged = await run_for_user(self._put, user_id, pending, purge)
+        self.expired += purged
+        return pending
+
+    @staticmethod
+    def _put(session, user_id: int, pending: PendingIncident, purge: bool) -> int:
+        values = dict(user_id=user_id, **pending._asdict())
+        session.execute(
+            insert(ActiveIncident).values(**values).on_conflict_do_update(
+                index_elements=[ActiveIncident.user_id], set_=pending._asdict()
+            )
+        )
+
+        purged = 0
+        if purge:
+            purged = session.execute(
+                delete(ActiveIncident).where(ActiveIncident.expires_at <= pending.start_time)
+            ).rowcount
+
+        session.commit()
+        return purged
+
+    async def pop(self, user_id: int) -> Optional[PendingIncident]:
+        return self._account(await run_for_user(self._pop, user_id), self.clock())
+
+    @staticmethod
+    def _pop(session, user_id: int) -> Optional[PendingIncident]:
+        # DELETE ... RETURNING: только один из параллельных запросов получит инцидент
+        row = session.execute(
+            delete(ActiveIncident).where(
+                ActiveIncident.user_id == user_id
+            ).returning(
+                ActiveIncident.incident_id, ActiveIncident.start_time, ActiveIncident.expires_at
+            )
+        ).first()
+        session.commit()
+        return PendingIncident(*row) if row else None
+
+def create_incident_store(backend: str = INCIDENT_STORE) -> ActiveIncidentStore:
+    """Создание хранилища по имени из настроек"""
+    if backend == "memory":
+        return MemoryIncidentStore()
+    if backend == "sqlite":
+        return SqliteIncidentStore()
+    raise ValueError(f"Неизвестное хранилище инцидентов: {backend}")
+
+# Общее хранилище для обработчиков
+incident_store = create_incident_store()
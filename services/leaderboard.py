@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models import Player, group_by_shard, run_on_all_shards, run_on_shard
+
+logger = logging.getLogger(__name__)
+
+# Ключ сортировки: больше уровень, затем больше опыт, при равенстве - меньший user_id
+RankKey = Tuple[int, int, int]
+
+def _key(user_id: int, level: int, experience: int) -> RankKey:
+    return -level, -experience, user_id
+
+class Leaderboard:
+    """Рейтинг игроков в памяти, обновляемый по мере изменения уровня и опыта.
+
+    Упорядоченный список разбит на блоки по LOAD..2*LOAD ключей (как в
+    sortedcontainers): вставка и удаление сдвигают только один блок, а место
+    игрока - это сумма длин предыдущих блоков плюс позиция в своем блоке.
+    Методы потокобезопасны, так как вызываются из рабочих потоков БД.
+    Изменения между begin_load и load запоминаются и применяются поверх
+    загруженных строк, поэтому рейтинг можно строить, пока бот уже работает.
+    on_change получает изменения (user_id, level, experience; для удаления
+    уровень и опыт None), чтобы передать их рейтингам других процессов.
+    """
+
+    LOAD = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: List[List[RankKey]] = []
+        self._maxes: List[RankKey] = []
+        self._keys: Dict[int, RankKey] = {}
+        # Изменения во время загрузки: user_id -> новый ключ или None (игрок удален)
+        self._pending: Optional[Dict[int, Optional[RankKey]]] = None
+        self.on_change: Optional[Callable[[int, Optional[int], Optional[int]], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def begin_load(self) -> None:
+        """Начало загрузки: следующие изменения будут применены поверх строк load"""
+        with self._lock:
+            self._pending = {}
+
+    def load(self, rows) -> None:
+        """Полная перестройка из строк (user_id, level, experience)"""
+        keys = {user_id: _key(user_id, level, experience) for user_id, level, experience in rows}
+        ordered = sorted(keys.values())
+        buckets = [ordered[start:start + self.LOAD] for start in range(0, len(ordered), self.LOAD)]
+        with self._lock:
+            pending, self._pending = self._pending or {}, None
+            self._keys = keys
+            self._buckets = buckets
+            self._maxes = [bucket[-1] for bucket in buckets]
+            for user_id, key in pending.items():
+                old = self._keys.pop(user_id, None)
+                if old is not None:
+                    self._discard(old)
+                if key is not None:
+                    self._insert(key)
+                    self._keys[user_id] = key
+
+    def update(self, user_id: int, level: int, experience: int, publish: bool = True) -> None:
+        """Добавить игрока или обновить его уровень и опыт"""
+        if publish and self.on_change is not None:
+            self.on_change(user_id, level, experience)
+        key = _key(user_id, level, experience)
+        with self._lock:
+            old = self._keys.get(user_id)
+            if old == key:
+                return
+            if old is not None:
+                self._discard(old)
+            self._insert(key)
+            self._keys[user_id] = key
+            if self._pending is not None:
+                self._pending[user_id] = key
+
+    def remove(self, user_id: int, publish: bool = True) -> None:
+        """Убрать игрока из рейтинга"""
+        if publish and self.on_change is not None:
+            self.on_change(user_id, None, None)
+        with self._lock:
+            old = self._keys.pop(user_id, None)
+            if old is not None:
+                self._discard(old)
+            if self._pending is not None:
+                self._pending[user_id] = None
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место игрока (с 1) или None, если его нет в рейтинге"""
+        with self._lock:
+            key = self._keys.get(user_id)
+            if key is None:
+                return None
+            return self._index(key) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, int, int]]:
+        """Первые limit игроков: (user_id, level, experience)"""
+        with self._lock:
+            return self._slice(0, limit)
+
+    def around(self, user_id: int, radius: int) -> Tuple[int, List[Tuple[int, int, int]]]:
+        """Соседи игрока по рейтингу: место первого из них и сами записи"""
+        with self._lock:
+            key = self._keys.get(user_id)
+            if key is None:
+                return 0, []
+            start = max(0, self._index(key) - radius)
+            return start + 1, self._slice(start, start + 2 * radius + 1)
+
+    # Внутренние операции выполняются под self._lock
+
+    def _insert(self, key: RankKey) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+
+        position = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[position]
+        insort(bucket, key)
+        self._maxes[position] = bucket[-1]
+
+        if len(bucket) > 2 * self.LOAD:
+            half = bucket[self.LOAD:]
+            del bucket[self.LOAD:]
+            self._buckets.insert(position + 1, half)
+            self._maxes[position] = bucket[-1]
+            self._maxes.insert(position + 1, half[-1])
+
+    def _discard(self, key: RankKey) -> None:
+        position = bisect_left(self._maxes, key)
+        bucket = self._buckets[position]
+        del bucket[bisect_left(bucket, key)]
+
+        if bucket:
+            self._maxes[position] = bucket[-1]
+        else:
+            del self._buckets[position]
+            del self._maxes[position]
+
+    def _index(self, key: RankKey) -> int:
+        position = bisect_left(self._maxes, key)
+        offset = 0
+        for bucket in self._buckets[:position]:
+            offset += len(bucket)
+        return offset + bisect_left(self._buckets[position], key)
+
+    def _slice(self, start: int, stop: int) -> List[Tuple[int, int, int]]:
+        result = []
+        offset = 0
+        for bucket in self._buckets:
+            size = len(bucket)
+            if offset + size > start:
+                for level, experience, user_id in bucket[max(0, start - offset):stop - offset]:
+                    result.append((user_id, -level, -experience))
+                if offset + size >= stop:
+                    break
+            offset += size
+        return result
+
+# Общий рейтинг процесса
+leaderboard = Leaderboard()
+
+# Фоновая загрузка рейтинга при быстром запуске
+_loading: Optional[asyncio.Task] = None
+
+def _rating_rows(session) -> list:
+    # Кортежи через соединение без ORM: при сотнях тысяч игроков это вдвое быстрее session.query
+    return session.connection().execute(select(Player.user_id, Player.level, Player.experience)).all()
+
+async def load_leaderboard() -> int:
+    """Построение рейтинга из всех шардов при запуске"""
+    leaderboard.begin_load()
+    rows = [row for shard_rows in await run_on_all_shards(_rating_rows) for row in shard_rows]
+    leaderboard.load(rows)
+    return len(rows)
+
+async def _load_in_background() -> None:
+    try:
+        logger.info("Рейтинг загружен: %s игроков", await load_leaderboard())
+    except Exception:
+        logger.exception("Не удалось загрузить рейтинг")
+
+def load_leaderboard_in_background() -> asyncio.Task:
+    """Построение рейтинга в фоне; get_rating дождется его завершения"""
+    global _loading
+    _loading = asyncio.create_task(_load_in_background())
+    return _loading
+
+async def wait_leaderboard() -> None:
+    """Ожидание фоновой загрузки рейтинга, если она еще идет"""
+    if _loading is not None and not _loading.done():
+        # Отмена ожидающего не должна прерывать загрузку
+        await asyncio.shield(_loading)
+
+def _player_rows(session, user_ids: List[int]) -> Dict[int, tuple]:
+    rows = session.query(
+        Player.user_id,
+        Player.username,
+        Player.level,
+        Player.experience,
+        Player.successful_fixes,
+        Player.server_health
+    ).filter(Player.user_id.in_(user_ids)).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+async def get_rating(user_id: int, limit: int = 10, radius: int = 2) -> dict:
+    """Лучшие игроки, место игрока и его соседи по рейтингу.
+
+    Строки игроков - (username, level, experience, successful_fixes, server_health)
+    """
+    await wait_leaderboard()
+
+    top = leaderboard.top(limit)
+    first_neighbour, neighbours = leaderboard.around(user_id, radius)
+
+    user_ids = list({entry[0] for entry in top + neighbours})
+    rows = {}
+    shard_rows = await asyncio.gather(*(
+        run_on_shard(shard, _player_rows, shard_user_ids) for shard, shard_user_ids in group_by_shard(user_ids).items()
+    ))
+    for part in shard_rows:
+        rows.update(part)
+
+    return {
+        'top': [rows[entry[0]] for entry in top if entry[0] in rows],
+        'rank': leaderboard.rank(user_id),
+        'total': len(leaderboard),
+        'neighbours_from': first_neighbour,
+        'neighbours': [(entry[0], rows[entry[0]]) for entry in neighbours if entry[0] in rows],
+    }
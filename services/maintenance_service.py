@@ -1,48 +1,83 @@
 from typing import Tuple
 
-from models import Player, SessionMaker
-from services.player_service import update_experience
+from sqlalchemy import case, update
 
-async def repair_server(user_id: int, repair_percent: int) -> Tuple[bool, float, int]:
-    """Ремонт серверов"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
+from models import Player, run_for_user
+from services.economy import debit
+from services.formulas import repair_experience, repair_price
+from services.leaderboard import leaderboard
+from services.player_service import experience_values
+from services.render_cache import bump_version
+
+def _repair_server(session, user_id: int, repair_percent: int) -> Tuple[bool, float, int]:
+    while True:
+        row = session.query(Player.server_health, Player.servers).filter(Player.user_id == user_id).first()
         
-        if not player:
+        if not row:
             return False, 0, 0
         
-        current_health = player.server_health
+        current_health, servers = row
         max_repair = 100 - current_health
         
         # Ограничиваем ремонт максимальным значением
         actual_repair = min(max_repair, repair_percent)
         
         # Рассчитываем стоимость ремонта
-        repair_cost = int(actual_repair * player.servers * 5)
+        repair_cost = int(repair_price(actual_repair, servers))
+        new_health = min(100, current_health + actual_repair)
+        
+        # Даем небольшое количество опыта за обслуживание
+        exp_gain = int(repair_experience(actual_repair))
+        values = experience_values(exp_gain) if exp_gain > 0 else {}
         
-        if player.money >= repair_cost:
-            player.server_health = min(100, current_health + actual_repair)
-            player.money -= repair_cost
+        # Списание проходит, только если состояние не изменилось с момента чтения
+        player = debit(
+            session, user_id, repair_cost,
+            Player.server_health == current_health,
+            Player.servers == servers,
+            returning=(Player.level, Player.experience),
+            server_health=new_health,
+            **values
+        )
+        if player:
             session.commit()
-            
-            # Даем небольшое количество опыта за обслуживание
-            exp_gain = int(actual_repair / 2)
-            if exp_gain > 0:
-                await update_experience(user_id, exp_gain)
-            
-            return True, player.server_health, repair_cost
-        else:
+            leaderboard.update(user_id, player.level, player.experience)
+            bump_version(user_id)
+            return True, new_health, repair_cost
+        
+        # Если параллельный запрос изменил состояние серверов, пересчитываем стоимость
+        changed = session.query(Player.user_id).filter(
+            Player.user_id == user_id,
+            (Player.server_health != current_health) | (Player.servers != servers)
+        ).first()
+        
+        if not changed:
             return False, current_health, repair_cost
 
+async def repair_server(user_id: int, repair_percent: int) -> Tuple[bool, float, int]:
+    """Ремонт серверов"""
+    return await run_for_user(_repair_server, user_id, repair_percent)
+
+def _decrease_server_health(session, user_id: int, amount: float) -> float:
+    row = session.execute(
+        update(Player).where(
+            Player.user_id == user_id
+        ).values(
+            server_health=case(
+                (Player.server_health - amount > 0, Player.server_health - amount),
+                else_=0
+            )
+        ).returning(Player.server_health),
+        execution_options={"synchronize_session": False}
+    ).first()
+    
+    if not row:
+        return 0
+    
+    session.commit()
+    bump_version(user_id)
+    return row.server_health
+
 async def decrease_server_health(user_id: int, amount: float) -> float:
     """Уменьшение здоровья серверов при неудачных решениях или со временем"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return 0
-        
-        player.server_health = max(0, player.server_health - amount)
-        session.commit()
-        
-        return player.server_health
\ No newline at end of file
+    return await run_for_user(_decrease_server_health, user_id, amount)
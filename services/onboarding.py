@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Optional
+
+from config import ONBOARDING_BATCH
+from models import group_by_shard, run_on_shard
+from services.player_service import _create_players
+
+logger = logging.getLogger(__name__)
+
+class PlayerOnboarding:
+    """Пакетная регистрация новых игроков для наплывов /start.
+
+    Обработчик вызывает register() и ждет записи игрока. Пока пишется один
+    пакет, новые регистрации копятся и уходят следующим: на пакет - один
+    INSERT игроков ... ON CONFLICT DO NOTHING RETURNING, один INSERT их
+    навыков и один коммит на шард. Уже зарегистрированных игроков пропускает
+    сама база, без отдельного SELECT. При редких /start пакет состоит из
+    одного игрока и ожидания нет.
+    """
+
+    def __init__(self, max_batch: int = ONBOARDING_BATCH):
+        self.max_batch = max_batch
+        self._pending: Dict[int, str] = {}
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+        self._writer: Optional[asyncio.Task] = None
+
+        self.requests = 0
+        self.created = 0
+        self.existing = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def register(self, user_id: int, username: str) -> bool:
+        """Зарегистрировать игрока; True, если он создан, False - если уже был"""
+        future = asyncio.get_running_loop().create_future()
+        # Повторный /start того же игрока до записи присоединяется к его строке
+        self._pending.setdefault(user_id, username)
+        self._waiters.setdefault(user_id, []).append(future)
+        self.requests += 1
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+        return await future
+
+    async def _write(self, batch: Dict[int, str]) -> set:
+        shards = group_by_shard(batch.items(), lambda item: item[0])
+        created = await asyncio.gather(*(
+            run_on_shard(shard, _create_players, dict(players)) for shard, players in shards.items()
+        ))
+        return set(itertools.chain.from_iterable(created))
+
+    async def _run(self) -> None:
+        try:
+            while self._pending:
+                batch = dict(itertools.islice(self._pending.items(), self.max_batch))
+                waiters = {}
+                for user_id in batch:
+                    del self._pending[user_id]
+                    waiters[user_id] = self._waiters.pop(user_id)
+                try:
+                    created = await self._write(batch)
+                except Exception as error:
+                    logger.exception("Не удалось зарегистрировать %d игроков", len(batch))
+                    self.failed += len(batch)
+                    for futures in waiters.values():
+                        for future in futures:
+                            if not future.done():
+                                future.set_exception(error)
+                    continue
+
+                self.batches += 1
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.created += len(created)
+                self.existing += len(batch) - len(created)
+                for user_id, futures in waiters.items():
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(user_id in created)
+        finally:
+            self._writer = None
+
+    def stats(self) -> dict:
+        """Счетчики регистрации: запросы, созданные игроки, пакеты"""
+        return {
+            'pending': len(self._pending),
+            'requests': self.requests,
+            'created': self.created,
+            'existing': self.existing,
+            'batches': self.batches,
+            'players_per_batch': (self.created + self.existing) / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'failed': self.failed,
+        }
+
+# Общая регистрация для обработчиков
+onboarding = PlayerOnboarding()
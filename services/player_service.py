@@ -1,86 +1,133 @@
 from datetime import datetime
-from typing import Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List
 
-from models import Player, Skill, SessionMaker
+from sqlalchemy import case, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Player, Skill, run_for_user
+from services.economy import debit
+from services.formulas import next_level_experience, server_price
+from services.leaderboard import leaderboard
+from services.render_cache import bump_version
+
+# Навыки нового игрока, все с первого уровня
+BASIC_SKILLS = ('Linux', 'Networking', 'Docker', 'CI/CD', 'Monitoring')
+
+# Уже существующие игроки пропускаются базой; RETURNING возвращает только созданных
+_insert_players = sqlite_insert(Player).on_conflict_do_nothing(
+    index_elements=[Player.user_id]
+).returning(Player.user_id, Player.level, Player.experience)
+
+def _create_players(session, players: Dict[int, str]) -> List[int]:
+    """Создание игроков (user_id -> имя) с начальными навыками одной транзакцией.
+
+    Игроки записываются одним многострочным INSERT ... ON CONFLICT DO NOTHING,
+    навыки созданных - одним INSERT. Возвращает идентификаторы созданных игроков.
+    """
+    now = datetime.now().isoformat()
+    created = session.execute(_insert_players, [
+        {'user_id': user_id, 'username': username, 'last_activity': now}
+        for user_id, username in players.items()
+    ]).all()
+    
+    if created:
+        # Создаем начальные навыки
+        session.execute(insert(Skill), [
+            {'user_id': row.user_id, 'skill_name': name, 'skill_level': 1}
+            for row in created for name in BASIC_SKILLS
+        ])
+    session.commit()
+    
+    for row in created:
+        leaderboard.update(row.user_id, row.level, row.experience)
+        bump_version(row.user_id)
+    return [row.user_id for row in created]
+
+def _get_or_create_player(session, user_id: int, username: str) -> Player:
+    player = session.query(Player).filter(Player.user_id == user_id).first()
+    
+    if not player:
+        _create_players(session, {user_id: username})
+        player = session.query(Player).filter(Player.user_id == user_id).first()
+    
+    return player
 
 async def get_or_create_player(user_id: int, username: str) -> Player:
     """Получение или создание игрока"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            player = Player(
-                user_id=user_id,
-                username=username,
-                last_activity=datetime.now().isoformat()
-            )
-            session.add(player)
-            session.commit()
-            
-            # Создаем начальные навыки
-            basic_skills = [
-                Skill(user_id=user_id, skill_name='Linux', skill_level=1),
-                Skill(user_id=user_id, skill_name='Networking', skill_level=1),
-                Skill(user_id=user_id, skill_name='Docker', skill_level=1),
-                Skill(user_id=user_id, skill_name='CI/CD', skill_level=1),
-                Skill(user_id=user_id, skill_name='Monitoring', skill_level=1)
-            ]
-            session.add_all(basic_skills)
-            session.commit()
-            
-            # Перезагружаем игрока, чтобы получить связанные навыки
-            session.refresh(player)
-        
-        return player
+    return await run_for_user(_get_or_create_player, user_id, username)
+
+def _get_player_profile(session, user_id: int) -> Tuple[Optional[Player], List[Skill]]:
+    player = session.query(Player).filter(Player.user_id == user_id).first()
+    
+    if player:
+        skills = session.query(Skill).filter(Skill.user_id == user_id).all()
+        return player, skills
+    return None, []
 
 async def get_player_profile(user_id: int) -> Tuple[Optional[Player], List[Skill]]:
     """Получение профиля игрока"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if player:
-            skills = session.query(Skill).filter(Skill.user_id == user_id).all()
-            return player, skills
-        return None, []
+    return await run_for_user(_get_player_profile, user_id)
+
+def apply_experience(player: Player, exp_gain: int) -> bool:
+    """Начисление опыта загруженному игроку, возвращает признак повышения уровня"""
+    player.experience += exp_gain
+    level_up = False
+    
+    if player.experience >= next_level_experience(player.level):
+        player.level += 1
+        level_up = True
+    
+    player.last_activity = datetime.now().isoformat()
+    return level_up
+
+def experience_values(exp_gain: int) -> dict:
+    """Значения UPDATE для начисления опыта на стороне базы (та же формула, что в apply_experience)"""
+    return {
+        'experience': Player.experience + exp_gain,
+        'level': case(
+            (Player.experience + exp_gain >= next_level_experience(Player.level), Player.level + 1),
+            else_=Player.level
+        ),
+        'last_activity': datetime.now().isoformat()
+    }
+
+def _update_experience(session, user_id: int, exp_gain: int) -> Tuple[int, int, bool]:
+    player = session.query(Player).filter(Player.user_id == user_id).first()
+    
+    if not player:
+        return 1, 0, False
+    
+    level_up = apply_experience(player, exp_gain)
+    session.commit()
+    leaderboard.update(user_id, player.level, player.experience)
+    bump_version(user_id)
+    
+    return player.level, player.experience, level_up
 
 async def update_experience(user_id: int, exp_gain: int) -> Tuple[int, int, bool]:
     """Обновление опыта и уровня игрока"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return 1, 0, False
-        
-        player.experience += exp_gain
-        level_up = False
-        
-        # Формула для повышения уровня: 100 * текущий_уровень
-        next_level_exp = 100 * player.level
-        
-        if player.experience >= next_level_exp:
-            player.level += 1
-            level_up = True
-        
-        player.last_activity = datetime.now().isoformat()
+    return await run_for_user(_update_experience, user_id, exp_gain)
+
+def _buy_server(session, user_id: int) -> Tuple[bool, int]:
+    # Цена вычисляется и проверяется тем же UPDATE, что и списание
+    row = debit(
+        session, user_id, server_price(Player.servers),
+        returning=(Player.servers,),
+        servers=Player.servers + 1
+    )
+    
+    if row:
         session.commit()
-        
-        return player.level, player.experience, level_up
+        bump_version(user_id)
+        return True, server_price(row.servers - 1)
+    
+    servers = session.query(Player.servers).filter(Player.user_id == user_id).scalar()
+    
+    if servers is None:
+        return False, 0
+    
+    return False, server_price(servers)
 
 async def buy_server(user_id: int) -> Tuple[bool, int]:
     """Покупка сервера"""
-    with SessionMaker() as session:
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not player:
-            return False, 0
-        
-        server_cost = player.servers * 1000
-        
-        if player.money >= server_cost:
-            player.servers += 1
-            player.money -= server_cost
-            session.commit()
-            
-            return True, server_cost
-        else:
-            return False, server_cost
\ No newline at end of file
+    return await run_for_user(_buy_server, user_id)
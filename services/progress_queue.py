@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, update
+
+from config import PROGRESS_QUEUE_SIZE, PROGRESS_FLUSH_BATCH, PROGRESS_FLUSH_INTERVAL
+from models import DailyTask, group_by_shard, run_on_shard
+
+logger = logging.getLogger(__name__)
+
+# Ключ накопленного прогресса внутри игрока: (тип задания, день)
+ProgressKey = Tuple[str, str]
+
+_tasks = DailyTask.__table__
+
+# Один UPDATE на пару (игрок, тип задания); пары передаются списком и выполняются через executemany
+_apply_statement = update(_tasks).where(
+    _tasks.c.user_id == bindparam('b_user_id'),
+    _tasks.c.date_created == bindparam('b_day'),
+    _tasks.c.task_type == bindparam('b_task_type'),
+    _tasks.c.completed == False
+).values(
+    current_amount=_tasks.c.current_amount + bindparam('b_amount'),
+    completed=case(
+        (_tasks.c.current_amount + bindparam('b_amount') >= _tasks.c.target_amount, True),
+        else_=False
+    )
+)
+
+def _apply_progress(session, params: List[dict]) -> int:
+    result = session.execute(_apply_statement, params)
+    session.commit()
+    return result.rowcount
+
+class ProgressQueue:
+    """Отложенная запись прогресса ежедневных заданий.
+
+    Обработчики вызывают emit() и не ждут базу. События складываются по
+    паре (игрок, тип задания), фоновый потребитель раз в flush_interval
+    секунд или при накоплении flush_batch пар записывает их одной
+    транзакцией на шард. Число пар ограничено max_pending: при переполнении emit()
+    ждет следующей записи. Перед чтением заданий и при остановке бота
+    очередь сбрасывается через flush().
+    """
+
+    def __init__(
+        self,
+        max_pending: int = PROGRESS_QUEUE_SIZE,
+        flush_batch: int = PROGRESS_FLUSH_BATCH,
+        flush_interval: float = PROGRESS_FLUSH_INTERVAL
+    ):
+        self.max_pending = max_pending
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, Dict[ProgressKey, int]] = {}
+        # Число событий игрока в очереди (amount одного события может быть больше 1)
+        self._pending_events: Dict[int, int] = {}
+        self._size = 0
+        self._flushing: Dict[int, Dict[ProgressKey, int]] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._full: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._consumer: Optional[asyncio.Task] = None
+
+        self.events = 0
+        self.flushes = 0
+        self.flushed_events = 0
+        self.statements = 0
+        self.rows_updated = 0
+        self.backpressure_waits = 0
+        self.dropped_events = 0
+
+    def _ensure_primitives(self):
+        # Примитивы asyncio создаются в работающем цикле событий
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+            self._full = asyncio.Event()
+            self._space = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def has_pending(self, user_id: int) -> bool:
+        """Есть ли у игрока незаписанный прогресс (в очереди или в текущей записи)"""
+        return user_id in self._pending or user_id in self._flushing
+
+    async def emit(self, user_id: int, task_type: str, amount: int = 1) -> None:
+        """Добавить прогресс задания; ждет только при переполнении очереди"""
+        self._ensure_primitives()
+        key = (task_type, datetime.now().date().isoformat())
+
+        while self._size >= self.max_pending and key not in self._pending.get(user_id, {}):
+            self.backpressure_waits += 1
+            if self._consumer is None:
+                await self.flush()
+            else:
+                self._space.clear()
+                await self._space.wait()
+
+        user_pending = self._pending.setdefault(user_id, {})
+        if key not in user_pending:
+            user_pending[key] = 0
+            self._size += 1
+        user_pending[key] += amount
+        self._pending_events[user_id] = self._pending_events.get(user_id, 0) + 1
+        self.events += 1
+
+        if self._size >= self.flush_batch:
+            self._full.set()
+
+    async def flush(self) -> int:
+        """Записать весь накопленный прогресс, возвращает число событий"""
+        self._ensure_primitives()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            batch_events, self._pending_events = self._pending_events, {}
+            self._size = 0
+            self._flushing = batch
+            self._full.clear()
+            self._space.set()
+
+            # Шарды коммитятся независимо: ошибка одного не отменяет запись остальных
+            shards = group_by_shard(batch.items(), lambda item: item[0])
+            try:
+                results = await asyncio.gather(*(
+                    run_on_shard(shard, _apply_progress, [
+                        {'b_user_id': user_id, 'b_task_type': task_type, 'b_day': day, 'b_amount': amount}
+                        for user_id, user_pending in users
+                        for (task_type, day), amount in user_pending.items()
+                    ])
+                    for shard, users in shards.items()
+                ), return_exceptions=True)
+            finally:
+                self._flushing = {}
+
+            flushed = 0
+            for (shard, users), result in zip(shards.items(), results):
+                events = sum(batch_events[user_id] for user_id, _ in users)
+                if isinstance(result, BaseException):
+                    logger.error(
+                        "Не удалось записать прогресс заданий шарда %d: %d событий потеряно",
+                        shard, events, exc_info=result
+                    )
+                    self.dropped_events += events
+                    continue
+                self.rows_updated += result
+                self.statements += sum(len(user_pending) for _, user_pending in users)
+                flushed += events
+
+            if flushed:
+                self.flushes += 1
+                self.flushed_events += flushed
+            return flushed
+
+    async def flush_user(self, user_id: int) -> None:
+        """Дождаться записи прогресса игрока перед чтением его заданий"""
+        if self.has_pending(user_id):
+            await self.flush()
+
+    async def start(self) -> None:
+        """Запуск фонового потребителя"""
+        self._ensure_primitives()
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановка потребителя и запись оставшихся событий"""
+        if self._consumer is not None:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # Запись защищена от отмены, чтобы остановка не прервала транзакцию на середине
+            await asyncio.shield(self.flush())
+
+    def stats(self) -> dict:
+        """Счетчики очереди: события, записи, сэкономленные обращения к базе"""
+        return {
+            'pending': self._size,
+            'events': self.events,
+            'flushes': self.flushes,
+            'events_per_flush': self.flushed_events / self.flushes if self.flushes else 0.0,
+            'statements': self.statements,
+            'rows_updated': self.rows_updated,
+            # Раньше каждое событие - это отдельные SELECT, UPDATE и коммит
+            'writes_saved': self.flushed_events - self.statements,
+            'commits_saved': self.flushed_events - self.flushes,
+            'backpressure_waits': self.backpressure_waits,
+            'dropped_events': self.dropped_events,
+        }
+
+# Общая очередь для обработчиков
+progress_queue = ProgressQueue()
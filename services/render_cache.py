@@ -0,0 +1,166 @@
+import itertools
+import sys
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from config import RENDER_CACHE_MAX_BYTES
+
+class Rendered(NamedTuple):
+    """Готовый ответ экрана: текст в Markdown и клавиатура"""
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+# Версии игроков берутся из общего счетчика, поэтому присваивание атомарно и
+# безопасно из рабочих потоков БД, а номер никогда не повторяется
+_version_counter = itertools.count(1)
+_versions: Dict[int, int] = {}
+_epoch = 0
+# Передача сброса эпохи другим процессам (см. utils.workers)
+on_epoch: Optional[Callable[[], None]] = None
+
+# Примерный размер записи таблицы версий: слот словаря и два int. Таблица
+# входит в бюджет RENDER_CACHE_MAX_BYTES вместе с отрисовками
+_VERSION_BYTES = 100
+_MAX_VERSIONS = max(1, RENDER_CACHE_MAX_BYTES // _VERSION_BYTES)
+
+def _reset_versions() -> None:
+    # Новая эпоха делает недействительными все отрисовки, поэтому версии можно
+    # забыть. Таблица очищается до смены эпохи: версия, записанная между этими
+    # шагами, остается, а ответ, закэшированный между ними, устареет со сменой эпохи
+    global _epoch
+    _versions.clear()
+    _epoch += 1
+
+def bump_version(user_id: int) -> None:
+    """Отметить, что данные игрока изменились; вызывается сервисами после коммита"""
+    _versions[user_id] = next(_version_counter)
+    if len(_versions) > _MAX_VERSIONS:
+        _reset_versions()
+
+def bump_epoch(publish: bool = True) -> None:
+    """Сбросить отрисовки всех игроков (массовые изменения, новый каталог)"""
+    _reset_versions()
+    if publish and on_epoch is not None:
+        on_epoch()
+
+def version_token(user_id: int) -> Tuple[int, int]:
+    """Текущая версия данных игрока с учетом общей эпохи"""
+    return _epoch, _versions.get(user_id, 0)
+
+def _markup_size(markup) -> int:
+    if markup is None:
+        return 0
+    rows = getattr(markup, "inline_keyboard", None) or getattr(markup, "keyboard", None) or []
+    size = sys.getsizeof(markup)
+    for row in rows:
+        for button in row:
+            size += sys.getsizeof(button) + sys.getsizeof(button.text)
+            size += sys.getsizeof(getattr(button, "callback_data", None) or "")
+    return size
+
+class _Entry(NamedTuple):
+    token: Tuple[int, int]
+    value: Rendered
+    size: int
+
+class RenderCache:
+    """LRU-кэш готовых экранов по (игрок, экран) с ограничением по памяти.
+
+    Запись действительна, пока версия игрока и общая эпоха не изменились.
+    Версию нужно запомнить до чтения данных (version_token), чтобы изменение,
+    сделанное во время отрисовки, не закрепило в кэше устаревший ответ.
+    Таблица версий занимает часть того же бюджета max_bytes: отрисовки
+    вытесняются, пока вместе с ней не уложатся в него.
+    """
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[int, str], _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, screen: str) -> Optional[Rendered]:
+        """Закэшированный экран или None, если его нет или данные игрока изменились"""
+        key = (user_id, screen)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.token != version_token(user_id):
+            self.stale += 1
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(self, user_id: int, screen: str, value: Rendered, token: Tuple[int, int]) -> None:
+        """Сохранить экран, отрисованный по данным версии token"""
+        if token != version_token(user_id):
+            # Данные изменились во время отрисовки
+            return
+        key = (user_id, screen)
+        size = sys.getsizeof(key) + sys.getsizeof(value.text) + _markup_size(value.reply_markup)
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = _Entry(token, value, size)
+        self.bytes += size
+        while self._entries and self.bytes + len(_versions) * _VERSION_BYTES > self.max_bytes:
+            _, oldest = self._entries.popitem(last=False)
+            self.bytes -= oldest.size
+            self.evicted += 1
+
+    def _remove(self, key: Tuple[int, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        """Счетчики попаданий, устаревших записей и вытеснений"""
+        lookups = self.hits + self.misses + self.stale
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'versions': len(_versions),
+            'version_bytes': len(_versions) * _VERSION_BYTES,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evicted': self.evicted,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    async def render(
+        self,
+        user_id: int,
+        screen: str,
+        build: Callable[[], Awaitable[Optional[Rendered]]]
+    ) -> Optional[Rendered]:
+        """Экран из кэша или результат build(); None от build() не кэшируется"""
+        cached = self.get(user_id, screen)
+        if cached is not None:
+            return cached
+
+        token = version_token(user_id)
+        value = await build()
+        if value is not None:
+            self.put(user_id, screen, value, token)
+        return value
+
+# Общий кэш для обработчиков
+render_cache = RenderCache()
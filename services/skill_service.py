@@ -1,28 +1,39 @@
 from typing import Tuple
 
-from models import Skill, Player, SessionMaker
+from sqlalchemy import update
 
-async def upgrade_skill(user_id: int, skill_name: str) -> Tuple[bool, int, int]:
-    """Улучшение навыка"""
-    with SessionMaker() as session:
-        skill = session.query(Skill).filter(
+from models import Skill, run_for_user
+from services.economy import debit
+from services.formulas import skill_upgrade_price
+from services.render_cache import bump_version
+
+def _upgrade_skill(session, user_id: int, skill_name: str) -> Tuple[bool, int, int]:
+    # Сначала повышаем уровень: UPDATE захватывает блокировку записи,
+    # поэтому параллельное улучшение дождется окончания этой транзакции
+    row = session.execute(
+        update(Skill).where(
             Skill.user_id == user_id,
             Skill.skill_name == skill_name
-        ).first()
-        
-        player = session.query(Player).filter(Player.user_id == user_id).first()
-        
-        if not skill or not player:
-            return False, 0, 0
-        
-        current_level = skill.skill_level
-        upgrade_cost = current_level * 200
-        
-        if player.money >= upgrade_cost:
-            skill.skill_level += 1
-            player.money -= upgrade_cost
-            session.commit()
-            
-            return True, skill.skill_level, upgrade_cost
-        else:
-            return False, current_level, upgrade_cost
\ No newline at end of file
+        ).values(
+            skill_level=Skill.skill_level + 1
+        ).returning(Skill.skill_level),
+        execution_options={"synchronize_session": False}
+    ).first()
+    
+    if not row:
+        return False, 0, 0
+    
+    current_level = row.skill_level - 1
+    upgrade_cost = skill_upgrade_price(current_level)
+    
+    if debit(session, user_id, upgrade_cost):
+        session.commit()
+        bump_version(user_id)
+        return True, row.skill_level, upgrade_cost
+    else:
+        session.rollback()
+        return False, current_level, upgrade_cost
+
+async def upgrade_skill(user_id: int, skill_name: str) -> Tuple[bool, int, int]:
+    """Улучшение навыка"""
+    return await run_for_user(_upgrade_skill, user_id, skill_name)
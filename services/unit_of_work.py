@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from models import DailyTask, Player
+from services.formulas import (
+    FAILURE_HEALTH_LOSS, REPUTATION_LOSS, health_after_damage, reputation_after_loss, reputation_after_success
+)
+from services.leaderboard import leaderboard
+from services.player_service import apply_experience
+from services.render_cache import bump_version
+
+class PlayerUnitOfWork:
+    """Единица работы над одним игроком в рамках одной сессии.
+
+    Игрок и его навыки загружаются одним запросом, задания на сегодня -
+    при первом обращении. Все изменения накапливаются в памяти и
+    записываются одним коммитом в commit(). Деньги, репутация и здоровье
+    серверов меняются только SQL-выражениями, чтобы не потерять параллельные
+    списания и изменения такта симуляции мира.
+    """
+
+    def __init__(self, session, user_id: int):
+        self.session = session
+        self.user_id = user_id
+        self.player: Optional[Player] = session.query(Player).options(
+            joinedload(Player.skills)
+        ).filter(Player.user_id == user_id).first()
+        self._tasks: Optional[List[DailyTask]] = None
+        self._experience_changed = False
+
+    def skill_level(self, skill_name: str) -> int:
+        """Уровень навыка игрока (1, если навык не найден)"""
+        for skill in self.player.skills:
+            if skill.skill_name == skill_name:
+                return skill.skill_level
+        return 1
+
+    @property
+    def today_tasks(self) -> List[DailyTask]:
+        """Задания игрока на сегодня (загружаются один раз)"""
+        if self._tasks is None:
+            today = datetime.now().date().isoformat()
+            self._tasks = self.session.query(DailyTask).filter(
+                DailyTask.user_id == self.user_id,
+                DailyTask.date_created == today
+            ).all()
+        return self._tasks
+
+    def add_experience(self, exp_gain: int) -> bool:
+        """Начисление опыта, возвращает признак повышения уровня"""
+        self._experience_changed = True
+        return apply_experience(self.player, exp_gain)
+
+    def record_outcome(self, success: bool) -> None:
+        """Обновление статистики решений, репутации и состояния серверов"""
+        player = self.player
+        if success:
+            player.successful_fixes += 1
+            # Увеличиваем репутацию при успехе
+            player.reputation = reputation_after_success(Player.reputation, minimum=func.min)
+        else:
+            player.failed_fixes += 1
+            # Снижаем репутацию при неудаче
+            player.reputation = reputation_after_loss(Player.reputation, REPUTATION_LOSS, maximum=func.max)
+
+            # Уменьшаем здоровье серверов при неудаче
+            player.server_health = health_after_damage(Player.server_health, FAILURE_HEALTH_LOSS, maximum=func.max)
+
+    def progress_task(self, task_type: str, progress: int = 1) -> bool:
+        """Обновление прогресса невыполненных заданий указанного типа"""
+        updated = False
+        for task in self.today_tasks:
+            if task.task_type == task_type and not task.completed:
+                task.current_amount += progress
+                if task.current_amount >= task.target_amount:
+                    task.completed = True
+                updated = True
+        return updated
+
+    def commit(self) -> None:
+        """Запись всех накопленных изменений одним коммитом"""
+        self.session.commit()
+        bump_version(self.user_id)
+        if self._experience_changed:
+            leaderboard.update(self.user_id, self.player.level, self.player.experience)
+            self._experience_changed = False
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, select, update
+
+from config import WORLD_TICK_INTERVAL, WORLD_TICK_CHUNK, WORLD_ACTIVE_DAYS
+from models import Player, router, run_on_shard
+from services.catalog import CrisisDef, get_catalog
+from services.checkpoints import load_checkpoint, save_checkpoint
+from services.economy import subtract_money
+from services.formulas import HEALTH_DECAY_PER_TICK, UPKEEP_PRICE, background_crisis_probability
+from services.render_cache import bump_epoch
+
+logger = logging.getLogger(__name__)
+
+JOB = "world_tick"
+
+# Случайное число SQLite переводится в [0, 1) с шагом 1e-6
+_ROLL_SCALE = 1000000
+
+class TickResult(NamedTuple):
+    """Итог такта симуляции мира"""
+    run_key: str
+    players: int
+    crises: int
+    chunks: int
+    elapsed: float
+
+def _floor_at_zero(expression):
+    return case((expression > 0, expression), else_=0)
+
+def _crisis_probability(crisis: CrisisDef, crises: Sequence[CrisisDef]):
+    return background_crisis_probability(
+        crisis.severity, [other.severity for other in crises], Player.server_health, Player.reputation
+    )
+
+def _tick_chunk(session, run_key: str, chunk_size: int, active_since: Optional[str]) -> Optional[tuple]:
+    checkpoint = load_checkpoint(session, JOB, run_key)
+    if checkpoint.finished:
+        return None
+
+    in_scope = [Player.user_id > checkpoint.position]
+    if active_since:
+        in_scope.append(Player.last_activity >= active_since)
+
+    # Верхняя граница пакета по первичному ключу
+    chunk_ids = select(Player.user_id).where(*in_scope).order_by(Player.user_id).limit(chunk_size).subquery()
+    last, players = session.execute(select(func.max(chunk_ids.c.user_id), func.count())).one()
+
+    if not players:
+        save_checkpoint(session, JOB, run_key, checkpoint.position, checkpoint.processed, finished=True)
+        session.commit()
+        return None
+
+    in_chunk = [*in_scope, Player.user_id <= last]
+
+    # Износ серверов и плата за их содержание - одно UPDATE на весь пакет
+    session.execute(
+        update(Player).where(*in_chunk).values(
+            server_health=_floor_at_zero(Player.server_health - HEALTH_DECAY_PER_TICK),
+            money=subtract_money(Player.servers * UPKEEP_PRICE)
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+    # Фоновые кризисы: по одному UPDATE на вид кризиса, random() вычисляется
+    # для каждой строки один раз в условии
+    crises = 0
+    catalog_crises = get_catalog(session).crises
+    for crisis in catalog_crises:
+        roll = func.abs(func.random()) % _ROLL_SCALE
+        crises += session.execute(
+            update(Player).where(
+                *in_chunk,
+                roll < _crisis_probability(crisis, catalog_crises) * _ROLL_SCALE
+            ).values(
+                server_health=_floor_at_zero(Player.server_health - crisis.server_damage),
+                money=subtract_money(crisis.money_loss),
+                reputation=_floor_at_zero(Player.reputation - crisis.reputation_loss)
+            ),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+
+    save_checkpoint(session, JOB, run_key, last, checkpoint.processed + players)
+    session.commit()
+    return players, crises
+
+async def run_world_tick(
+    run_key: Optional[str] = None,
+    chunk_size: int = WORLD_TICK_CHUNK,
+    active_days: int = WORLD_ACTIVE_DAYS
+) -> TickResult:
+    """Один такт симуляции мира для всех активных игроков.
+
+    Пакеты по chunk_size игроков обрабатываются множественными UPDATE без
+    загрузки строк в Python, каждый пакет - отдельная транзакция с
+    контрольной точкой. Прерванный такт с тем же run_key продолжается с
+    места остановки. active_days=0 - все игроки.
+    """
+    if not run_key:
+        # При выключенном фоновом такте каждый ручной запуск - отдельный такт
+        run_key = str(int(time.time() // WORLD_TICK_INTERVAL)) if WORLD_TICK_INTERVAL > 0 else f"manual-{time.time():.0f}"
+    active_since = None
+    if active_days:
+        active_since = (datetime.now() - timedelta(days=active_days)).isoformat()
+
+    async def tick_shard(shard: int) -> Tuple[int, int, int]:
+        players = crises = chunks = 0
+        while True:
+            chunk = await run_on_shard(shard, _tick_chunk, run_key, chunk_size, active_since)
+            if chunk is None:
+                return players, crises, chunks
+            players += chunk[0]
+            crises += chunk[1]
+            chunks += 1
+
+    # Шарды обрабатываются параллельно, у каждого своя контрольная точка
+    started = time.perf_counter()
+    totals = await asyncio.gather(*(tick_shard(shard) for shard in range(len(router))))
+    players, crises, chunks = (sum(column) for column in zip(*totals))
+
+    result = TickResult(run_key, players, crises, chunks, time.perf_counter() - started)
+    if chunks:
+        # Состояние изменилось у всех активных игроков: закэшированные экраны устарели
+        bump_epoch()
+        logger.info(
+            "Такт мира %s: %s игроков, %s кризисов, %s пакетов за %.1fс",
+            run_key, players, crises, chunks, result.elapsed
+        )
+    return result
+
+async def world_tick_loop(interval: float = WORLD_TICK_INTERVAL):
+    """Фоновые такты раз в interval секунд; ключ такта - номер интервала, поэтому после перезапуска такт продолжается.
+
+    interval <= 0 - такт выключен.
+    """
+    if interval <= 0:
+        logger.info("Такт симуляции мира выключен (WORLD_TICK_INTERVAL=0)")
+        return
+    while True:
+        try:
+            await run_world_tick(str(int(time.time() // interval)))
+        except Exception:
+            logger.exception("Ошибка такта симуляции мира")
+
+        await asyncio.sleep(interval - time.time() % interval)
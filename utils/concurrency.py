@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from utils.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничение числа одновременно обрабатываемых обновлений.
+
+    Подключается как outer-middleware к dp.update и ведет учет обновлений
+    в обработке, чтобы при остановке дождаться их завершения (drain).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.in_flight = 0
+        self.processed = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+            if self.in_flight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Дождаться завершения обновлений в обработке; False, если время вышло"""
+        if self.in_flight:
+            logger.info("Ожидание завершения %d обновлений", self.in_flight)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Не дождались завершения %d обновлений", self.in_flight)
+            return False
+
+class _UserLock:
+    """Блокировка игрока и число обновлений, которые ее держат или ждут"""
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class UserSerializationMiddleware(BaseMiddleware):
+    """Последовательная обработка обновлений одного игрока и отбрасывание повторных нажатий.
+
+    Подключается как outer-middleware к dp.update после ограничения
+    параллельности. Обновления разных игроков обрабатываются параллельно,
+    одного - по очереди. Блокировка игрока удаляется, когда ее никто не
+    ждет, поэтому таблица не больше числа обновлений в обработке.
+
+    Нажатие той же кнопки под тем же сообщением в течение window секунд
+    после предыдущего (двойной тап) не обрабатывается: на callback
+    ставится в очередь пустой ответ, чтобы кнопка не «висела». Последние нажатия
+    хранятся не более чем для max_tracked игроков.
+    """
+
+    def __init__(self, window: float, max_tracked: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_tracked = max_tracked
+        self.clock = clock
+        self._locks: Dict[int, _UserLock] = {}
+        # Игрок -> (callback_data, сообщение, время нажатия); порядок - по времени нажатия
+        self._taps: "OrderedDict[int, Tuple[str, Any, float]]" = OrderedDict()
+        self.updates = 0
+        self.waited = 0
+        self.duplicates = 0
+        self.max_locks = 0
+
+    def _is_duplicate(self, user_id: int, callback: CallbackQuery) -> bool:
+        if self.window <= 0 or callback.data is None:
+            return False
+        now = self.clock()
+        # Нажатия старше окна больше не нужны
+        while self._taps:
+            oldest = next(iter(self._taps.values()))
+            if now - oldest[2] < self.window and len(self._taps) < self.max_tracked:
+                break
+            self._taps.popitem(last=False)
+
+        message = callback.message.message_id if callback.message else callback.inline_message_id
+        last = self._taps.get(user_id)
+        if last is not None and last[0] == callback.data and last[1] == message:
+            return True
+        self._taps[user_id] = (callback.data, message, now)
+        self._taps.move_to_end(user_id)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        self.updates += 1
+        callback = event.callback_query if isinstance(event, Update) else None
+        if callback is not None and self._is_duplicate(user.id, callback):
+            self.duplicates += 1
+            outbox.send(callback.answer())
+            return UNHANDLED
+
+        entry = self._locks.get(user.id)
+        if entry is None:
+            entry = self._locks[user.id] = _UserLock()
+            self.max_locks = max(self.max_locks, len(self._locks))
+        if entry.lock.locked():
+            self.waited += 1
+        entry.users += 1
+        try:
+            async with entry.lock:
+                return await handler(event, data)
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._locks[user.id]
+
+    def stats(self) -> dict:
+        """Счетчики обновлений, ожиданий блокировки и отброшенных повторных нажатий"""
+        return {
+            'updates': self.updates,
+            'waited': self.waited,
+            'duplicates': self.duplicates,
+            'duplicate_rate': self.duplicates / self.updates if self.updates else 0.0,
+            'locks': len(self._locks),
+            'max_locks': self.max_locks,
+            'tracked_taps': len(self._taps),
+        }
@@ -1,10 +1,18 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, List, Mapping, Tuple
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List
 
 from models import Skill
 
-def get_main_keyboard() -> ReplyKeyboardMarkup:
-    """Создать основную клавиатуру с новыми кнопками"""
+if TYPE_CHECKING:
+    from services.catalog import IncidentDef
+
+# Клавиатуры кэшируются и отдаются нескольким обработчикам одновременно,
+# поэтому возвращаемые объекты нельзя изменять
+KEYBOARD_CACHE_SIZE = 1024
+
+def _build_main_keyboard() -> ReplyKeyboardMarkup:
     keyboard = [
         [
             KeyboardButton(text='🖥 Профиль'),
@@ -23,104 +31,112 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
             KeyboardButton(text='📈 Рейтинг')
         ]
     ]
-    
-    markup = ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
-    return markup
 
-def get_skills_keyboard(skills: List[Skill]) -> InlineKeyboardMarkup:
-    """Создать клавиатуру навыков"""
+    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+
+_MAIN_KEYBOARD = _build_main_keyboard()
+
+# Кнопка обновления под списком заданий одинакова для всех
+_REFRESH_TASKS_ROW = [
+    InlineKeyboardButton(
+        text="🔄 Обновить задания",
+        callback_data="refresh_tasks"
+    )
+]
+
+def get_main_keyboard() -> ReplyKeyboardMarkup:
+    """Основная клавиатура (строится один раз при импорте)"""
+    return _MAIN_KEYBOARD
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _skills_keyboard(levels: Tuple[Tuple[str, int], ...]) -> InlineKeyboardMarkup:
+    # Импорт здесь: пакет services сам импортирует utils.keyboards (клавиатуры решений в каталоге)
+    from services.formulas import skill_upgrade_price
+
     keyboard = []
-    
-    for skill in skills:
-        upgrade_cost = skill.skill_level * 200
+
+    for skill_name, skill_level in levels:
+        upgrade_cost = skill_upgrade_price(skill_level)
         keyboard.append([
             InlineKeyboardButton(
-                text=f"{skill.skill_name} (Уровень {skill.skill_level}) - Улучшить за ${upgrade_cost}",
-                callback_data=f"upgrade_{skill.skill_name}"
+                text=f"{skill_name} (Уровень {skill_level}) - Улучшить за ${upgrade_cost}",
+                callback_data=f"upgrade_{skill_name}"
             )
         ])
-    
-    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    return markup
 
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def get_skills_keyboard(skills: List[Skill]) -> InlineKeyboardMarkup:
+    """Создать клавиатуру навыков (кэшируется по набору уровней)"""
+    return _skills_keyboard(tuple((skill.skill_name, skill.skill_level) for skill in skills))
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_shop_keyboard(server_cost: int) -> InlineKeyboardMarkup:
-    """Создать клавиатуру магазина"""
+    """Создать клавиатуру магазина (кэшируется по цене сервера)"""
     keyboard = [[
         InlineKeyboardButton(
-            text=f"Купить сервер за ${server_cost}", 
+            text=f"Купить сервер за ${server_cost}",
             callback_data="buy_server"
         )
     ]]
-    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    return markup
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def get_incident_solutions_keyboard(incident) -> InlineKeyboardMarkup:
-    """Создать клавиатуру решений инцидента на основе возможных решений"""
+def build_solutions_keyboard(solutions: Mapping) -> InlineKeyboardMarkup:
+    """Клавиатура решений инцидента; каталог строит ее один раз для каждого инцидента"""
     keyboard = []
-    
-    # Получаем список решений из модели инцидента
-    solutions = incident.possible_solutions
-    
+
     # Создаем кнопки для каждого возможного решения
     for key, solution in solutions.items():
         keyboard.append([
             InlineKeyboardButton(
-                text=solution['name'], 
+                text=solution.name,
                 callback_data=f"solution_{key}"
             )
         ])
-    
-    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    return markup
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def get_incident_solutions_keyboard(incident: "IncidentDef") -> InlineKeyboardMarkup:
+    """Клавиатура решений инцидента из каталога (построена при загрузке каталога)"""
+    return incident.solutions_keyboard
 
 def get_daily_tasks_keyboard(tasks_data: List[dict]) -> InlineKeyboardMarkup:
     """Создать клавиатуру для заданий"""
+    # Кнопки наград зависят от идентификаторов заданий и не повторяются, поэтому не кэшируются
     keyboard = []
-    
+
     for task in tasks_data:
         if task['completed'] and not task.get('claimed', False):
             keyboard.append([
                 InlineKeyboardButton(
-                    text=f"Получить награду за '{task['description']}'", 
+                    text=f"Получить награду за '{task['description']}'",
                     callback_data=f"claim_task_{task['id']}"
                 )
             ])
-    
+
     # Добавляем кнопку обновления
-    keyboard.append([
-        InlineKeyboardButton(
-            text="🔄 Обновить задания",
-            callback_data="refresh_tasks"
-        )
-    ])
-    
-    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    return markup
+    keyboard.append(_REFRESH_TASKS_ROW)
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+# Варианты ремонта: текст кнопки, callback_data и делитель стоимости полного ремонта
+_REPAIR_OPTIONS: Iterable[Tuple[str, str, int]] = (
+    ("🔧 Полный ремонт", "repair_100", 1),
+    ("🔧 Средний ремонт (50%)", "repair_50", 2),
+    ("🔧 Минимальный ремонт (25%)", "repair_25", 4)
+)
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_maintenance_keyboard(repair_cost: int) -> InlineKeyboardMarkup:
-    """Создать клавиатуру для обслуживания серверов"""
-    keyboard = []
-    
-    # Добавляем кнопки с разными вариантами ремонта
-    repair_options = [
-        ("🔧 Полный ремонт", "repair_100"),
-        ("🔧 Средний ремонт (50%)", "repair_50"),
-        ("🔧 Минимальный ремонт (25%)", "repair_25")
-    ]
-    
-    for text, callback in repair_options:
-        cost = repair_cost
-        if callback == "repair_50":
-            cost = repair_cost // 2
-        elif callback == "repair_25":
-            cost = repair_cost // 4
-            
-        keyboard.append([
+    """Создать клавиатуру для обслуживания серверов (кэшируется по стоимости ремонта)"""
+    keyboard = [
+        [
             InlineKeyboardButton(
-                text=f"{text} - ${cost}", 
+                text=f"{text} - ${repair_cost // divisor}",
                 callback_data=callback
             )
-        ])
-    
-    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    return markup
+        ]
+        for text, callback, divisor in _REPAIR_OPTIONS
+    ]
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -0,0 +1,305 @@
+"""Метрики бота в текстовом формате Prometheus.
+
+Реестр metrics хранит счетчики, гистограммы и показатели, вычисляемые при
+запросе. setup_metrics подключает к диспетчеру замер обновлений и
+обработчиков (время, число и время SQL-запросов по роутерам) и поднимает
+локальный HTTP-сервер, например при METRICS_PORT=9100:
+
+    curl http://127.0.0.1:9100/metrics
+
+Модуль использует только стандартную библиотеку и aiogram; серверная часть
+aiohttp импортируется при запуске сервера.
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from config import METRICS_HOST, METRICS_PORT
+from models import database
+from models.database import count_queries
+from utils.outbox import outbox
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+    from utils.concurrency import ConcurrencyLimitMiddleware, UserSerializationMiddleware
+    from utils.profiler import SlowUpdateProfiler
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (секунды): обработка обновлений и отдельные SQL-запросы
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Счетчик с метками: растет только вверх"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Гистограмма с метками: счетчики по корзинам, сумма и количество наблюдений"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики по корзинам (последняя - +Inf), сумма]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Показатель, вычисляемый при каждом запросе метрик"""
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def render(self) -> List[str]:
+        try:
+            value = self.func()
+        except Exception:
+            logger.exception("Ошибка вычисления метрики %s", self.name)
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_format_value(value)}"]
+
+class MetricsRegistry:
+    """Метрики процесса; повторная регистрация имени возвращает существующую метрику"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        # Показатель заменяется: функция могла смениться вместе с диспетчером
+        self._metrics[name] = Gauge(name, help, func)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+# Метрики текущего процесса
+metrics = MetricsRegistry()
+
+update_seconds = metrics.histogram(
+    "bot_update_seconds", "Время обработки обновления целиком", ("type",)
+)
+handler_seconds = metrics.histogram(
+    "bot_handler_seconds", "Время обработчика с его middleware", ("router", "handler")
+)
+handler_errors = metrics.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("router", "handler")
+)
+handler_statements = metrics.counter(
+    "bot_handler_sql_statements_total", "SQL-запросы, выполненные обработчиком", ("router", "handler")
+)
+handler_sql_seconds = metrics.counter(
+    "bot_handler_sql_seconds_total", "Суммарное время SQL-запросов обработчика", ("router", "handler")
+)
+statement_seconds = metrics.histogram(
+    "db_statement_seconds", "Время выполнения SQL-запроса по виду", ("kind",), STATEMENT_BUCKETS
+)
+
+def _observe_statement(statement: str, seconds: float) -> None:
+    # Вид запроса - первое слово: SELECT, INSERT, UPDATE, DELETE, BEGIN...
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    statement_seconds.observe(seconds, kind)
+
+def instrument_sql() -> None:
+    """Замер времени каждого SQL-запроса во всех движках"""
+    database.on_statement = _observe_statement
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    """Outer-middleware dp.update: время обработки обновления по типу"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            kind = event.event_type if isinstance(event, Update) else type(event).__name__
+            update_seconds.observe(time.perf_counter() - started, kind)
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner-middleware: время и SQL-запросы обработчика с метками роутера и функции.
+
+    Подключается к наблюдателям диспетчера и поэтому оборачивает обработчики
+    всех вложенных роутеров; роутер определяется по его имени.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        router = data.get("event_router")
+        handler_object = data.get("handler")
+        labels = (
+            router.name if router is not None else "",
+            getattr(handler_object.callback, "__name__", "") if handler_object is not None else ""
+        )
+        started = time.perf_counter()
+        with count_queries() as queries:
+            try:
+                return await handler(event, data)
+            except Exception:
+                handler_errors.inc(1, *labels)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - started, *labels)
+                handler_statements.inc(queries.statements, *labels)
+                handler_sql_seconds.inc(queries.seconds, *labels)
+
+class MetricsServer:
+    """Локальный HTTP-сервер: /metrics и, если включен профилировщик, /profile"""
+
+    def __init__(self, host: str, port: int, profiler: Optional["SlowUpdateProfiler"] = None):
+        self.host = host
+        self.port = port
+        self.profiler = profiler
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def _metrics(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def _profile(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(text=self.profiler.folded(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        if self.profiler is not None:
+            app.router.add_get("/profile", self._profile)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host=self.host, port=self.port).start()
+        logger.info("Метрики: http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def setup_metrics(
+    dp: Dispatcher,
+    port: int = METRICS_PORT,
+    host: str = METRICS_HOST,
+    limiter: Optional["ConcurrencyLimitMiddleware"] = None,
+    serializer: Optional["UserSerializationMiddleware"] = None,
+    profiler: Optional["SlowUpdateProfiler"] = None
+) -> Optional[MetricsServer]:
+    """Замер обновлений, обработчиков и SQL; при port > 0 - сервер метрик на время работы диспетчера"""
+    instrument_sql()
+    if limiter is not None:
+        metrics.gauge("bot_updates_in_flight", "Обновления в обработке", lambda: limiter.in_flight)
+        metrics.gauge("bot_updates_processed", "Обработано обновлений с запуска", lambda: limiter.processed)
+    metrics.gauge("bot_outbox_queued", "Вызовы Bot API в исходящей очереди", lambda: outbox.stats()['queued'])
+    metrics.gauge("bot_outbox_retried", "Повторы вызовов Bot API после 429 и ошибок сети", lambda: outbox.stats()['retried'])
+    metrics.gauge("bot_outbox_failed", "Вызовы Bot API, завершившиеся ошибкой", lambda: outbox.stats()['failed'])
+    if serializer is not None:
+        metrics.gauge("bot_user_locks", "Игроки с обновлением в обработке", lambda: serializer.stats()['locks'])
+        metrics.gauge("bot_user_lock_waits", "Обновления, ждавшие предыдущее обновление игрока", lambda: serializer.waited)
+        metrics.gauge("bot_duplicate_callbacks", "Отброшенные повторные нажатия кнопок", lambda: serializer.duplicates)
+    dp.update.outer_middleware(UpdateTimingMiddleware())
+    timing = HandlerTimingMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(timing)
+
+    if port <= 0:
+        return None
+    server = MetricsServer(host, port, profiler)
+    dp.startup.register(server.start)
+    dp.shutdown.register(server.stop)
+    return server
@@ -0,0 +1,364 @@
+"""Исходящая очередь вызовов Bot API с учетом ограничений Telegram.
+
+Обработчик не ждет отправки: метод aiogram кладется в очередь и
+обработчик сразу завершается:
+
+    outbox.send(message.answer("..."))
+    outbox.send(call.answer())
+
+Фоновая задача отправляет вызовы с ограничением общей частоты и частоты
+на чат (ведра токенов). Сообщения и правки одного чата уходят по одному
+в порядке постановки. Между чатами первыми идут ответы на нажатия кнопок,
+затем новые сообщения, затем правки. На ответ 429 чат (или вся очередь,
+если вызов не относится к чату) ждет retry_after секунд, и вызов
+повторяется.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, EditMessageReplyMarkup, EditMessageText, TelegramMethod
+
+from config import OUTBOX_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Полосы по убыванию приоритета
+ANSWER = 0
+SEND = 1
+EDIT = 2
+
+def lane_of(method: TelegramMethod) -> int:
+    """Полоса вызова по его типу"""
+    if isinstance(method, AnswerCallbackQuery):
+        return ANSWER
+    if isinstance(method, (EditMessageText, EditMessageReplyMarkup)):
+        return EDIT
+    return SEND
+
+class TokenBucket:
+    """Ведро токенов: rate в секунду, не больше capacity подряд; rate <= 0 - без ограничения"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """Момент, когда появится токен"""
+        if self.rate <= 0:
+            return now
+        self._refill(now)
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+    def full_at(self, now: float) -> float:
+        """Момент, когда ведро наполнится"""
+        if self.rate <= 0:
+            return now
+        self._refill(now)
+        return now + (self.capacity - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+class OutboundCall:
+    """Вызов в очереди: метод, полоса, порядковый номер и результат"""
+    __slots__ = ("method", "chat_id", "lane", "seq", "attempts", "future")
+
+    def __init__(self, method: TelegramMethod, chat_id: Optional[int], lane: int, seq: int, future: asyncio.Future):
+        self.method = method
+        self.chat_id = chat_id
+        self.lane = lane
+        self.seq = seq
+        self.attempts = 0
+        self.future = future
+
+class _Chat:
+    """Очередь чата: вызовы по порядку, ведро токенов и ожидание после 429"""
+    __slots__ = ("calls", "bucket", "blocked_until", "busy", "scheduled")
+
+    def __init__(self, bucket: TokenBucket):
+        self.calls: Deque[OutboundCall] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+        self.scheduled = False
+
+class Outbox:
+    """Очередь исходящих вызовов с общим и по-чатовым ведрами токенов и полосами приоритета.
+
+    Результат вызова (объект Telegram или None при ошибке) доступен через
+    future, который возвращает send(); ошибки пишутся в лог и не
+    возвращаются обработчику. Состояние чата удаляется, когда его очередь
+    пуста и ведро снова полное. Время берется из clock.
+    """
+
+    def __init__(
+        self,
+        rate: float = OUTBOX_RATE,
+        chat_rate: float = OUTBOX_CHAT_RATE,
+        chat_burst: float = OUTBOX_CHAT_BURST,
+        max_retries: int = OUTBOX_MAX_RETRIES,
+        max_in_flight: int = 64,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.clock = clock
+        self.max_retries = max_retries
+        self.max_in_flight = max_in_flight
+        self.configure(rate, chat_rate, chat_burst)
+        self._chats: Dict[int, _Chat] = {}
+        # Чаты с пустой очередью -> момент, когда их ведро наполнится
+        self._idle: "OrderedDict[int, float]" = OrderedDict()
+        self._answers: Deque[OutboundCall] = deque()
+        # Готовые чаты по полосам: (номер головного вызова, чат); ждущие токена: (момент, номер, чат)
+        self._ready: Tuple[List, List, List] = ([], [], [])
+        self._delayed: List[Tuple[float, int, int]] = []
+        self._paused_until = 0.0
+        self._sending: Dict[int, OutboundCall] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.queued = 0
+        self.max_queued = 0
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.by_lane = [0, 0, 0]
+
+    def configure(self, rate: float, chat_rate: float, chat_burst: float) -> None:
+        """Новые ограничения частоты; 0 - без ограничения"""
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._bucket = TokenBucket(rate, rate, self.clock())
+
+    def __len__(self) -> int:
+        return self.queued
+
+    # Постановка в очередь
+
+    def send(self, method: TelegramMethod, lane: Optional[int] = None) -> asyncio.Future:
+        """Поставить вызов в очередь; возвращает future с результатом"""
+        loop = asyncio.get_running_loop()
+        if self._runner is None:
+            self._start(loop)
+        lane = lane_of(method) if lane is None else lane
+        chat_id = getattr(method, "chat_id", None) if lane != ANSWER else None
+        call = OutboundCall(method, chat_id, lane, next(self._seq), loop.create_future())
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+
+        if chat_id is None:
+            self._answers.append(call)
+        else:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                self._idle.pop(chat_id, None)
+                chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst, self.clock()))
+            chat.calls.append(call)
+            self._schedule(chat_id, chat, self.clock())
+        self._wakeup.set()
+        return call.future
+
+    def _schedule(self, chat_id: int, chat: _Chat, now: float) -> None:
+        if chat.busy or chat.scheduled or not chat.calls:
+            return
+        chat.scheduled = True
+        head = chat.calls[0]
+        at = max(chat.bucket.ready_at(now), chat.blocked_until)
+        if at <= now:
+            heapq.heappush(self._ready[head.lane], (head.seq, chat_id))
+        else:
+            heapq.heappush(self._delayed, (at, head.seq, chat_id))
+
+    # Отправка
+
+    def _promote(self, now: float) -> None:
+        # Чаты, дождавшиеся токена или конца паузы после 429
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self._delayed)
+            chat = self._chats[chat_id]
+            chat.scheduled = False
+            self._schedule(chat_id, chat, now)
+
+    def _next(self, now: float) -> OutboundCall:
+        if self._answers:
+            return self._answers.popleft()
+        for ready in self._ready:
+            if ready:
+                _, chat_id = heapq.heappop(ready)
+                chat = self._chats[chat_id]
+                chat.scheduled = False
+                chat.busy = True
+                chat.bucket.take(now)
+                return chat.calls[0]
+        raise LookupError("очередь пуста")
+
+    def _dispatch(self) -> Optional[float]:
+        """Отправить все, что разрешают ведра; возвращает время до следующей попытки"""
+        while True:
+            now = self.clock()
+            self._forget_idle(now)
+            self._promote(now)
+            if len(self._sending) >= self.max_in_flight:
+                return None
+            has_work = self._answers or any(self._ready)
+            if not has_work:
+                return max(0.0, self._delayed[0][0] - now) if self._delayed else None
+            at = max(self._bucket.ready_at(now), self._paused_until)
+            if at > now:
+                return at - now
+            call = self._next(now)
+            self._bucket.take(now)
+            self._sending[call.seq] = call
+            asyncio.create_task(self._send(call))
+
+    async def _send(self, call: OutboundCall) -> None:
+        result = None
+        sent = False
+        retry_after = None
+        try:
+            result = await call.method
+            sent = True
+        except TelegramRetryAfter as error:
+            retry_after = error.retry_after
+        except TelegramNetworkError as error:
+            logger.warning("Ошибка сети при вызове %s: %s", type(call.method).__name__, error)
+            retry_after = call.attempts + 1
+        except Exception as error:
+            logger.warning("Ошибка вызова %s: %s", type(call.method).__name__, error)
+        del self._sending[call.seq]
+
+        now = self.clock()
+        chat = self._chats.get(call.chat_id) if call.chat_id is not None else None
+        if retry_after is not None and call.attempts < self.max_retries:
+            call.attempts += 1
+            self.retried += 1
+            if chat is not None:
+                # Вызов остается первым в очереди чата
+                chat.blocked_until = now + retry_after
+                chat.busy = False
+                self._schedule(call.chat_id, chat, now)
+            else:
+                self._paused_until = now + retry_after
+                self._answers.appendleft(call)
+            self._wakeup.set()
+            return
+
+        if sent:
+            self.sent += 1
+            self.by_lane[call.lane] += 1
+        else:
+            self.failed += 1
+            if retry_after is not None:
+                logger.warning("Вызов %s отброшен после %d повторов", type(call.method).__name__, call.attempts)
+        self.queued -= 1
+        call.future.set_result(result)
+        if chat is not None:
+            chat.calls.popleft()
+            chat.busy = False
+            if chat.calls:
+                self._schedule(call.chat_id, chat, now)
+            else:
+                self._idle[call.chat_id] = chat.bucket.full_at(now)
+        self._wakeup.set()
+
+    def _forget_idle(self, now: float) -> None:
+        while self._idle:
+            chat_id, full_at = next(iter(self._idle.items()))
+            if full_at > now:
+                break
+            del self._idle[chat_id]
+            chat = self._chats.get(chat_id)
+            if chat is not None and not chat.calls and not chat.busy:
+                del self._chats[chat_id]
+
+    async def _run(self) -> None:
+        while True:
+            timeout = self._dispatch()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._wakeup = asyncio.Event()
+        self._runner = loop.create_task(self._run())
+
+    # Запуск и остановка
+
+    async def start(self) -> None:
+        """Запуск фоновой отправки (send запускает ее и сам)"""
+        if self._runner is None:
+            self._start(asyncio.get_running_loop())
+
+    async def flush(self, chat_id: Optional[int] = None) -> None:
+        """Дождаться отправки всех вызовов в очереди (или вызовов чата chat_id)"""
+        if chat_id is not None:
+            chat = self._chats.get(chat_id)
+            futures = [call.future for call in chat.calls] if chat is not None else []
+        else:
+            futures = [call.future for call in self._answers]
+            futures += [call.future for call in self._sending.values()]
+            futures += [call.future for chat in self._chats.values() for call in chat.calls]
+        if futures:
+            await asyncio.gather(*futures)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Остановка: очередь отправляется до timeout секунд, оставшиеся вызовы отбрасываются"""
+        if self._runner is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не отправлено вызовов Bot API при остановке: %d", self.queued)
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        self._wakeup = None
+
+        # Неотправленные вызовы завершаются без результата
+        for call in itertools.chain(self._answers, *(chat.calls for chat in self._chats.values())):
+            if not call.future.done():
+                call.future.set_result(None)
+        self._answers.clear()
+        self._chats.clear()
+        self._idle.clear()
+        self._ready = ([], [], [])
+        self._delayed.clear()
+        self.queued = len(self._sending)
+
+    def stats(self) -> dict:
+        """Счетчики отправки"""
+        return {
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'chats': len(self._chats),
+            'sent': self.sent,
+            'answers': self.by_lane[ANSWER],
+            'messages': self.by_lane[SEND],
+            'edits': self.by_lane[EDIT],
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+# Общая очередь для обработчиков
+outbox = Outbox()
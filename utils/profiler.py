@@ -0,0 +1,150 @@
+"""Выборочный профилировщик самых долгих обновлений.
+
+Фоновый поток раз в interval секунд снимает стек потока цикла событий и
+относит его к обновлению, чья корутина выполняется в этот момент; пока
+обновление ждет (базу, Bot API, другие задачи), ему засчитывается
+выборка «(ожидание)». Для keep самых долгих обновлений стеки хранятся в
+свернутом формате flamegraph.pl / speedscope:
+
+    update_42_830ms;handlers.incidents.process_solution;... 17
+
+Отчет отдается сервером метрик (/profile) и записывается в каталог при
+остановке бота. Интервал короче sys.getswitchinterval() (5 мс) не дает
+точности: пока цикл событий вычисляет, поток выборки ждет GIL.
+"""
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from config import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_KEEP
+
+logger = logging.getLogger(__name__)
+
+# Выборка, когда корутина обновления не выполняется
+WAITING = "(ожидание)"
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+class SlowUpdateProfiler(BaseMiddleware):
+    """Outer-middleware dp.update и поток выборки стеков"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, keep: int = PROFILE_KEEP):
+        self.interval = interval
+        self.keep = keep
+        self.samples = 0
+        # Кадр middleware обновления в обработке -> выборки его стеков
+        self._active: Dict[Any, Counter] = {}
+        # Самые долгие обновления: куча (время, порядковый номер, update_id, выборки)
+        self._slowest: List[Tuple[float, int, int, Counter]] = []
+        self._order = itertools.count()
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Кадр этого вызова есть в стеке, только пока выполняется корутина обновления
+        frame = sys._getframe()
+        stacks = Counter()
+        self._active[frame] = stacks
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            del self._active[frame]
+            update_id = event.update_id if isinstance(event, Update) else 0
+            self._remember(time.perf_counter() - started, update_id, stacks)
+
+    def _remember(self, elapsed: float, update_id: int, stacks: Counter) -> None:
+        item = (elapsed, next(self._order), update_id, stacks)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, item)
+        elif elapsed > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self._thread_id)
+        running = None
+        names = []
+        while frame is not None:
+            running = self._active.get(frame)
+            if running is not None:
+                break
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if running is not None and names:
+            running[";".join(reversed(names))] += 1
+        # Словарь меняется в потоке цикла событий: копия снимается одной операцией
+        for stacks in tuple(self._active.values()):
+            if stacks is not running:
+                stacks[WAITING] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    async def start(self) -> None:
+        """Запуск потока выборки; вызывается в потоке цикла событий"""
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def slowest(self) -> List[Tuple[float, int, Counter]]:
+        """Самые долгие обновления по убыванию времени: (секунды, update_id, стеки)"""
+        return [(elapsed, update_id, stacks) for elapsed, _, update_id, stacks in sorted(self._slowest, reverse=True)]
+
+    def folded(self) -> str:
+        """Стеки самых долгих обновлений одним отчетом; корень стека - обновление и его время"""
+        lines = []
+        for elapsed, update_id, stacks in self.slowest():
+            root = f"update_{update_id}_{elapsed * 1000:.0f}ms"
+            lines.extend(f"{root};{stack} {count}" for stack, count in stacks.most_common())
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def dump(self, directory: str = PROFILE_DIR) -> List[str]:
+        """Запись стеков каждого из самых долгих обновлений в отдельный файл"""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for rank, (elapsed, update_id, stacks) in enumerate(self.slowest(), 1):
+            path = os.path.join(directory, f"{rank:02d}-update-{update_id}-{elapsed * 1000:.0f}ms.folded")
+            with open(path, "w", encoding="utf-8") as file:
+                file.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            paths.append(path)
+        return paths
+
+def setup_profiler(dp: Dispatcher, directory: str = PROFILE_DIR) -> SlowUpdateProfiler:
+    """Профилирование обновлений диспетчера; стеки записываются в directory при остановке"""
+    profiler = SlowUpdateProfiler()
+    dp.update.outer_middleware(profiler)
+
+    async def dump():
+        await profiler.stop()
+        paths = profiler.dump(directory)
+        logger.info("Стеки %d самых долгих обновлений записаны в %s (%d выборок)", len(paths), directory, profiler.samples)
+
+    dp.startup.register(profiler.start)
+    dp.shutdown.register(dump)
+    return profiler
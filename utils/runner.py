@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import signal
+from typing import TYPE_CHECKING
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import (
+    BOT_TOKEN, DROP_PENDING_UPDATES, TELEGRAM_API_URL, MAX_CONCURRENT_UPDATES, SHUTDOWN_DRAIN_TIMEOUT,
+    DUPLICATE_CALLBACK_WINDOW, OUTBOX_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT
+)
+from utils.concurrency import ConcurrencyLimitMiddleware, UserSerializationMiddleware
+from utils.outbox import Outbox, outbox
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+def create_bot(token: str = BOT_TOKEN, api_url: str = TELEGRAM_API_URL) -> Bot:
+    """Создание бота; api_url позволяет работать через локальный Bot API сервер"""
+    if api_url:
+        return Bot(token=token, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    return Bot(token=token)
+
+def setup_concurrency(dp: Dispatcher, limit: int = MAX_CONCURRENT_UPDATES) -> ConcurrencyLimitMiddleware:
+    """Ограничение параллельной обработки и ожидание незавершенных обновлений при остановке"""
+    limiter = ConcurrencyLimitMiddleware(limit)
+    dp.update.outer_middleware(limiter)
+
+    async def drain_updates():
+        await limiter.drain(SHUTDOWN_DRAIN_TIMEOUT)
+
+    dp.shutdown.register(drain_updates)
+    return limiter
+
+def setup_user_serialization(dp: Dispatcher, window: float = DUPLICATE_CALLBACK_WINDOW) -> UserSerializationMiddleware:
+    """Обновления игрока по очереди, повторные нажатия кнопок отбрасываются; после setup_concurrency"""
+    serializer = UserSerializationMiddleware(window)
+    dp.update.outer_middleware(serializer)
+    return serializer
+
+def setup_outbox(
+    dp: Dispatcher,
+    rate: float = OUTBOX_RATE,
+    chat_rate: float = OUTBOX_CHAT_RATE,
+    chat_burst: float = OUTBOX_CHAT_BURST
+) -> Outbox:
+    """Исходящая очередь: запуск вместе с ботом, отправка остатка после завершения обновлений"""
+    outbox.configure(rate, chat_rate, chat_burst)
+
+    async def stop_outbox():
+        await outbox.stop(SHUTDOWN_DRAIN_TIMEOUT)
+
+    dp.startup.register(outbox.start)
+    dp.shutdown.register(stop_outbox)
+    return outbox
+
+async def run_polling(dp: Dispatcher, bot: Bot):
+    """Получение обновлений через long polling"""
+    await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+    await dp.start_polling(bot)
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET) -> "web.Application":
+    """aiohttp-приложение, принимающее обновления от Telegram"""
+    # Серверная часть aiohttp нужна только вебхуку и не замедляет запуск в режиме polling
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+    from aiohttp import web
+
+    app = web.Application()
+    # Сначала завершение диспетчера (ожидание обновлений), затем закрытие сессии бота
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret or None).register(app, path=path)
+    return app
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Получение обновлений через вебхук на встроенном aiohttp-сервере"""
+    from aiohttp import web
+
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL не задан для режима webhook")
+
+    async def set_webhook():
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=min(100, MAX_CONCURRENT_UPDATES),
+            drop_pending_updates=DROP_PENDING_UPDATES
+        )
+
+    dp.startup.register(set_webhook)
+
+    runner = web.AppRunner(create_webhook_app(dp, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT)
+    await site.start()
+    logger.info("Вебхук слушает %s:%s%s", WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_PATH)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        # Вебхук не удаляем: пока бот перезапускается, Telegram копит обновления
+        await runner.cleanup()
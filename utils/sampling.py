@@ -0,0 +1,66 @@
+import random
+from typing import Generic, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+class AliasTable:
+    """Таблица псевдонимов Уолкера-Воуза для выбора индекса по весам за O(1).
+
+    Построение занимает O(n), после этого каждый выбор - два случайных числа
+    и одно сравнение, независимо от размера каталога.
+    """
+    __slots__ = ("_probability", "_alias", "_size")
+
+    def __init__(self, weights: Sequence[float]):
+        size = len(weights)
+        total = float(sum(weights))
+        if size == 0 or total <= 0:
+            raise ValueError("Нужен хотя бы один положительный вес")
+
+        scaled = [weight * size / total for weight in weights]
+        probability = [0.0] * size
+        alias = [0] * size
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Остатки из-за погрешности округления считаются полными ячейками
+        for index in large + small:
+            probability[index] = 1.0
+            alias[index] = index
+
+        self._probability = probability
+        self._alias = alias
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def sample(self, rng: random.Random = random) -> int:
+        """Случайный индекс с вероятностью, пропорциональной весу"""
+        column = int(rng.random() * self._size)
+        if rng.random() < self._probability[column]:
+            return column
+        return self._alias[column]
+
+class WeightedSampler(Generic[T]):
+    """Взвешенный выбор элементов по заранее построенной таблице псевдонимов"""
+    __slots__ = ("items", "_table")
+
+    def __init__(self, items: Sequence[T], weights: Sequence[float] = None):
+        self.items: List[T] = list(items)
+        self._table = AliasTable(weights if weights is not None else [1] * len(self.items))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def choice(self, rng: random.Random = random) -> T:
+        """Случайный элемент с учетом весов"""
+        return self.items[self._table.sample(rng)]
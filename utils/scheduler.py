@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class VirtualClock:
+    """Часы для проверок: время меняется только через advance()"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> float:
+        self.now += seconds
+        return self.now
+
+class ScheduledJob:
+    """Отложенный вызов в очереди планировщика"""
+    __slots__ = ("when", "seq", "callback", "args", "key", "cancelled")
+
+    def __init__(self, when: float, seq: int, callback: Callable[..., Awaitable[Any]], args: tuple, key: Optional[Hashable]):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.cancelled = False
+
+    def __lt__(self, other: "ScheduledJob") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+class Scheduler:
+    """Общий планировщик отложенных сообщений на одной куче и одной фоновой задаче.
+
+    Вместо asyncio.sleep в обработчике задание кладется в кучу по времени
+    срабатывания (O(log n)), и обработчик сразу завершается. Отмененные
+    задания удаляются лениво: куча перестраивается, когда их становится
+    больше половины. Задание с ключом заменяет предыдущее с тем же ключом.
+    Время берется из clock, поэтому с VirtualClock и run_due() планировщик
+    проверяется без реального ожидания.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap: List[ScheduledJob] = []
+        self._keys: Dict[Hashable, ScheduledJob] = {}
+        self._seq = itertools.count()
+        self._cancelled_in_heap = 0
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled_in_heap
+
+    def call_later(self, delay: float, callback: Callable[..., Awaitable[Any]], *args, key: Optional[Hashable] = None) -> ScheduledJob:
+        """Вызвать callback(*args) через delay секунд"""
+        if key is not None:
+            self.cancel(key)
+
+        job = ScheduledJob(self.clock() + delay, next(self._seq), callback, args, key)
+        heapq.heappush(self._heap, job)
+        if key is not None:
+            self._keys[key] = job
+        self.scheduled += 1
+
+        # Фоновая задача пересчитывает ожидание, если новое задание стало ближайшим
+        if self._wakeup is not None and self._heap[0] is job:
+            self._wakeup.set()
+        return job
+
+    def cancel(self, key: Hashable) -> bool:
+        """Отменить задание с ключом; False, если такого нет"""
+        job = self._keys.pop(key, None)
+        if job is None:
+            return False
+        self._discard(job)
+        return True
+
+    def _discard(self, job: ScheduledJob) -> None:
+        job.cancelled = True
+        self._cancelled_in_heap += 1
+        self.cancelled += 1
+        if self._cancelled_in_heap > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if not entry.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled_in_heap = 0
+
+    def _pop(self) -> ScheduledJob:
+        job = heapq.heappop(self._heap)
+        if job.cancelled:
+            self._cancelled_in_heap -= 1
+        elif job.key is not None and self._keys.get(job.key) is job:
+            del self._keys[job.key]
+        return job
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Запустить задания со временем срабатывания не позже now, возвращает их число"""
+        now = self.clock() if now is None else now
+        started = 0
+        while self._heap and self._heap[0].when <= now:
+            job = self._pop()
+            if job.cancelled:
+                continue
+            task = asyncio.create_task(self._call(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            started += 1
+        return started
+
+    async def fire(self, key: Hashable) -> bool:
+        """Выполнить задание с ключом немедленно и дождаться его; False, если такого нет"""
+        job = self._keys.pop(key, None)
+        if job is None:
+            return False
+        # Запись в куче остается и будет пропущена как отмененная
+        job.cancelled = True
+        self._cancelled_in_heap += 1
+        await self._call(job)
+        return True
+
+    async def _call(self, job: ScheduledJob):
+        self.fired += 1
+        try:
+            await job.callback(*job.args)
+        except Exception:
+            self.failed += 1
+            logger.exception("Ошибка отложенного задания %s", job.key or job.callback)
+
+    async def _run(self):
+        while True:
+            self.run_due()
+            timeout = max(0.0, self._heap[0].when - self.clock()) if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        """Запуск фоновой задачи"""
+        if self._runner is None:
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self, run_pending: bool = True, timeout: float = 10.0) -> None:
+        """Остановка: оставшиеся задания выполняются сразу (или отбрасываются), выполняемые дожидаются"""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+            self._wakeup = None
+
+        if run_pending:
+            self.run_due(math.inf)
+        else:
+            self._heap.clear()
+            self._keys.clear()
+            self._cancelled_in_heap = 0
+
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=timeout)
+
+    def stats(self) -> dict:
+        """Счетчики планировщика"""
+        return {
+            'pending': len(self),
+            'scheduled': self.scheduled,
+            'fired': self.fired,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+            'running': len(self._running),
+        }
+
+# Общий планировщик для обработчиков
+scheduler = Scheduler()
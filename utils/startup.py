@@ -0,0 +1,178 @@
+"""Замер времени запуска бота.
+
+Обычный запуск записывает длительность этапов инициализации и момент,
+когда бот начинает принимать обновления. Режим профилирования
+дополнительно замеряет импорт каждого модуля:
+
+    python -m utils.startup [--top 20]
+
+Модуль использует только стандартную библиотеку и импортируется в main.py
+первым, чтобы отсчет начинался до тяжелых импортов.
+"""
+import importlib.abc
+import logging
+import os
+import runpy
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class _TimedLoader(importlib.abc.Loader):
+    """Обертка загрузчика: замеряет выполнение кода модуля"""
+
+    def __init__(self, loader, profile: "StartupProfile"):
+        self._loader = loader
+        self._profile = profile
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profile._enter_import()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profile._exit_import(module.__name__)
+
+    def __getattr__(self, name):
+        # get_data, get_resource_reader и прочее - у исходного загрузчика
+        return getattr(self._loader, name)
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Находит модуль остальными искателями и подменяет загрузчик на замеряющий"""
+
+    def __init__(self, profile: "StartupProfile"):
+        self._profile = profile
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self._profile)
+            return spec
+        return None
+
+class StartupProfile:
+    """Время запуска: собственное время импорта модулей, этапы инициализации и готовность.
+
+    Время импорта модуля не включает вложенные импорты, поэтому сумма по
+    модулям равна общему времени импорта.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.imports: Dict[str, float] = {}
+        self.phases: List[Tuple[str, float]] = []
+        self.ready_after: Optional[float] = None
+        # Число строк в разделах отчета
+        self.top = 15
+        self._stack: List[List[float]] = []
+        self._finder: Optional[_TimingFinder] = None
+
+    # Импорт
+
+    def install_import_hook(self) -> None:
+        if self._finder is None:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def remove_import_hook(self) -> None:
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def _enter_import(self) -> None:
+        # [начало, время вложенных импортов]
+        self._stack.append([self.clock(), 0.0])
+
+    def _exit_import(self, name: str) -> None:
+        started, nested = self._stack.pop()
+        total = self.clock() - started
+        self.imports[name] = self.imports.get(name, 0.0) + total - nested
+        if self._stack:
+            self._stack[-1][1] += total
+
+    # Инициализация
+
+    def mark_imported(self) -> None:
+        """Конец импорта модулей: время от запуска записывается первым этапом"""
+        self.phases.append(("импорт", self.clock() - self.started))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замер этапа инициализации"""
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.phases.append((name, self.clock() - started))
+
+    def mark_ready(self, target: Optional[float] = None) -> float:
+        """Отметка готовности принимать обновления; в режиме профилирования выводится отчет"""
+        self.ready_after = self.clock() - self.started
+        phases = ", ".join(f"{name} {elapsed:.2f}с" for name, elapsed in self.phases)
+        logger.info("Бот принимает обновления через %.2fс после запуска (%s)", self.ready_after, phases)
+        if target is not None and self.ready_after > target:
+            logger.warning("Запуск дольше цели: %.2fс при цели %.2fс", self.ready_after, target)
+        if self._finder is not None:
+            self.remove_import_hook()
+            logger.info("Профиль запуска:\n%s", self.report())
+        return self.ready_after
+
+    def report(self, top: Optional[int] = None) -> str:
+        """Текстовый отчет: импорт по пакетам и модулям, этапы инициализации"""
+        top = top or self.top
+        lines = []
+        if self.imports:
+            packages: Dict[str, float] = defaultdict(float)
+            for name, elapsed in self.imports.items():
+                packages[name.partition(".")[0]] += elapsed
+            lines.append(f"Импорт: {len(self.imports)} модулей, {sum(self.imports.values()):.2f}с")
+            lines.append("  по пакетам:")
+            for name, elapsed in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+                lines.append(f"    {name:<40} {elapsed * 1000:>9.1f} мс")
+            lines.append("  самые долгие модули:")
+            for name, elapsed in sorted(self.imports.items(), key=lambda item: -item[1])[:top]:
+                lines.append(f"    {name:<40} {elapsed * 1000:>9.1f} мс")
+        if self.phases:
+            lines.append("Инициализация:")
+            for name, elapsed in self.phases:
+                lines.append(f"    {name:<40} {elapsed * 1000:>9.1f} мс")
+        if self.ready_after is not None:
+            lines.append(f"Готов принимать обновления через {self.ready_after:.2f}с")
+        return "\n".join(lines)
+
+# Профиль текущего процесса
+startup = StartupProfile()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Запуск main.py с профилированием импорта и инициализации")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # Модуль запущен как __main__: main.py получит свой экземпляр utils.startup,
+    # поэтому замер ведется в нем с отсчетом от запуска этого процесса
+    from utils import startup as module
+
+    module.startup.started = startup.started
+    module.startup.install_import_hook()
+    module.startup.top = args.top
+
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    sys.argv = [path]
+    runpy.run_path(path, run_name="__main__")
+
+if __name__ == "__main__":
+    main()
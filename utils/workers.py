@@ -0,0 +1,316 @@
+"""Несколько процессов-обработчиков обновлений.
+
+Супервизор получает обновления (long polling или вебхук) без разбора в
+модели aiogram и раздает их воркерам по user_id: игрока всегда
+обслуживает один и тот же процесс, поэтому порядок его обновлений и кэши
+в памяти (экраны, состояния FSM) остаются согласованными. Незавершенные
+инциденты и состояния FSM хранятся в базе, изменения рейтинга, сброс
+эпохи кэша экранов и перезагрузка каталога рассылаются остальным воркерам.
+Упавший воркер перезапускается с новыми очередями: процесс, убитый во
+время чтения очереди, оставляет ее заблокированной, поэтому обновления,
+еще не взятые им из очереди, теряются.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import aiohttp
+from aiohttp import web
+
+from config import (
+    BOT_TOKEN, RUN_MODE, DROP_PENDING_UPDATES, TELEGRAM_API_URL, MAX_CONCURRENT_UPDATES, SHUTDOWN_DRAIN_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT, WORKERS, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT
+)
+
+logger = logging.getLogger(__name__)
+
+# Сообщения в очередях воркера (обновления и события от него): (вид, данные) или None - остановка
+UPDATES = "updates"
+RATING = "rating"
+EPOCH = "epoch"
+CATALOG = "catalog"
+READY = "ready"
+
+# Таймаут long polling супервизора (секунды)
+POLLING_TIMEOUT = 10
+
+# Минимальное ожидание блокировки SQLite в воркерах (мс): писатели нескольких
+# процессов ждут друг друга, и при очереди записей 5 секунд не хватает
+WORKER_BUSY_TIMEOUT = 30000
+
+class WorkerChannel(NamedTuple):
+    """Очереди воркера: обновления и события от супервизора, события от воркера"""
+    index: int
+    updates: Any
+    events: Any
+
+def update_user_id(update: dict) -> Optional[int]:
+    """user_id автора обновления без разбора в модели aiogram"""
+    for key, value in update.items():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user")
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+    return None
+
+def worker_for(update: dict, count: int) -> int:
+    """Номер воркера для обновления; обновления без автора делятся по update_id"""
+    user_id = update_user_id(update)
+    return (user_id if user_id is not None else update.get("update_id", 0)) % count
+
+async def serve_worker(dp, bot, channel: WorkerChannel) -> None:
+    """Обработка обновлений из очереди воркера до сообщения об остановке"""
+    from services import catalog, render_cache
+    from services.leaderboard import leaderboard
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    tasks = set()
+
+    def publish(kind: str, *payload) -> None:
+        channel.events.put((kind, payload))
+
+    leaderboard.on_change = lambda *change: publish(RATING, *change)
+    render_cache.on_epoch = lambda: publish(EPOCH)
+    catalog.on_reload = lambda: publish(CATALOG)
+
+    async def feed(update: dict) -> None:
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception("Ошибка обработки обновления %s", update.get("update_id"))
+
+    def feed_batch(updates: List[dict]) -> None:
+        for update in updates:
+            task = asyncio.create_task(feed(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    def apply_rating(user_id: int, level: Optional[int], experience: Optional[int]) -> None:
+        if level is None:
+            leaderboard.remove(user_id, publish=False)
+        else:
+            leaderboard.update(user_id, level, experience, publish=False)
+
+    def receive() -> None:
+        # Отдельный поток: блокирующее чтение очереди не задерживает цикл событий
+        while True:
+            message = channel.updates.get()
+            if message is None:
+                loop.call_soon_threadsafe(stopped.set)
+                return
+            kind, payload = message
+            if kind == UPDATES:
+                loop.call_soon_threadsafe(feed_batch, payload)
+            elif kind == RATING:
+                apply_rating(*payload)
+            elif kind == EPOCH:
+                loop.call_soon_threadsafe(render_cache.bump_epoch, False)
+            elif kind == CATALOG:
+                asyncio.run_coroutine_threadsafe(catalog.reload_catalog(publish=False), loop)
+
+    workflow_data = {"dispatcher": dp, "bots": [bot]}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    threading.Thread(target=receive, name=f"worker-{channel.index}-queue", daemon=True).start()
+    publish(READY)
+    logger.info("Воркер %s принимает обновления", channel.index)
+    try:
+        await stopped.wait()
+    finally:
+        # Остановка диспетчера дожидается обновлений в обработке
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+
+def _run_target(target: Callable[[WorkerChannel], None], channel: WorkerChannel) -> None:
+    # Ctrl+C приходит всей группе процессов, воркер останавливает супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(channel)
+
+class Supervisor:
+    """Процессы-воркеры, раздача им обновлений и пересылка событий между ними"""
+
+    def __init__(self, target: Callable[[WorkerChannel], None], count: int = WORKERS):
+        self.target = target
+        self.count = count
+        self._context = multiprocessing.get_context("spawn")
+        self.channels: List[Optional[WorkerChannel]] = [None] * count
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * count
+        self.dispatched = [0] * count
+        self.restarts = 0
+        self._ready = set()
+
+    def _spawn(self, index: int) -> None:
+        channel = WorkerChannel(index, self._context.Queue(), self._context.Queue())
+        self.channels[index] = channel
+        process = self._context.Process(target=_run_target, args=(self.target, channel), name=f"bot-worker-{index}")
+        process.start()
+        self.processes[index] = process
+        threading.Thread(target=self._relay_events, args=(channel,), name=f"worker-{index}-events", daemon=True).start()
+
+    def start(self) -> None:
+        for index in range(self.count):
+            self._spawn(index)
+
+    def _relay_events(self, channel: WorkerChannel) -> None:
+        # Поток завершается по None при остановке или после замены канала перезапуском воркера
+        while self.channels[channel.index] is channel:
+            try:
+                message = channel.events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+            kind, payload = message
+            if kind == READY:
+                self._ready.add(channel.index)
+                continue
+            # Каналы еще не запущенных воркеров - None
+            for other in self.channels:
+                if other is not None and other.index != channel.index:
+                    other.updates.put((kind, payload))
+
+    async def wait_ready(self, timeout: float = 120) -> bool:
+        """Ожидание готовности всех воркеров"""
+        deadline = time.monotonic() + timeout
+        while len(self._ready) < self.count:
+            if time.monotonic() > deadline:
+                logger.warning("Готовы %s из %s воркеров", len(self._ready), self.count)
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def dispatch(self, updates: List[dict]) -> None:
+        """Раздача обновлений воркерам по user_id одним сообщением на воркер"""
+        batches: Dict[int, List[dict]] = defaultdict(list)
+        for update in updates:
+            batches[worker_for(update, self.count)].append(update)
+        for index, batch in batches.items():
+            self.channels[index].updates.put((UPDATES, batch))
+            self.dispatched[index] += len(batch)
+
+    def check(self) -> None:
+        """Перезапуск завершившихся воркеров"""
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.error(
+                    "Воркер %s завершился с кодом %s, перезапуск; обновления в его очереди потеряны",
+                    index, process.exitcode
+                )
+                self._ready.discard(index)
+                self.restarts += 1
+                self._spawn(index)
+
+    async def stop(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT + 10) -> None:
+        """Остановка воркеров после обработки обновлений из их очередей"""
+        for channel in self.channels:
+            channel.updates.put(None)
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Воркер %s не завершился вовремя", index)
+                process.kill()
+        for channel in self.channels:
+            channel.events.put(None)
+        logger.info("Обновлений по воркерам: %s, перезапусков: %s", self.dispatched, self.restarts)
+
+def _api_url(method: str) -> str:
+    base = (TELEGRAM_API_URL or "https://api.telegram.org").rstrip("/")
+    return f"{base}/bot{BOT_TOKEN}/{method}"
+
+async def _call(session: aiohttp.ClientSession, method: str, **params) -> Any:
+    data = {name: str(value) for name, value in params.items() if value is not None}
+    async with session.post(_api_url(method), data=data) as response:
+        payload = await response.json()
+    if not payload.get("ok"):
+        retry_after = payload.get("parameters", {}).get("retry_after")
+        raise RuntimeError(f"{method}: {payload.get('description')}", retry_after)
+    return payload["result"]
+
+async def _poll(supervisor: Supervisor, session: aiohttp.ClientSession) -> None:
+    # Подтверждение offset следующим запросом, как в aiogram: принятые обновления уже в очередях воркеров
+    await _call(session, "deleteWebhook", drop_pending_updates=str(DROP_PENDING_UPDATES).lower())
+    offset = None
+    delay = 1.0
+    while True:
+        try:
+            updates = await _call(session, "getUpdates", offset=offset, timeout=POLLING_TIMEOUT)
+            delay = 1.0
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as error:
+            retry_after = error.args[1] if isinstance(error, RuntimeError) else None
+            logger.warning("Ошибка получения обновлений: %s", error)
+            await asyncio.sleep(retry_after or delay)
+            delay = min(delay * 2, 30.0)
+            continue
+        if updates:
+            offset = updates[-1]["update_id"] + 1
+            supervisor.dispatch(updates)
+
+async def _serve_webhook(supervisor: Supervisor, session: aiohttp.ClientSession) -> None:
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL не задан для режима webhook")
+
+    async def receive(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        supervisor.dispatch([await request.json()])
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT).start()
+    await _call(
+        session, "setWebhook", url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None,
+        max_connections=min(100, MAX_CONCURRENT_UPDATES * supervisor.count),
+        drop_pending_updates=str(DROP_PENDING_UPDATES).lower()
+    )
+    logger.info("Вебхук слушает %s:%s%s", WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_PATH)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def run_supervisor(target: Callable[[WorkerChannel], None], count: int = WORKERS) -> None:
+    """Запуск count воркеров (target(channel) в отдельном процессе) и раздача им обновлений до SIGINT/SIGTERM"""
+    # Инциденты и состояния FSM должны пережить перезапуск воркера
+    os.environ["INCIDENT_STORE"] = "sqlite"
+    os.environ["FSM_STORAGE"] = "sqlite"
+    os.environ["SQLITE_BUSY_TIMEOUT"] = str(max(SQLITE_BUSY_TIMEOUT, WORKER_BUSY_TIMEOUT))
+
+    supervisor = Supervisor(target, count)
+    supervisor.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    source = None
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)) as session:
+        try:
+            await supervisor.wait_ready()
+            receive = _serve_webhook if RUN_MODE == "webhook" else _poll
+            source = asyncio.create_task(receive(supervisor, session))
+            logger.info("Супервизор: %s воркеров, режим %s", count, RUN_MODE)
+            while not stop.is_set() and not source.done():
+                try:
+                    await asyncio.wait_for(stop.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    supervisor.check()
+        finally:
+            if source is not None:
+                source.cancel()
+                await asyncio.gather(source, return_exceptions=True)
+            await supervisor.stop()
+    if source is not None and not source.cancelled() and source.exception():
+        raise source.exception()